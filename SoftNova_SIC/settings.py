@@ -50,13 +50,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'contabilidad.metricas.MetricasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'contabilidad.perfilador.PerfiladorMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'contabilidad.instrumentacion.InstrumentacionSQLMiddleware',
 ]
 
 ROOT_URLCONF = 'SoftNova_SIC.urls'
@@ -91,6 +94,59 @@ DATABASES = {
     )
 }
 
+# --- Particionamiento de movimientos por período (solo PostgreSQL) ---
+# Si se activa antes de migrar, la migración 0012 convierte la tabla.
+# Para activarlo después: python manage.py particionar_movimientos --convertir
+CONTABILIDAD_PARTICIONAR_MOVIMIENTOS = os.environ.get('PARTICIONAR_MOVIMIENTOS', 'False') == 'True'
+
+# --- Archivo histórico de períodos cerrados ---
+# Directorio donde 'archivar_periodos' guarda los movimientos archivados.
+CONTABILIDAD_ARCHIVO_DIR = os.environ.get('ARCHIVO_CONTABLE_DIR', BASE_DIR / 'archivo_contable')
+
+# --- Caché HTTP de los reportes ---
+# Segundos que el navegador puede reutilizar un reporte sin revalidarlo cuando
+# todos los períodos que abarca están cerrados. Con períodos abiertos siempre
+# se revalida (ETag / Last-Modified) y se responde 304 si nada cambió.
+CONTABILIDAD_CACHE_PERIODO_CERRADO = int(os.environ.get('CACHE_PERIODO_CERRADO_SEGUNDOS', 86400))
+
+# --- Exportación incremental para BI ---
+# Directorio donde 'exportar_bi' deja los archivos comprimidos y sus manifiestos.
+CONTABILIDAD_BI_DIR = os.environ.get('EXPORTACION_BI_DIR', BASE_DIR / 'exportacion_bi')
+
+# --- Instrumentación SQL por solicitud ---
+# Activa, cada solicitud medida lleva la cabecera Server-Timing, deja una línea
+# JSON en el logger 'contabilidad.sql' y alimenta la página de administración
+# /configuracion/instrumentacion/sql/. MUESTREO es la fracción de solicitudes medidas.
+CONTABILIDAD_INSTRUMENTACION_SQL = os.environ.get('INSTRUMENTACION_SQL', 'False') == 'True'
+CONTABILIDAD_INSTRUMENTACION_MUESTREO = float(os.environ.get('INSTRUMENTACION_SQL_MUESTREO', 1.0))
+
+# --- Perfilado bajo demanda ---
+# Directorio donde quedan los perfiles de ?perfilar=1 (superusuarios) y de --profile.
+CONTABILIDAD_PERFILES_DIR = os.environ.get('PERFILES_DIR', BASE_DIR / 'perfiles')
+
+# --- Métricas (formato de texto de Prometheus en /contabilidad/metricas/) ---
+# Con varios workers, METRICAS_DIR debe ser un directorio local compartido
+# (vaciarlo al desplegar). METRICAS_TOKEN habilita al recolector con
+# 'Authorization: Bearer <token>'; sin token solo entra un administrador.
+CONTABILIDAD_METRICAS_DIR = os.environ.get('METRICAS_DIR')
+CONTABILIDAD_METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+
+# --- Cartera (cuentas por cobrar y por pagar) ---
+# Días de crédito con los que vence un documento de cartera si no se indica
+# otra fecha de vencimiento.
+CONTABILIDAD_CARTERA_PLAZO_DIAS = int(os.environ.get('CARTERA_PLAZO_DIAS', 30))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'contabilidad.sql': {'handlers': ['consola'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
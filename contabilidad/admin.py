@@ -1,6 +1,9 @@
+from django import forms
 from django.contrib import admin
-from .models import Cuenta, PeriodoContable, AsientoDiario, Movimiento,SalarioEstimadoMODAnual,CosteoProyecto,CostoIndirectoAnual
+from django.core.exceptions import ValidationError
+from .models import Cuenta, PeriodoContable, AsientoDiario, Movimiento,SalarioEstimadoMODAnual,CosteoProyecto,CostoIndirectoAnual, ArchivoPeriodo, CambioLibro, PlantillaAsiento, LineaPlantilla, ClaseActivo, ActivoFijo, Empleado, TablaDeduccion, TramoDeduccion, Planilla, LineaPlanilla, DatoFiscal, Tercero, SaldoTercero, PartidaCartera, AplicacionCartera
 from decimal import Decimal
+from . import servicios, planillas, cartera
 
 
 # --- Admin de Cuenta (Existente) ---
@@ -12,10 +15,11 @@ class CuentaAdmin(admin.ModelAdmin):
         'tipo_cuenta', 
         'naturaleza', 
         'padre', 
+        'categoria_flujo',
         'es_imputable'
     )
     list_editable = ('es_imputable',)
-    list_filter = ('tipo_cuenta', 'naturaleza', 'es_imputable')
+    list_filter = ('tipo_cuenta', 'naturaleza', 'categoria_flujo', 'es_imputable')
     search_fields = ('codigo', 'nombre')
     autocomplete_fields = ('padre',)
     fieldsets = (
@@ -23,7 +27,7 @@ class CuentaAdmin(admin.ModelAdmin):
             'fields': ('nombre', 'codigo', 'padre')
         }),
         ('Clasificación Contable', {
-            'fields': ('tipo_cuenta', 'naturaleza', 'es_imputable')
+            'fields': ('tipo_cuenta', 'naturaleza', 'categoria_flujo', 'es_imputable')
         }),
     )
 
@@ -71,15 +75,15 @@ class MovimientoInline(admin.TabularInline):
     """
     model = Movimiento
     extra = 2 # Muestra 2 líneas en blanco por defecto
-    autocomplete_fields = ('cuenta',) # Usa autocompletar para buscar cuentas
+    autocomplete_fields = ('cuenta', 'tercero') # Usa autocompletar para buscar cuentas y terceros
     
     # Campos a mostrar en la línea
-    fields = ('cuenta', 'debe', 'haber')
+    fields = ('cuenta', 'tercero', 'referencia', 'debe', 'haber')
     
     # --- NUEVO: Hacer que los asientos automáticos no se puedan editar ---
     def get_readonly_fields(self, request, obj=None):
         if obj and obj.es_asiento_automatico:
-            return ('cuenta', 'debe', 'haber')
+            return ('cuenta', 'tercero', 'referencia', 'debe', 'haber')
         return ()
 
 @admin.register(AsientoDiario)
@@ -90,11 +94,12 @@ class AsientoDiarioAdmin(admin.ModelAdmin):
     
     # --- Configuración del formulario de edición ---
     inlines = [MovimientoInline] # ¡La magia! Incrusta los movimientos
-    fields = ('periodo', 'fecha', 'descripcion', ('numero_partida', 'creado_por', 'creado_en', 'es_asiento_automatico'))
+    fields = ('periodo', 'fecha', 'descripcion', 'es_ajuste', ('numero_partida', 'creado_por', 'creado_en', 'es_asiento_automatico'), 'reversa_de')
     autocomplete_fields = ('periodo',)
     
     # Campos que no se pueden editar manualmente
-    readonly_fields = ('numero_partida', 'creado_por', 'creado_en', 'es_asiento_automatico')
+    readonly_fields = ('numero_partida', 'creado_por', 'creado_en', 'es_asiento_automatico', 'reversa_de')
+    actions = ['revertir_asientos']
 
     # --- Configuración de la lista de asientos ---
     list_display = (
@@ -107,7 +112,7 @@ class AsientoDiarioAdmin(admin.ModelAdmin):
         'estado_partida', # Columna personalizada
         'es_asiento_automatico', # Nuevo
     )
-    list_filter = ('periodo', 'fecha', 'creado_por', 'es_asiento_automatico') # Nuevo
+    list_filter = ('periodo', 'fecha', 'creado_por', 'es_asiento_automatico', 'es_ajuste') # Nuevo
     search_fields = ('numero_partida', 'descripcion')
     date_hierarchy = 'fecha'
 
@@ -135,19 +140,41 @@ class AsientoDiarioAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         """
         Al guardar desde el admin, asigna el usuario actual.
+        Al editar no se guarda aquí: save_related aplica la edición completa
+        como diferencia (servicios.editar_asiento).
         """
+        if change:
+            return
         if not obj.pk: # Solo al crear
             obj.creado_por = request.user
         super().save_model(request, obj, form, change)
-        
+
+    def save_related(self, request, form, formsets, change):
+        if not change:
+            return super().save_related(request, form, formsets, change)
+        # El mensaje del historial del admin lee estas listas de cada formset
+        for formset in formsets:
+            formset.new_objects, formset.changed_objects, formset.deleted_objects = [], [], []
+        # Un asiento automático se muestra completo en solo lectura: no hay nada que guardar
+        if form.instance.es_asiento_automatico:
+            return
+        lineas = servicios.lineas_de_formset(formsets[0])
+        encabezado = {c: form.cleaned_data[c] for c in servicios.CAMPOS_ENCABEZADO if c in form.cleaned_data}
+        # El admin permite guardar descuadrado (solo advierte), como al crear
+        resultado = servicios.editar_asiento(form.instance, lineas, encabezado, exigir_cuadre=False)
+        formsets[0].new_objects = resultado.insertados
+        formsets[0].changed_objects = [(m, ['cuenta', 'debe', 'haber']) for m in resultado.actualizados]
+        formsets[0].deleted_objects = resultado.eliminados
+        self._advertir_cuadre(request, form.instance)
+
     def save_formset(self, request, form, formset, change):
         """
         Validación de partida doble después de guardar los movimientos.
         """
         super().save_formset(request, form, formset, change)
-        # 'instance' es el AsientoDiario que se acaba de guardar
-        asiento = form.instance
-        
+        self._advertir_cuadre(request, form.instance)
+
+    def _advertir_cuadre(self, request, asiento):
         # Forzar una recarga de los totales (ya que se guardaron los inlines)
         asiento.refresh_from_db() 
         
@@ -170,15 +197,261 @@ class AsientoDiarioAdmin(admin.ModelAdmin):
     def get_readonly_fields(self, request, obj=None):
         # Si el asiento es automático, hacerlo todo de solo lectura
         if obj and obj.es_asiento_automatico:
-            return ('periodo', 'fecha', 'descripcion', 'numero_partida', 'creado_por', 'creado_en', 'es_asiento_automatico')
+            return ('periodo', 'fecha', 'descripcion', 'es_ajuste', 'numero_partida', 'creado_por', 'creado_en', 'es_asiento_automatico', 'reversa_de')
         return self.readonly_fields
 
+    @admin.action(description="Revertir asientos seleccionados (en el período abierto)", permissions=['add'])
+    def revertir_asientos(self, request, queryset):
+        """
+        Crea el asiento espejo de cada asiento seleccionado (o de todos los
+        que coinciden con el filtro, con "Seleccionar todos") en el período
+        abierto, en una sola transacción.
+        """
+        try:
+            resultado = servicios.revertir_asientos(queryset, usuario=request.user)
+        except ValidationError as e:
+            self.message_user(request, f"Error: {' '.join(e.messages)}", level='ERROR')
+            return
+        if resultado.reversiones:
+            numeros = [r.numero_partida for r in resultado.reversiones]
+            self.message_user(
+                request,
+                f"Se revirtieron {len(numeros)} asiento(s) en '{resultado.periodo.nombre}' "
+                f"(partidas N° {numeros[0]} a {numeros[-1]}, {resultado.movimientos} movimientos)."
+            )
+        for motivo, cantidad in resultado.omitidos.items():
+            self.message_user(request, f"Se omitieron {cantidad} asiento(s): {motivo}.", level='WARNING')
+
     def has_delete_permission(self, request, obj=None):
         # No permitir borrar asientos automáticos
         if obj and obj.es_asiento_automatico:
             return False
         return super().has_delete_permission(request, obj)
 
+# --- Plantillas de asientos ---
+
+class LineaPlantillaInline(admin.TabularInline):
+    model = LineaPlantilla
+    extra = 2
+    autocomplete_fields = ('cuenta',)
+    fields = ('orden', 'cuenta', 'lado', 'formula', 'valor')
+
+
+@admin.register(PlantillaAsiento)
+class PlantillaAsientoAdmin(admin.ModelAdmin):
+    """
+    Plantillas del registro manual y asientos recurrentes
+    (se generan con: python manage.py generar_recurrentes).
+    """
+    inlines = [LineaPlantillaInline]
+    fieldsets = (
+        (None, {'fields': ('nombre', 'descripcion', 'monto_base', 'es_ajuste', 'activa')}),
+        ('Recurrencia', {'fields': ('recurrente', ('frecuencia', 'dia'), ('vigente_desde', 'vigente_hasta'), 'generada_hasta')}),
+    )
+    readonly_fields = ('generada_hasta',)
+    list_display = ('nombre', 'monto_base', 'recurrente', 'frecuencia', 'dia', 'vigente_desde', 'vigente_hasta', 'generada_hasta', 'activa')
+    list_filter = ('recurrente', 'frecuencia', 'activa')
+    search_fields = ('nombre', 'descripcion')
+
+# --- Activos fijos ---
+
+@admin.register(ClaseActivo)
+class ClaseActivoAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'cuenta_activo', 'cuenta_depreciacion', 'cuenta_gasto', 'vida_util_meses', 'metodo')
+    autocomplete_fields = ('cuenta_activo', 'cuenta_depreciacion', 'cuenta_gasto')
+    search_fields = ('nombre',)
+
+
+@admin.register(ActivoFijo)
+class ActivoFijoAdmin(admin.ModelAdmin):
+    """
+    Registro de activos fijos. La depreciación se registra con:
+    python manage.py depreciar_activos
+    """
+    list_display = ('codigo', 'descripcion', 'clase', 'fecha_adquisicion', 'costo', 'vida_util_meses', 'metodo', 'depreciado_hasta', 'fecha_baja')
+    list_filter = ('clase', 'metodo')
+    search_fields = ('codigo', 'descripcion')
+    autocomplete_fields = ('clase',)
+    readonly_fields = ('depreciado_hasta',)
+    date_hierarchy = 'fecha_adquisicion'
+
+# --- Planillas ---
+
+@admin.register(Empleado)
+class EmpleadoAdmin(admin.ModelAdmin):
+    list_display = ('codigo', 'nombre', 'activo')
+    list_filter = ('activo',)
+    search_fields = ('codigo', 'nombre')
+
+
+class TramoDeduccionInline(admin.TabularInline):
+    model = TramoDeduccion
+    extra = 1
+    fields = ('desde', 'porcentaje', 'cuota_fija')
+
+
+@admin.register(TablaDeduccion)
+class TablaDeduccionAdmin(admin.ModelAdmin):
+    inlines = [TramoDeduccionInline]
+    list_display = ('nombre', 'cuenta', 'base_maxima', 'orden', 'activa')
+    list_filter = ('activa',)
+    autocomplete_fields = ('cuenta',)
+
+
+@admin.register(Planilla)
+class PlanillaAdmin(admin.ModelAdmin):
+    """
+    Planillas de pago. Las líneas se importan con:
+    python manage.py importar_planilla archivo.csv --nombre "..."
+    """
+    list_display = ('nombre', 'periodo', 'fecha', 'estado', 'asiento_provision', 'asiento_pago')
+    list_filter = ('periodo', 'estado')
+    search_fields = ('nombre',)
+    autocomplete_fields = ('periodo', 'cuenta_gasto', 'cuenta_por_pagar', 'cuenta_pago')
+    readonly_fields = ('estado', 'asiento_provision', 'asiento_pago', 'creado_en')
+    actions = ['contabilizar', 'contabilizar_por_empleado']
+
+    def _contabilizar(self, request, queryset, por_empleado):
+        for planilla in queryset:
+            try:
+                resultado = planillas.contabilizar(planilla, por_empleado=por_empleado, usuario=request.user)
+            except ValidationError as e:
+                self.message_user(request, f"Error en '{planilla}': {' '.join(e.messages)}", level='ERROR')
+                continue
+            self.message_user(
+                request,
+                f"'{planilla}' contabilizada: {resultado.empleados} empleado(s), salarios ${resultado.total_salarios} "
+                f"(partidas N° {resultado.planilla.asiento_provision.numero_partida} y "
+                f"N° {resultado.planilla.asiento_pago.numero_partida})."
+            )
+
+    @admin.action(description="Contabilizar planillas seleccionadas", permissions=['change'])
+    def contabilizar(self, request, queryset):
+        self._contabilizar(request, queryset, por_empleado=False)
+
+    @admin.action(description="Contabilizar planillas seleccionadas (una línea por empleado)", permissions=['change'])
+    def contabilizar_por_empleado(self, request, queryset):
+        self._contabilizar(request, queryset, por_empleado=True)
+
+
+@admin.register(LineaPlanilla)
+class LineaPlanillaAdmin(admin.ModelAdmin):
+    list_display = ('planilla', 'empleado', 'salario', 'total_deducciones', 'liquido')
+    list_filter = ('planilla',)
+    list_select_related = ('planilla__periodo', 'empleado')
+    search_fields = ('empleado__codigo', 'empleado__nombre')
+    autocomplete_fields = ('empleado',)
+    readonly_fields = ('deducciones', 'total_deducciones', 'liquido')
+
+# --- Datos fiscales (IVA) ---
+
+@admin.register(DatoFiscal)
+class DatoFiscalAdmin(admin.ModelAdmin):
+    """
+    Datos del documento de cada movimiento de IVA. Los libros se descargan
+    desde Reportes (Libros de IVA).
+    """
+    list_display = ('fecha_documento', 'libro', 'tipo_documento', 'numero_documento', 'tercero_nit', 'tercero_nombre', 'base_gravada', 'periodo')
+    list_filter = ('libro', 'tipo_documento', 'periodo')
+    list_select_related = ('periodo',)
+    search_fields = ('numero_documento', 'tercero_nit', 'tercero_nombre')
+    raw_id_fields = ('movimiento',)
+    date_hierarchy = 'fecha_documento'
+
+# --- Terceros ---
+
+@admin.register(Tercero)
+class TerceroAdmin(admin.ModelAdmin):
+    list_display = ('codigo', 'nombre', 'tipo', 'nit', 'activo')
+    list_filter = ('tipo', 'activo')
+    search_fields = ('codigo', 'nombre', 'nit')
+
+
+@admin.register(SaldoTercero)
+class SaldoTerceroAdmin(admin.ModelAdmin):
+    """
+    Saldos acumulados por cuenta, tercero y período. Los mantiene el comando
+    'saldos_terceros' (y los reportes de auxiliares) desde la bitácora, por
+    eso aquí es de solo lectura.
+    """
+    list_display = ('tercero', 'cuenta', 'periodo', 'debe', 'haber', 'movimientos')
+    list_filter = ('periodo',)
+    list_select_related = ('tercero', 'cuenta', 'periodo')
+    search_fields = ('tercero__codigo', 'tercero__nombre', 'cuenta__codigo')
+    readonly_fields = [f.name for f in SaldoTercero._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+# --- Cartera (cuentas por cobrar y por pagar) ---
+
+@admin.register(PartidaCartera)
+class PartidaCarteraAdmin(admin.ModelAdmin):
+    """
+    Partidas de cartera. Las crea y actualiza la bitácora (comando
+    'conciliar_cartera'); aquí solo se cambia el vencimiento.
+    """
+    list_display = ('referencia', 'tercero', 'cuenta', 'tipo', 'fecha', 'vencimiento', 'monto', 'pendiente')
+    list_filter = ('tipo', 'cuenta')
+    list_select_related = ('tercero', 'cuenta')
+    search_fields = ('referencia', 'tercero__codigo', 'tercero__nombre')
+    date_hierarchy = 'vencimiento'
+    readonly_fields = ('movimiento', 'cuenta', 'tercero', 'tipo', 'referencia', 'fecha', 'monto', 'pendiente')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class AplicacionCarteraForm(forms.ModelForm):
+    monto = forms.DecimalField(
+        max_digits=12, decimal_places=2, required=False,
+        help_text="Vacío: lo más que se pueda (el menor de los dos pendientes).",
+    )
+
+    class Meta:
+        model = AplicacionCartera
+        fields = ('documento', 'pago', 'monto')
+
+    def clean(self):
+        datos = super().clean()
+        if datos.get('documento') and datos.get('pago'):
+            datos['monto'] = cartera.validar_aplicacion(datos['documento'], datos['pago'], datos.get('monto'))
+        return datos
+
+
+@admin.register(AplicacionCartera)
+class AplicacionCarteraAdmin(admin.ModelAdmin):
+    """
+    Aplicaciones de pagos a documentos. Agregar una es una conciliación
+    manual; borrarla devuelve el monto al pendiente de ambas partidas.
+    """
+    form = AplicacionCarteraForm
+    list_display = ('pago', 'documento', 'monto', 'automatica', 'creado_en')
+    list_filter = ('automatica',)
+    raw_id_fields = ('documento', 'pago')
+    search_fields = ('documento__referencia', 'pago__referencia', 'documento__tercero__codigo')
+
+    def has_change_permission(self, request, obj=None):
+        return obj is None
+
+    def save_model(self, request, obj, form, change):
+        obj.pk = cartera.aplicar(obj.documento, obj.pago, obj.monto).pk
+
+    def delete_model(self, request, obj):
+        cartera.deshacer(AplicacionCartera.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        cartera.deshacer(queryset)
+
 # --- (INICIO) CÓDIGO AGREGADO PARA COSTEO ---
 
 @admin.register(SalarioEstimadoMODAnual)
@@ -225,4 +498,50 @@ class CosteoProyectoAdmin(admin.ModelAdmin):
             return (obj.descripcion_proyecto[:40] + '...') if len(obj.descripcion_proyecto) > 40 else obj.descripcion_proyecto
         return '-' # Muestra un guion si no hay descripción
 
+# --- Admin del Archivo Histórico (solo lectura) ---
+@admin.register(ArchivoPeriodo)
+class ArchivoPeriodoAdmin(admin.ModelAdmin):
+    """
+    Registro de los períodos archivados. Se crea únicamente con el
+    comando 'archivar_periodos', por eso aquí es de solo lectura.
+    """
+    list_display = ('periodo', 'num_movimientos', 'total_debe', 'total_haber', 'asiento_arrastre', 'creado_en')
+    readonly_fields = [f.name for f in ArchivoPeriodo._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+
+@admin.register(CambioLibro)
+class CambioLibroAdmin(admin.ModelAdmin):
+    """
+    Bitácora de cambios del libro. Es append-only: la escriben los modelos
+    al guardar o borrar, por eso aquí es de solo lectura.
+    """
+    list_display = ('secuencia', 'modelo', 'operacion', 'objeto_id', 'periodo_id', 'registrado_en')
+    list_filter = ('modelo', 'operacion')
+    search_fields = ('objeto_id',)
+    readonly_fields = [f.name for f in CambioLibro._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
 # --- (FIN) CÓDIGO AGREG
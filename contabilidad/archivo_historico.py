@@ -0,0 +1,401 @@
+"""
+Archivo histórico de períodos cerrados.
+
+Cada período archivado se guarda en su propio directorio dentro de
+CONTABILIDAD_ARCHIVO_DIR con un archivo .npy por columna (montos en
+centavos int64, fechas como ordinal) y un manifest.json con los SHA-256
+de cada archivo. Las columnas se guardan sin comprimir para poder abrirlas
+con memoria mapeada (np.load(mmap_mode='r')); las descripciones de los
+asientos, que son texto, van comprimidas en asientos.json.gz, las
+referencias de los movimientos en referencias.json.gz y los datos fiscales
+(IVA) en datos_fiscales.json.gz, para que los libros de IVA de un período
+archivado se sigan generando. El tercero de cada movimiento es una columna
+más (0 si no tiene).
+
+Las funciones de lectura devuelven los mismos totales que las consultas
+de views.py, para que los reportes lean un período archivado igual que
+uno en la base de datos.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .ledger import LedgerFrame, a_centavos, a_decimal
+from .models import ArchivoPeriodo, AsientoDiario, DatoFiscal, Movimiento
+
+# 2: datos fiscales
+# 3: tercero
+# 4: referencia
+FORMATO = 4
+
+# Columna -> tipo NumPy
+COLUMNAS = {
+    'movimiento_id': np.int64,
+    'asiento_id': np.int64,
+    'numero_partida': np.int32,
+    'fecha': np.int32,          # date.toordinal()
+    'cuenta_id': np.int64,
+    'debe': np.int64,           # centavos
+    'haber': np.int64,          # centavos
+    'es_automatico': np.bool_,
+    'es_apertura': np.bool_,
+    'tercero_id': np.int64,     # 0 sin tercero
+}
+# Columnas que los archivos de formatos anteriores no tienen (se leen en cero)
+COLUMNAS_OPCIONALES = ('tercero_id',)
+ARCHIVO_ASIENTOS = 'asientos.json.gz'
+ARCHIVO_REFERENCIAS = 'referencias.json.gz'
+ARCHIVO_FISCAL = 'datos_fiscales.json.gz'
+CAMPOS_FISCALES = (
+    'movimiento_id', 'libro', 'tipo_documento', 'numero_documento', 'fecha_documento',
+    'tercero_nit', 'tercero_nombre', 'base_gravada', 'monto_exento',
+)
+ARCHIVO_MANIFIESTO = 'manifest.json'
+
+
+# --- Utilidades ---
+
+def directorio_base():
+    return Path(getattr(settings, 'CONTABILIDAD_ARCHIVO_DIR', Path(settings.BASE_DIR) / 'archivo_contable'))
+
+
+def sha256(ruta):
+    """
+    Checksum SHA-256 de un archivo, leído por bloques. Lo usan también las
+    exportaciones a BI para sus manifiestos.
+    """
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def archivo_de(periodo):
+    """
+    Devuelve el ArchivoPeriodo del período o None. Django guarda en caché
+    el resultado en la instancia, así que se consulta una sola vez.
+    """
+    try:
+        return periodo.archivo
+    except ArchivoPeriodo.DoesNotExist:
+        return None
+
+
+# --- Exportación ---
+
+def exportar_periodo(periodo, ids_apertura):
+    """
+    Escribe las columnas de los movimientos del período y su manifiesto.
+    'ids_apertura' es el conjunto de ids de asientos de apertura.
+    Devuelve (ruta_relativa, manifiesto, checksum_manifiesto).
+    """
+    filas = Movimiento.objects.filter(periodo=periodo).order_by(
+        'fecha', 'asiento__numero_partida', 'pk'
+    ).values_list(
+        'pk', 'asiento_id', 'asiento__numero_partida', 'fecha', 'cuenta_id',
+        'debe', 'haber', 'es_asiento_automatico', 'tercero_id', 'referencia'
+    )
+
+    valores = {nombre: [] for nombre in COLUMNAS}
+    referencias = {}
+    for (mov_id, asiento_id, numero, fecha, cuenta_id, debe, haber, automatico,
+         tercero_id, referencia) in filas.iterator(chunk_size=5000):
+        valores['movimiento_id'].append(mov_id)
+        valores['asiento_id'].append(asiento_id)
+        valores['numero_partida'].append(numero)
+        valores['fecha'].append(fecha.toordinal())
+        valores['cuenta_id'].append(cuenta_id)
+        valores['debe'].append(a_centavos(debe))
+        valores['haber'].append(a_centavos(haber))
+        valores['es_automatico'].append(automatico)
+        valores['es_apertura'].append(asiento_id in ids_apertura)
+        valores['tercero_id'].append(tercero_id or 0)
+        if referencia:
+            referencias[str(mov_id)] = referencia
+
+    asientos = {
+        str(pk): {'numero_partida': numero, 'fecha': fecha.isoformat(), 'descripcion': descripcion, 'es_ajuste': es_ajuste}
+        for pk, numero, fecha, descripcion, es_ajuste in AsientoDiario.objects.filter(periodo=periodo).values_list(
+            'pk', 'numero_partida', 'fecha', 'descripcion', 'es_ajuste'
+        )
+    }
+
+    datos_fiscales = [
+        {campo: str(valor) if campo in ('fecha_documento', 'base_gravada', 'monto_exento') else valor
+         for campo, valor in zip(CAMPOS_FISCALES, fila)}
+        for fila in DatoFiscal.objects.filter(periodo=periodo).order_by('movimiento_id').values_list(*CAMPOS_FISCALES)
+    ]
+
+    ruta_relativa = f'periodo_{periodo.pk}'
+    destino = directorio_base() / ruta_relativa
+    temporal = directorio_base() / f'.{ruta_relativa}.tmp'
+    shutil.rmtree(temporal, ignore_errors=True)
+    temporal.mkdir(parents=True)
+
+    archivos = {}
+    for nombre, tipo in COLUMNAS.items():
+        nombre_archivo = f'{nombre}.npy'
+        np.save(temporal / nombre_archivo, np.asarray(valores[nombre], dtype=tipo))
+        archivos[nombre_archivo] = {'sha256': sha256(temporal / nombre_archivo), 'dtype': np.dtype(tipo).str}
+
+    with gzip.open(temporal / ARCHIVO_ASIENTOS, 'wt', encoding='utf-8') as f:
+        json.dump(asientos, f, ensure_ascii=False)
+    archivos[ARCHIVO_ASIENTOS] = {'sha256': sha256(temporal / ARCHIVO_ASIENTOS)}
+    with gzip.open(temporal / ARCHIVO_REFERENCIAS, 'wt', encoding='utf-8') as f:
+        json.dump(referencias, f, ensure_ascii=False)
+    archivos[ARCHIVO_REFERENCIAS] = {'sha256': sha256(temporal / ARCHIVO_REFERENCIAS)}
+    with gzip.open(temporal / ARCHIVO_FISCAL, 'wt', encoding='utf-8') as f:
+        json.dump(datos_fiscales, f, ensure_ascii=False)
+    archivos[ARCHIVO_FISCAL] = {'sha256': sha256(temporal / ARCHIVO_FISCAL)}
+
+    manifiesto = {
+        'formato': FORMATO,
+        'periodo': {
+            'id': periodo.pk,
+            'nombre': periodo.nombre,
+            'fecha_inicio': periodo.fecha_inicio.isoformat(),
+            'fecha_fin': periodo.fecha_fin.isoformat(),
+        },
+        'filas': len(valores['movimiento_id']),
+        'total_debe': str(a_decimal(sum(valores['debe']))),
+        'total_haber': str(a_decimal(sum(valores['haber']))),
+        'archivos': archivos,
+        'creado_en': timezone.now().isoformat(),
+    }
+    with open(temporal / ARCHIVO_MANIFIESTO, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporal, destino)
+    return ruta_relativa, manifiesto, sha256(destino / ARCHIVO_MANIFIESTO)
+
+
+def verificar(archivo):
+    """
+    Comprueba el manifiesto y los checksums de todos los archivos.
+    Devuelve una lista de errores (vacía si el archivo está íntegro).
+    """
+    directorio = directorio_base() / archivo.ruta
+    ruta_manifiesto = directorio / ARCHIVO_MANIFIESTO
+    if not ruta_manifiesto.exists():
+        return [f'No existe {ruta_manifiesto}']
+
+    errores = []
+    if sha256(ruta_manifiesto) != archivo.checksum_manifiesto:
+        errores.append('El checksum del manifiesto no coincide con el registrado.')
+    with open(ruta_manifiesto, encoding='utf-8') as f:
+        manifiesto = json.load(f)
+    for nombre_archivo, info in manifiesto['archivos'].items():
+        ruta = directorio / nombre_archivo
+        if not ruta.exists():
+            errores.append(f'Falta el archivo {nombre_archivo}.')
+        elif sha256(ruta) != info['sha256']:
+            errores.append(f'El checksum de {nombre_archivo} no coincide.')
+    return errores
+
+
+# --- Lectura ---
+
+@lru_cache(maxsize=32)
+def _abrir(ruta, checksum_manifiesto):
+    directorio = directorio_base() / ruta
+    abiertas = {}
+    for nombre, tipo in COLUMNAS.items():
+        ruta_columna = directorio / f'{nombre}.npy'
+        if nombre in COLUMNAS_OPCIONALES and not ruta_columna.exists():
+            abiertas[nombre] = np.zeros(len(abiertas['movimiento_id']), dtype=tipo)
+        else:
+            abiertas[nombre] = np.load(ruta_columna, mmap_mode='r')
+    return abiertas
+
+
+def columnas(archivo):
+    """
+    Devuelve un dict columna -> arreglo de solo lectura mapeado en memoria.
+    El checksum forma parte de la llave de caché: si se re-archiva el
+    período, se abren los archivos nuevos.
+    """
+    return _abrir(archivo.ruta, archivo.checksum_manifiesto)
+
+
+@lru_cache(maxsize=32)
+def _asientos(ruta, checksum_manifiesto):
+    with gzip.open(directorio_base() / ruta / ARCHIVO_ASIENTOS, 'rt', encoding='utf-8') as f:
+        return {int(pk): datos for pk, datos in json.load(f).items()}
+
+
+@lru_cache(maxsize=32)
+def _referencias(ruta, checksum_manifiesto):
+    ruta_referencias = directorio_base() / ruta / ARCHIVO_REFERENCIAS
+    if not ruta_referencias.exists():
+        return {}  # archivos anteriores al formato 4
+    with gzip.open(ruta_referencias, 'rt', encoding='utf-8') as f:
+        return {int(pk): referencia for pk, referencia in json.load(f).items()}
+
+
+def referencias(archivo):
+    """
+    {movimiento_id: referencia} de los movimientos archivados que tienen una.
+    """
+    return _referencias(archivo.ruta, archivo.checksum_manifiesto)
+
+
+@lru_cache(maxsize=32)
+def _datos_fiscales(ruta, checksum_manifiesto):
+    ruta_fiscal = directorio_base() / ruta / ARCHIVO_FISCAL
+    if not ruta_fiscal.exists():
+        return []  # archivos anteriores a los datos fiscales
+    with gzip.open(ruta_fiscal, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def datos_fiscales(archivo):
+    """
+    Datos fiscales del período archivado, uno por línea de IVA, con el
+    debe, el haber y el número de partida de su movimiento (como en la
+    unión de libros_iva con la base de datos).
+    """
+    filas = _datos_fiscales(archivo.ruta, archivo.checksum_manifiesto)
+    if not filas:
+        return []
+    c = columnas(archivo)
+    indice = {int(mov_id): i for i, mov_id in enumerate(c['movimiento_id'].tolist())}
+    resultado = []
+    for fila in filas:
+        i = indice[fila['movimiento_id']]
+        resultado.append({
+            **fila,
+            'fecha_documento': date.fromisoformat(fila['fecha_documento']),
+            'base_gravada': Decimal(fila['base_gravada']),
+            'monto_exento': Decimal(fila['monto_exento']),
+            'debe': a_decimal(c['debe'][i]),
+            'haber': a_decimal(c['haber'][i]),
+            'partida': int(c['numero_partida'][i]),
+        })
+    return resultado
+
+
+def movimientos_sin_datos_fiscales(archivo, cuentas_ids):
+    """
+    Cantidad de movimientos archivados de 'cuentas_ids' sin datos fiscales.
+    """
+    c = columnas(archivo)
+    etiquetados = [fila['movimiento_id'] for fila in _datos_fiscales(archivo.ruta, archivo.checksum_manifiesto)]
+    return int((np.isin(c['cuenta_id'], list(cuentas_ids)) & ~np.isin(c['movimiento_id'], etiquetados)).sum())
+
+
+def marco(archivo):
+    """
+    LedgerFrame con los movimientos del período archivado.
+    """
+    return LedgerFrame.desde_archivo(archivo, columnas(archivo))
+
+
+def totales_por_cuenta(archivo, excluir_automaticos=False, cuentas_ids=None):
+    """
+    Equivalente archivado de sumar debe/haber por cuenta en un período.
+    """
+    movimientos = marco(archivo)
+    if excluir_automaticos:
+        movimientos = movimientos.sin_automaticos()
+    if cuentas_ids is not None:
+        movimientos = movimientos.de_cuentas(cuentas_ids)
+    return movimientos.por_cuenta()
+
+
+def cubre_fecha(*fechas):
+    """
+    Indica si alguna de las fechas cae dentro de los períodos archivados,
+    antes de su asiento de arrastre (sus saldos se leen del archivo).
+    """
+    condicion = Q()
+    for fecha in fechas:
+        condicion |= Q(fecha_arrastre__gt=fecha, periodo__fecha_inicio__lte=fecha)
+    return ArchivoPeriodo.objects.filter(condicion).exists()
+
+
+def cubre_rango(fecha_desde, fecha_hasta):
+    """
+    Indica si algún período archivado se traslapa con el rango de fechas
+    (sus movimientos ya no están en la base de datos).
+    """
+    return ArchivoPeriodo.objects.filter(
+        periodo__fecha_inicio__lte=fecha_hasta,
+        periodo__fecha_fin__gte=fecha_desde
+    ).exists()
+
+
+def saldos_a_fecha(cuentas_ids, fecha):
+    """
+    Saldos a una fecha que cae dentro de los períodos archivados (antes del
+    asiento de arrastre). Se calculan igual que en la base de datos: desde
+    el último asiento de apertura hasta 'fecha'.
+    Devuelve {cuenta_id: (total_debe, total_haber)}, o None si 'fecha' no
+    cae dentro de ningún archivo y el saldo debe leerse de la base de datos.
+    """
+    if not cubre_fecha(fecha):
+        return None
+    return LedgerFrame.desde_rango(fecha_hasta=fecha).desde_ultima_apertura().de_cuentas(cuentas_ids).por_cuenta()
+
+
+def asientos_de_ajuste(archivo):
+    """
+    Ids de los asientos de ajuste del período archivado. Los archivos
+    anteriores a la marca 'es_ajuste' no tienen ninguno.
+    """
+    asientos = _asientos(archivo.ruta, archivo.checksum_manifiesto)
+    return {pk for pk, datos in asientos.items() if datos.get('es_ajuste')}
+
+
+def tiene_apertura(archivo):
+    return bool(columnas(archivo)['es_apertura'].any())
+
+
+def cuentas_con_movimiento(archivo):
+    return set(np.unique(columnas(archivo)['cuenta_id']).tolist())
+
+
+def movimientos_de_cuenta(archivo, cuenta_id):
+    """
+    Lista de movimientos de una cuenta con la misma forma que usan las
+    plantillas (mov.asiento.fecha, mov.asiento.numero_partida, mov.debe...).
+    """
+    c = columnas(archivo)
+    asientos = _asientos(archivo.ruta, archivo.checksum_manifiesto)
+    indices = np.flatnonzero(c['cuenta_id'] == cuenta_id)
+    lista = []
+    for i in indices:
+        datos = asientos.get(int(c['asiento_id'][i]), {})
+        lista.append(SimpleNamespace(
+            pk=int(c['movimiento_id'][i]),
+            debe=a_decimal(c['debe'][i]),
+            haber=a_decimal(c['haber'][i]),
+            asiento=SimpleNamespace(
+                pk=int(c['asiento_id'][i]),
+                fecha=date.fromordinal(int(c['fecha'][i])),
+                numero_partida=int(c['numero_partida'][i]),
+                descripcion=datos.get('descripcion', ''),
+            ),
+        ))
+    return lista
+
+
+def contrapartidas(archivo, cuentas_ids):
+    """
+    Totales por cuenta de las líneas que NO son de 'cuentas_ids', dentro de
+    los asientos que sí tienen alguna línea en 'cuentas_ids'.
+    """
+    return marco(archivo).contrapartidas(cuentas_ids).por_cuenta()
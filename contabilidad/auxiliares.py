@@ -0,0 +1,231 @@
+"""
+Auxiliares por tercero: saldos y estados de cuenta de clientes,
+proveedores y empleados.
+
+SaldoTercero acumula debe, haber y cantidad de movimientos por (cuenta,
+tercero, período). actualizar() lo pone al día con los cambios de
+movimientos de la bitácora posteriores a su posición: cada alta suma, cada
+baja resta y cada modificación resta los valores anteriores y suma los
+nuevos. Las diferencias se acumulan en centavos por llave y se escriben
+con un upsert por lote, así que ponerlo al día cuesta lo que los cambios
+nuevos y no lo que el libro. Las consultas de este módulo llaman a
+actualizar() antes de leer: los saldos de miles de terceros son una
+consulta agrupada sobre una tabla pequeña e indexada.
+
+reconstruir() recalcula todo desde los movimientos (una consulta agrupada
+sobre el índice cuenta-tercero-período); sirve para construir el acumulado
+la primera vez o, por ejemplo, después de un update() masivo que no pasó
+por la bitácora. Recorre todo el libro, así que solo lo llama el comando
+saldos_terceros (cron), nunca una consulta: mientras no se haya construido,
+las consultas leen la tabla vacía (ver construido()).
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from . import bitacora
+from .ledger import a_centavos, a_decimal
+from .models import CambioLibro, ConsumidorBitacora, Cuenta, Movimiento, SaldoTercero
+
+CONSUMIDOR = 'saldos_tercero'
+CERO = Decimal('0.00')
+CENTAVO = Decimal('0.01')
+LOTE_BITACORA = 10000
+
+
+# --- Mantenimiento del acumulado ---
+
+def _acumular(deltas, datos, signo):
+    if not datos or not datos.get('tercero_id'):
+        return
+    llave = (datos['cuenta_id'], datos['tercero_id'], datos['periodo_id'])
+    delta = deltas.setdefault(llave, [0, 0, 0])
+    delta[0] += signo * a_centavos(datos['debe'])
+    delta[1] += signo * a_centavos(datos['haber'])
+    delta[2] += signo
+
+
+def _aplicar(deltas):
+    """
+    Suma las diferencias {(cuenta, tercero, período): [debe, haber, movs]}
+    (centavos) a SaldoTercero: un upsert para las llaves que quedan con
+    movimientos y un DELETE para las que quedan vacías.
+    """
+    deltas = {llave: d for llave, d in deltas.items() if any(d)}
+    if not deltas:
+        return
+    cuentas, terceros, periodos = (set(columna) for columna in zip(*deltas))
+    actuales = {
+        (s.cuenta_id, s.tercero_id, s.periodo_id): s
+        for s in SaldoTercero.objects.filter(cuenta_id__in=cuentas, tercero_id__in=terceros, periodo_id__in=periodos)
+    }
+    escribir, vaciar = [], []
+    for llave, (debe, haber, movimientos) in deltas.items():
+        actual = actuales.get(llave)
+        if actual:
+            debe += a_centavos(actual.debe)
+            haber += a_centavos(actual.haber)
+            movimientos += actual.movimientos
+        if movimientos <= 0:
+            if actual:
+                vaciar.append(actual.pk)
+            continue
+        cuenta_id, tercero_id, periodo_id = llave
+        escribir.append(SaldoTercero(
+            cuenta_id=cuenta_id, tercero_id=tercero_id, periodo_id=periodo_id,
+            debe=a_decimal(debe), haber=a_decimal(haber), movimientos=movimientos,
+        ))
+    if vaciar:
+        SaldoTercero.objects.filter(pk__in=vaciar).delete()
+    SaldoTercero.objects.bulk_create(
+        escribir, batch_size=2000, update_conflicts=True,
+        unique_fields=['cuenta', 'tercero', 'periodo'], update_fields=['debe', 'haber', 'movimientos'],
+    )
+
+
+@transaction.atomic
+def reconstruir():
+    """
+    Recalcula SaldoTercero desde los movimientos y deja la posición en la
+    última secuencia de la bitácora. Devuelve la cantidad de saldos.
+    """
+    # Con el candado del libro, nada se escribe entre leer la secuencia y agregar
+    CambioLibro.bloquear_escrituras()
+    consumidor, _ = ConsumidorBitacora.objects.select_for_update().get_or_create(nombre=CONSUMIDOR)
+    consumidor.secuencia = bitacora.ultima_secuencia()
+    SaldoTercero.objects.all().delete()
+    saldos = SaldoTercero.objects.bulk_create((
+        SaldoTercero(
+            cuenta_id=fila['cuenta_id'], tercero_id=fila['tercero_id'], periodo_id=fila['periodo_id'],
+            debe=fila['debe'], haber=fila['haber'], movimientos=fila['movimientos'],
+        )
+        for fila in Movimiento.objects.filter(tercero__isnull=False)
+        .values('cuenta_id', 'tercero_id', 'periodo_id')
+        .annotate(debe=Sum('debe'), haber=Sum('haber'), movimientos=Count('id'))
+        .order_by()
+    ), batch_size=2000)
+    consumidor.save(update_fields=['secuencia', 'actualizado_en'])
+    return len(saldos)
+
+
+def construido():
+    """
+    Indica si SaldoTercero ya se construyó (con reconstruir()).
+    """
+    return ConsumidorBitacora.objects.filter(nombre=CONSUMIDOR).exists()
+
+
+def actualizar():
+    """
+    Aplica a SaldoTercero los cambios de movimientos registrados después de
+    su posición. Si todavía no se construyó no hace nada (eso es de
+    reconstruir()). Devuelve la cantidad de cambios aplicados.
+    """
+    # Sin cambios nuevos (lo normal en una consulta) no se toma ningún candado
+    posicion = ConsumidorBitacora.objects.filter(nombre=CONSUMIDOR).values_list('secuencia', flat=True).first()
+    if posicion is not None and not CambioLibro.objects.filter(
+        modelo=CambioLibro.Modelo.MOVIMIENTO, secuencia__gt=posicion,
+    ).exists():
+        return 0
+    return _actualizar()
+
+
+@transaction.atomic
+def _actualizar():
+    consumidor = ConsumidorBitacora.objects.select_for_update().filter(nombre=CONSUMIDOR).first()
+    if consumidor is None:
+        return 0
+
+    aplicados = 0
+    cursor = consumidor.secuencia
+    while True:
+        cambios, nuevo_cursor = bitacora.cambios_desde(cursor, LOTE_BITACORA, [CambioLibro.Modelo.MOVIMIENTO])
+        if not cambios:
+            break
+        deltas = {}
+        for cambio in cambios:
+            if cambio.operacion == CambioLibro.Operacion.INSERCION:
+                _acumular(deltas, cambio.datos, 1)
+            elif cambio.operacion == CambioLibro.Operacion.ELIMINACION:
+                _acumular(deltas, cambio.datos, -1)
+            else:
+                _acumular(deltas, cambio.datos.get('anterior'), -1)
+                _acumular(deltas, cambio.datos, 1)
+        _aplicar(deltas)
+        aplicados += len(cambios)
+        cursor = nuevo_cursor
+        if len(cambios) < LOTE_BITACORA:
+            break
+
+    if cursor != consumidor.secuencia:
+        consumidor.secuencia = cursor
+        consumidor.save(update_fields=['secuencia', 'actualizado_en'])
+    return aplicados
+
+
+# --- Consultas ---
+
+def _saldo(cuenta, debe, haber):
+    return debe - haber if cuenta.naturaleza == Cuenta.NaturalezaCuenta.DEUDORA else haber - debe
+
+
+def saldos(cuenta, hasta=None, tipo=None, pendientes=False):
+    """
+    Saldo de cada tercero en 'cuenta', acumulado hasta el período 'hasta'
+    inclusive (todos si es None), en orden de código. 'tipo' filtra por
+    Tercero.Tipo y 'pendientes' deja solo los terceros con saldo.
+    """
+    actualizar()
+    filas = SaldoTercero.objects.filter(cuenta=cuenta)
+    if hasta is not None:
+        filas = filas.filter(periodo__fecha_inicio__lte=hasta.fecha_inicio)
+    if tipo:
+        filas = filas.filter(tercero__tipo=tipo)
+    filas = (
+        filas.values('tercero_id', 'tercero__codigo', 'tercero__nombre', 'tercero__tipo')
+        .annotate(debe=Sum('debe'), haber=Sum('haber'), movimientos=Sum('movimientos'))
+        .order_by('tercero__codigo')
+    )
+    if pendientes:
+        filas = filas.exclude(debe=F('haber'))
+    resultado = []
+    for fila in filas:
+        fila['debe'], fila['haber'] = fila['debe'].quantize(CENTAVO), fila['haber'].quantize(CENTAVO)
+        fila['saldo'] = _saldo(cuenta, fila['debe'], fila['haber'])
+        resultado.append(fila)
+    return resultado
+
+
+@dataclass
+class EstadoCuenta:
+    saldo_inicial: Decimal
+    lineas: list = field(default_factory=list)  # movimientos con 'saldo' acumulado
+    total_debe: Decimal = Decimal('0.00')
+    total_haber: Decimal = Decimal('0.00')
+
+    @property
+    def saldo_final(self):
+        return self.lineas[-1].saldo if self.lineas else self.saldo_inicial
+
+
+def estado_de_cuenta(tercero, cuenta, periodo):
+    """
+    Estado de cuenta de un tercero en una cuenta durante un período: el
+    saldo inicial sale del acumulado de los períodos anteriores y las
+    líneas, del índice tercero-período de los movimientos.
+    """
+    actualizar()
+    anterior = SaldoTercero.objects.filter(
+        tercero=tercero, cuenta=cuenta, periodo__fecha_inicio__lt=periodo.fecha_inicio,
+    ).aggregate(debe=Sum('debe'), haber=Sum('haber'))
+    saldo = _saldo(cuenta, anterior['debe'] or CERO, anterior['haber'] or CERO).quantize(CENTAVO)
+    estado = EstadoCuenta(saldo_inicial=saldo)
+    for mov in Movimiento.objects.filter(tercero=tercero, periodo=periodo, cuenta=cuenta).select_related('asiento').order_by('fecha', 'asiento_id', 'id'):
+        saldo += _saldo(cuenta, mov.debe, mov.haber)
+        mov.saldo = saldo
+        estado.total_debe += mov.debe
+        estado.total_haber += mov.haber
+        estado.lineas.append(mov)
+    return estado
@@ -0,0 +1,69 @@
+"""
+Lectura de la bitácora de cambios del libro (CambioLibro).
+
+Los consumidores incrementales (cachés de saldos, exportaciones a BI,
+instantáneas) guardan la última secuencia que procesaron y piden solo lo
+que cambió después:
+
+    cursor = estado_guardado or 0
+    while True:
+        cambios, cursor = bitacora.cambios_desde(cursor)
+        if not cambios:
+            break
+        aplicar(cambios)
+        guardar(cursor)
+
+La bitácora se escribe en la misma transacción que cada cambio (ver
+CambioLibro en models.py), así que lo leído nunca se revierte.
+"""
+from .models import CambioLibro
+
+LIMITE_POR_DEFECTO = 1000
+LIMITE_MAXIMO = 10000
+
+
+def ultima_secuencia():
+    """
+    Secuencia del último cambio registrado (0 si la bitácora está vacía).
+    Un consumidor que se construye desde cero parte de este cursor.
+    """
+    return CambioLibro.objects.order_by('-secuencia').values_list('secuencia', flat=True).first() or 0
+
+
+def cambios_desde(cursor=0, limite=LIMITE_POR_DEFECTO, modelos=None, periodo_id=None):
+    """
+    Devuelve (cambios, nuevo_cursor): hasta 'limite' cambios con secuencia
+    mayor que 'cursor', en orden. 'modelos' (lista de CambioLibro.Modelo) y
+    'periodo_id' filtran el resultado. Si no hay cambios, el cursor no se mueve.
+    """
+    limite = max(1, min(int(limite), LIMITE_MAXIMO))
+    cambios = CambioLibro.objects.filter(secuencia__gt=cursor)
+    if modelos:
+        cambios = cambios.filter(modelo__in=modelos)
+    if periodo_id is not None:
+        cambios = cambios.filter(periodo_id=periodo_id)
+    cambios = list(cambios.order_by('secuencia')[:limite])
+    return cambios, (cambios[-1].secuencia if cambios else cursor)
+
+
+def iterar_cambios(cursor=0, lote=LIMITE_POR_DEFECTO, modelos=None, periodo_id=None):
+    """
+    Recorre todos los cambios posteriores a 'cursor', leyendo por lotes.
+    """
+    while True:
+        cambios, cursor = cambios_desde(cursor, lote, modelos, periodo_id)
+        if not cambios:
+            return
+        yield from cambios
+
+
+def como_diccionario(cambio):
+    return {
+        'secuencia': cambio.secuencia,
+        'modelo': cambio.modelo,
+        'operacion': cambio.operacion,
+        'objeto_id': cambio.objeto_id,
+        'periodo_id': cambio.periodo_id,
+        'datos': cambio.datos,
+        'registrado_en': cambio.registrado_en.isoformat(),
+    }
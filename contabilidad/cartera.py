@@ -0,0 +1,579 @@
+"""
+Cartera: partidas abiertas de cuentas por cobrar y por pagar, su
+conciliación y la antigüedad de saldos.
+
+Cada movimiento con tercero en una cuenta de cartera (CUENTAS_CARTERA y sus
+subcuentas) es una PartidaCartera: DOCUMENTO si aumenta el saldo de la
+cuenta según su naturaleza (la factura al debe de Clientes, la obligación
+al haber de una cuenta por pagar) y PAGO si lo disminuye. actualizar() las
+mantiene desde la bitácora, igual que los saldos por tercero: un alta crea
+la partida, una baja la retira y una modificación la rehace; si cambió la
+cuenta, el tercero, el monto o la referencia, se deshacen sus aplicaciones.
+Escribir el libro no paga nada por esto.
+
+conciliar() aplica en lote los pagos pendientes a los documentos pendientes
+del mismo tercero y cuenta con dos búsquedas por diccionario: primero por
+referencia (a los documentos de esa referencia, del vencimiento más antiguo
+al más reciente) y después por monto exacto. Las partidas abiertas se leen
+por los índices parciales (solo las que tienen pendiente), así que el costo
+depende de la cartera abierta y no del tamaño del libro.
+
+antiguedad() agrupa el pendiente de los documentos por tercero y tramo de
+días vencidos (0-30, 31-60, 61-90, más de 90) en una consulta agrupada
+sobre el índice de vencimiento. El pendiente es el de la fecha de corte:
+lo aplicado con un pago (o a un documento) posterior al corte todavía
+estaba pendiente.
+
+reconstruir() recorre todos los movimientos de cartera: lo llama el
+comando conciliar_cartera (cron), nunca una consulta.
+
+Archivar un período elimina sus movimientos y con ellos sus partidas: las
+que siguen abiertas (con pendiente o aplicadas a partidas de períodos que
+no se archivan) vuelven como una línea del asiento de arrastre, con su
+tercero, referencia y vencimiento, y sus aplicaciones con esos períodos se
+rehacen sobre la partida nueva (por_arrastrar() y arrastrar()).
+"""
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from . import bitacora
+from .ledger import a_centavos, a_decimal
+from .models import AplicacionCartera, CambioLibro, ConsumidorBitacora, Cuenta, Movimiento, PartidaCartera
+
+CONSUMIDOR = 'cartera'
+LOTE_BITACORA = 10000
+LOTE = 5000
+CERO = Decimal('0.00')
+CENTAVO = Decimal('0.01')
+_MONTO = DecimalField(max_digits=12, decimal_places=2)
+
+# Clientes (121, 122) y obligaciones por pagar (231-233), con sus subcuentas
+CUENTAS_CARTERA = {
+    'cobrar': ('121', '122'),
+    'pagar': ('231', '232', '233'),
+}
+# Tramos de antigüedad: días vencidos hasta (inclusive) el límite; None es "más de"
+TRAMOS = ((30, '0-30'), (60, '31-60'), (90, '61-90'), (None, '90+'))
+
+
+def cuentas_cartera(cartera=None):
+    """
+    {cuenta_id: naturaleza} de las cuentas de 'cartera' ('cobrar' o
+    'pagar'), o de ambas si es None.
+    """
+    codigos = CUENTAS_CARTERA[cartera] if cartera else sum(CUENTAS_CARTERA.values(), ())
+    condicion = Q()
+    for codigo in codigos:
+        condicion |= Q(codigo__startswith=codigo)
+    return dict(Cuenta.objects.filter(condicion).values_list('pk', 'naturaleza'))
+
+
+def _lotes(ids):
+    ids = list(ids)
+    for inicio in range(0, len(ids), LOTE):
+        yield ids[inicio:inicio + LOTE]
+
+
+# --- Mantenimiento de las partidas ---
+
+def _partida(movimiento_id, datos, cuentas):
+    """
+    La partida (sin guardar) que corresponde al estado 'datos' de un
+    movimiento, o None si el movimiento no es de cartera.
+    """
+    naturaleza = cuentas.get(datos['cuenta_id'])
+    if naturaleza is None or not datos.get('tercero_id'):
+        return None
+    debe, haber = a_centavos(datos['debe']), a_centavos(datos['haber'])
+    aumento = debe - haber if naturaleza == Cuenta.NaturalezaCuenta.DEUDORA else haber - debe
+    if not aumento:
+        return None
+    fecha = datos['fecha'] if isinstance(datos['fecha'], date) else date.fromisoformat(datos['fecha'])
+    monto = a_decimal(abs(aumento))
+    return PartidaCartera(
+        movimiento_id=movimiento_id,
+        cuenta_id=datos['cuenta_id'],
+        tercero_id=datos['tercero_id'],
+        tipo=PartidaCartera.Tipo.DOCUMENTO if aumento > 0 else PartidaCartera.Tipo.PAGO,
+        referencia=datos.get('referencia') or '',
+        fecha=fecha,
+        vencimiento=fecha + timedelta(days=settings.CONTABILIDAD_CARTERA_PLAZO_DIAS),
+        monto=monto,
+        pendiente=monto,
+    )
+
+
+def _quitar_aplicaciones(partida_ids):
+    """
+    Borra las aplicaciones de esas partidas. Devuelve los ids de todas las
+    partidas que tocaban (para recalcular su pendiente).
+    """
+    tocadas = set()
+    for lote in _lotes(partida_ids):
+        aplicaciones = AplicacionCartera.objects.filter(Q(documento_id__in=lote) | Q(pago_id__in=lote))
+        for documento_id, pago_id in aplicaciones.values_list('documento_id', 'pago_id'):
+            tocadas.update((documento_id, pago_id))
+        aplicaciones.delete()
+    return tocadas
+
+
+def _recalcular(partida_ids):
+    """
+    pendiente = monto - lo aplicado, en un UPDATE por lote.
+    """
+    aplicado = lambda campo: Coalesce(
+        Subquery(
+            AplicacionCartera.objects.filter(**{campo: OuterRef('pk')})
+            .values(campo).annotate(total=Sum('monto')).values('total')
+        ),
+        Value(CERO), output_field=_MONTO,
+    )
+    for lote in _lotes(partida_ids):
+        PartidaCartera.objects.filter(pk__in=lote).update(
+            pendiente=F('monto') - aplicado('documento') - aplicado('pago'),
+        )
+
+
+def _de_cartera(datos, cuentas):
+    return bool(datos) and datos['cuenta_id'] in cuentas and bool(datos.get('tercero_id'))
+
+
+def _sincronizar(estados, cuentas):
+    """
+    Deja las partidas de los movimientos de 'estados' ({movimiento_id:
+    datos, o None si se borró}) como corresponde a su último estado. Solo
+    escribe las que cambiaron.
+    """
+    actuales = {}
+    for lote in _lotes(estados):
+        actuales.update((fila[0], fila[1:]) for fila in PartidaCartera.objects.filter(pk__in=lote).values_list(
+            'pk', 'cuenta_id', 'tercero_id', 'tipo', 'monto', 'referencia', 'fecha', 'vencimiento',
+        ))
+    nuevas, modificadas, retirar, deshacer = [], [], [], []
+    for movimiento_id, datos in estados.items():
+        partida = _partida(movimiento_id, datos, cuentas) if datos else None
+        actual = actuales.get(movimiento_id)
+        if partida is None:
+            if actual is not None:
+                retirar.append(movimiento_id)
+            continue
+        if actual is None:
+            nuevas.append(partida)
+            continue
+        *llave, fecha, vencimiento = actual
+        if fecha == partida.fecha:
+            partida.vencimiento = vencimiento  # conserva un vencimiento pactado
+        if tuple(llave) != (partida.cuenta_id, partida.tercero_id, partida.tipo, partida.monto, partida.referencia):
+            deshacer.append(movimiento_id)
+        elif partida.vencimiento == vencimiento and partida.fecha == fecha:
+            continue
+        modificadas.append(partida)
+
+    recalcular = _quitar_aplicaciones(retirar + deshacer) | set(deshacer)
+    for lote in _lotes(retirar):
+        PartidaCartera.objects.filter(pk__in=lote).delete()
+    PartidaCartera.objects.bulk_create(nuevas, batch_size=2000)
+    PartidaCartera.objects.bulk_create(
+        modificadas, batch_size=2000, update_conflicts=True, unique_fields=['movimiento'],
+        update_fields=['cuenta', 'tercero', 'tipo', 'referencia', 'fecha', 'vencimiento', 'monto'],
+    )
+    _recalcular(recalcular - set(retirar))
+
+
+@transaction.atomic
+def reconstruir():
+    """
+    Rehace las partidas desde los movimientos de las cuentas de cartera
+    (conserva las aplicaciones de las que no cambiaron) y deja la posición
+    en la última secuencia de la bitácora. Devuelve la cantidad de partidas.
+    """
+    # Con el candado del libro, nada se escribe entre leer la secuencia y los movimientos
+    CambioLibro.bloquear_escrituras()
+    consumidor, _ = ConsumidorBitacora.objects.select_for_update().get_or_create(nombre=CONSUMIDOR)
+    consumidor.secuencia = bitacora.ultima_secuencia()
+    cuentas = cuentas_cartera()
+
+    vistos, estados = set(), {}
+    for fila in Movimiento.objects.filter(cuenta_id__in=cuentas, tercero__isnull=False).values(
+        'id', *Movimiento.CAMPOS_BITACORA
+    ).iterator(chunk_size=LOTE):
+        vistos.add(fila['id'])
+        estados[fila['id']] = fila
+        if len(estados) == LOTE:
+            _sincronizar(estados, cuentas)
+            estados = {}
+    # Partidas cuyo movimiento ya no existe o ya no es de cartera
+    estados.update((pk, None) for pk in PartidaCartera.objects.values_list('pk', flat=True) if pk not in vistos)
+    _sincronizar(estados, cuentas)
+
+    consumidor.save(update_fields=['secuencia', 'actualizado_en'])
+    return PartidaCartera.objects.count()
+
+
+def construida():
+    """
+    Indica si las partidas ya se construyeron (con reconstruir()).
+    """
+    return ConsumidorBitacora.objects.filter(nombre=CONSUMIDOR).exists()
+
+
+def actualizar():
+    """
+    Aplica a las partidas los cambios de movimientos registrados después de
+    su posición. Si todavía no se construyeron no hace nada (eso es de
+    reconstruir()). Devuelve la cantidad de cambios aplicados.
+    """
+    # Sin cambios nuevos no se toma ningún candado
+    posicion = ConsumidorBitacora.objects.filter(nombre=CONSUMIDOR).values_list('secuencia', flat=True).first()
+    if posicion is not None and not CambioLibro.objects.filter(
+        modelo=CambioLibro.Modelo.MOVIMIENTO, secuencia__gt=posicion,
+    ).exists():
+        return 0
+    return _actualizar()
+
+
+@transaction.atomic
+def _actualizar():
+    consumidor = ConsumidorBitacora.objects.select_for_update().filter(nombre=CONSUMIDOR).first()
+    if consumidor is None:
+        return 0
+
+    cuentas = cuentas_cartera()
+    aplicados = 0
+    cursor = consumidor.secuencia
+    while True:
+        cambios, nuevo_cursor = bitacora.cambios_desde(cursor, LOTE_BITACORA, [CambioLibro.Modelo.MOVIMIENTO])
+        if not cambios:
+            break
+        # Solo importa el último estado de cada movimiento del lote, y solo
+        # de los que están o estuvieron en una cuenta de cartera con tercero
+        estados, de_cartera = {}, set()
+        for cambio in cambios:
+            if _de_cartera(cambio.datos, cuentas) or _de_cartera(cambio.datos.get('anterior'), cuentas):
+                de_cartera.add(cambio.objeto_id)
+            borrado = cambio.operacion == CambioLibro.Operacion.ELIMINACION
+            estados[cambio.objeto_id] = None if borrado else cambio.datos
+        _sincronizar({pk: estados[pk] for pk in de_cartera}, cuentas)
+        aplicados += len(cambios)
+        cursor = nuevo_cursor
+        if len(cambios) < LOTE_BITACORA:
+            break
+
+    if cursor != consumidor.secuencia:
+        consumidor.secuencia = cursor
+        consumidor.save(update_fields=['secuencia', 'actualizado_en'])
+    return aplicados
+
+
+# --- Conciliación ---
+
+@dataclass
+class ResultadoConciliacion:
+    por_referencia: int = 0
+    por_monto: int = 0
+    monto: Decimal = CERO
+    aplicaciones: list = field(default_factory=list)
+
+    @property
+    def total(self):
+        return self.por_referencia + self.por_monto
+
+
+def _aplicar_en(resultado, pago, documentos, automatica=True):
+    # pago y documentos: [pk, pendiente en centavos]; aplica del primero al último
+    aplicadas = 0
+    for documento in documentos:
+        if not pago[1]:
+            break
+        monto = min(pago[1], documento[1])
+        if not monto:
+            continue
+        pago[1] -= monto
+        documento[1] -= monto
+        resultado.monto += a_decimal(monto)
+        resultado.aplicaciones.append(AplicacionCartera(
+            documento_id=documento[0], pago_id=pago[0], monto=a_decimal(monto), automatica=automatica,
+        ))
+        aplicadas += 1
+    return aplicadas
+
+
+@transaction.atomic
+def conciliar(cartera=None, simular=False):
+    """
+    Aplica los pagos pendientes a los documentos pendientes del mismo
+    tercero y cuenta: primero por referencia y después por monto exacto.
+    Con 'simular' todo se escribe y al final se revierte.
+    """
+    if construida():
+        actualizar()
+    else:
+        reconstruir()
+    # Una conciliación a la vez (y ninguna mientras se actualizan las partidas)
+    ConsumidorBitacora.objects.select_for_update().get(nombre=CONSUMIDOR)
+
+    documentos, pagos = [], []
+    abiertas = PartidaCartera.objects.filter(
+        cuenta_id__in=list(cuentas_cartera(cartera)), pendiente__gt=0,
+    ).order_by('vencimiento', 'pk').values_list('pk', 'cuenta_id', 'tercero_id', 'tipo', 'referencia', 'pendiente')
+    for pk, cuenta_id, tercero_id, tipo, referencia, pendiente in abiertas.iterator(chunk_size=LOTE):
+        partida = (cuenta_id, tercero_id, referencia, [pk, a_centavos(pendiente)])
+        (documentos if tipo == PartidaCartera.Tipo.DOCUMENTO else pagos).append(partida)
+
+    resultado = ResultadoConciliacion()
+    # 1. Por referencia: (cuenta, tercero, referencia) -> documentos, del más antiguo al más reciente
+    por_referencia = {}
+    for cuenta_id, tercero_id, referencia, documento in documentos:
+        if referencia:
+            por_referencia.setdefault((cuenta_id, tercero_id, referencia), []).append(documento)
+    for cuenta_id, tercero_id, referencia, pago in pagos:
+        if referencia:
+            resultado.por_referencia += _aplicar_en(
+                resultado, pago, por_referencia.get((cuenta_id, tercero_id, referencia), ()),
+            )
+
+    # 2. Por monto exacto, con lo que quedó pendiente: (cuenta, tercero, centavos) -> documentos
+    por_monto = {}
+    for cuenta_id, tercero_id, _, documento in reversed(documentos):
+        if documento[1]:
+            por_monto.setdefault((cuenta_id, tercero_id, documento[1]), []).append(documento)
+    for cuenta_id, tercero_id, _, pago in pagos:
+        candidatos = por_monto.get((cuenta_id, tercero_id, pago[1])) if pago[1] else None
+        if candidatos:
+            resultado.por_monto += _aplicar_en(resultado, pago, [candidatos.pop()])
+
+    AplicacionCartera.objects.bulk_create(resultado.aplicaciones, batch_size=LOTE)
+    _recalcular({a.documento_id for a in resultado.aplicaciones} | {a.pago_id for a in resultado.aplicaciones})
+    if simular:
+        transaction.set_rollback(True)
+    return resultado
+
+
+def validar_aplicacion(documento, pago, monto=None):
+    """
+    Monto a aplicar del pago al documento (por defecto, lo más que se
+    pueda). Lanza ValidationError si no son del mismo tercero y cuenta o si
+    el monto supera lo pendiente de alguno.
+    """
+    if documento.tipo != PartidaCartera.Tipo.DOCUMENTO or pago.tipo != PartidaCartera.Tipo.PAGO:
+        raise ValidationError("Se aplica un pago a un documento.")
+    if (documento.cuenta_id, documento.tercero_id) != (pago.cuenta_id, pago.tercero_id):
+        raise ValidationError("El pago y el documento deben ser del mismo tercero y de la misma cuenta.")
+    maximo = min(documento.pendiente, pago.pendiente)
+    monto = maximo if monto is None else monto
+    if monto <= 0 or monto > maximo:
+        raise ValidationError(f"El monto debe ser mayor que cero y no mayor que ${maximo}.")
+    return monto
+
+
+@transaction.atomic
+def aplicar(documento, pago, monto=None):
+    """
+    Aplica 'monto' del pago al documento (ver validar_aplicacion) con el
+    pendiente actual de ambos.
+    """
+    ConsumidorBitacora.objects.select_for_update().filter(nombre=CONSUMIDOR).first()
+    documento = PartidaCartera.objects.get(pk=documento.pk)
+    pago = PartidaCartera.objects.get(pk=pago.pk)
+    monto = validar_aplicacion(documento, pago, monto)
+    aplicacion = AplicacionCartera.objects.create(documento=documento, pago=pago, monto=monto)
+    _recalcular([documento.pk, pago.pk])
+    return aplicacion
+
+
+@transaction.atomic
+def deshacer(aplicaciones):
+    """
+    Borra las aplicaciones (un QuerySet) y devuelve lo aplicado al
+    pendiente de sus partidas.
+    """
+    tocadas = set()
+    for documento_id, pago_id in aplicaciones.values_list('documento_id', 'pago_id'):
+        tocadas.update((documento_id, pago_id))
+    borradas, _ = aplicaciones.delete()
+    _recalcular(tocadas)
+    return borradas
+
+
+# --- Consultas ---
+
+def _tramo(corte):
+    cuando = [
+        When(vencimiento__gte=corte - timedelta(days=limite), then=Value(numero))
+        for numero, (limite, _) in enumerate(TRAMOS) if limite is not None
+    ]
+    return Case(*cuando, default=Value(len(TRAMOS) - 1), output_field=IntegerField())
+
+
+def _pendiente_al_corte(corte):
+    """
+    pendiente + lo aplicado con una contrapartida de fecha posterior al
+    corte: lo que la partida tenía pendiente a esa fecha.
+    """
+    devuelto = lambda campo, contrapartida: Coalesce(
+        Subquery(
+            AplicacionCartera.objects.filter(**{campo: OuterRef('pk'), f'{contrapartida}__fecha__gt': corte})
+            .values(campo).annotate(total=Sum('monto')).values('total')
+        ),
+        Value(CERO), output_field=_MONTO,
+    )
+    return ExpressionWrapper(
+        F('pendiente') + devuelto('documento', 'pago') + devuelto('pago', 'documento'), output_field=_MONTO,
+    )
+
+
+def antiguedad(cartera, corte=None):
+    """
+    Antigüedad de la cartera ('cobrar' o 'pagar') a la fecha 'corte' (hoy
+    por defecto): una fila por tercero con el pendiente de sus documentos
+    en cada tramo de días vencidos, los pagos sin aplicar y el saldo neto.
+    Los documentos que aún no vencen cuentan en el primer tramo. Solo
+    cuentan las partidas hasta el corte, con su pendiente a esa fecha.
+    """
+    corte = corte or date.today()
+    actualizar()
+    # Partidas que el corte reabre: las de una aplicación cuya contrapartida
+    # es posterior al corte (con un corte reciente, casi ninguna)
+    reabiertas = set()
+    for documento_id, pago_id in AplicacionCartera.objects.filter(
+        Q(documento__fecha__gt=corte) | Q(pago__fecha__gt=corte),
+    ).values_list('documento_id', 'pago_id'):
+        reabiertas.update((documento_id, pago_id))
+    abiertas = PartidaCartera.objects.filter(
+        Q(pendiente__gt=0) | Q(pk__in=reabiertas), cuenta_id__in=list(cuentas_cartera(cartera)), fecha__lte=corte,
+    ).annotate(al_corte=_pendiente_al_corte(corte) if reabiertas else F('pendiente'))
+    filas = {}
+
+    def fila(valores):
+        return filas.setdefault(valores['tercero_id'], {
+            'tercero_id': valores['tercero_id'],
+            'codigo': valores['tercero__codigo'],
+            'nombre': valores['tercero__nombre'],
+            'tramos': [CERO] * len(TRAMOS),
+            'documentos': 0,
+            'pagos': CERO,
+        })
+
+    for valores in (
+        abiertas.filter(tipo=PartidaCartera.Tipo.DOCUMENTO)
+        .annotate(tramo=_tramo(corte))
+        .values('tercero_id', 'tercero__codigo', 'tercero__nombre', 'tramo')
+        .annotate(pendiente=Sum('al_corte'), documentos=Count('pk'))
+        .order_by()
+    ):
+        actual = fila(valores)
+        # Las sumas no vuelven redondeadas en todos los motores (SQLite)
+        actual['tramos'][valores['tramo']] += valores['pendiente'].quantize(CENTAVO)
+        actual['documentos'] += valores['documentos']
+    for valores in (
+        abiertas.filter(tipo=PartidaCartera.Tipo.PAGO)
+        .values('tercero_id', 'tercero__codigo', 'tercero__nombre')
+        .annotate(pendiente=Sum('al_corte'))
+        .order_by()
+    ):
+        fila(valores)['pagos'] += valores['pendiente'].quantize(CENTAVO)
+
+    resultado = sorted(filas.values(), key=lambda f: f['codigo'])
+    for actual in resultado:
+        actual['total'] = sum(actual['tramos'], CERO)
+        actual['saldo'] = actual['total'] - actual['pagos']
+    return resultado
+
+
+def partidas_abiertas(tercero, cartera):
+    """
+    Partidas con pendiente de un tercero en las cuentas de 'cartera', por
+    vencimiento (índice parcial por tercero).
+    """
+    actualizar()
+    return (
+        PartidaCartera.objects.filter(tercero=tercero, cuenta_id__in=list(cuentas_cartera(cartera)), pendiente__gt=0)
+        .select_related('cuenta', 'movimiento__asiento')
+        .order_by('vencimiento', 'pk')
+    )
+
+
+# --- Archivo histórico ---
+
+@dataclass
+class PartidaArrastrada:
+    vencimiento: date
+    movimiento: Movimiento  # línea del asiento de arrastre (sin asiento)
+    # [(partida_id, monto, automatica)] aplicaciones con partidas que no se archivan
+    aplicaciones: list = field(default_factory=list)
+    es_documento: bool = True
+
+
+def por_arrastrar(periodos):
+    """
+    Pone al día las partidas y devuelve las de 'periodos' que archivarlos
+    dejaría abiertas: las que tienen pendiente y las aplicadas a partidas
+    de períodos que no se archivan (al retirarse reabrirían esas partidas).
+    Cada una trae su línea de arrastre por el pendiente más lo aplicado
+    fuera del archivo, al lado que aumenta el saldo si es un documento y al
+    otro si es un pago.
+    """
+    if construida():
+        actualizar()
+    else:
+        reconstruir()
+    periodo_ids = {periodo.pk for periodo in periodos}
+    del_archivo = PartidaCartera.objects.filter(movimiento__periodo_id__in=periodo_ids).values('pk')
+
+    # Aplicaciones cruzadas: partida archivada -> [(partida de afuera, monto, automática)]
+    cruzadas = {}
+    for documento_id, pago_id, monto, automatica, periodo_documento in AplicacionCartera.objects.filter(
+        Q(documento__in=del_archivo) & ~Q(pago__in=del_archivo) | Q(pago__in=del_archivo) & ~Q(documento__in=del_archivo)
+    ).values_list('documento_id', 'pago_id', 'monto', 'automatica', 'documento__movimiento__periodo_id'):
+        archivada, afuera = (documento_id, pago_id) if periodo_documento in periodo_ids else (pago_id, documento_id)
+        cruzadas.setdefault(archivada, []).append((afuera, monto, automatica))
+
+    naturalezas = cuentas_cartera()
+    arrastradas = []
+    for partida in PartidaCartera.objects.filter(
+        Q(pendiente__gt=0) | Q(pk__in=list(cruzadas)), movimiento__periodo_id__in=periodo_ids,
+    ).order_by('cuenta_id', 'tercero_id', 'vencimiento', 'pk').iterator(chunk_size=LOTE):
+        aplicaciones = cruzadas.get(partida.pk, [])
+        monto = partida.pendiente + sum((m for _, m, _ in aplicaciones), CERO)
+        es_documento = partida.tipo == PartidaCartera.Tipo.DOCUMENTO
+        al_debe = es_documento == (naturalezas[partida.cuenta_id] == Cuenta.NaturalezaCuenta.DEUDORA)
+        arrastradas.append(PartidaArrastrada(
+            vencimiento=partida.vencimiento,
+            movimiento=Movimiento(
+                cuenta_id=partida.cuenta_id, tercero_id=partida.tercero_id, referencia=partida.referencia,
+                debe=monto if al_debe else CERO, haber=CERO if al_debe else monto,
+            ),
+            aplicaciones=aplicaciones,
+            es_documento=es_documento,
+        ))
+    return arrastradas
+
+
+def arrastrar(arrastradas):
+    """
+    Con el asiento de arrastre ya guardado: pone al día las partidas (retira
+    las archivadas y crea las de las líneas de arrastre), devuelve a cada
+    partida nueva su vencimiento y rehace sus aplicaciones con las partidas
+    que no se archivaron.
+    """
+    actualizar()
+    PartidaCartera.objects.bulk_update([
+        PartidaCartera(movimiento_id=a.movimiento.pk, vencimiento=a.vencimiento) for a in arrastradas
+    ], ['vencimiento'], batch_size=2000)
+    aplicaciones = [
+        AplicacionCartera(
+            documento_id=a.movimiento.pk if a.es_documento else afuera,
+            pago_id=afuera if a.es_documento else a.movimiento.pk,
+            monto=monto, automatica=automatica,
+        )
+        for a in arrastradas for afuera, monto, automatica in a.aplicaciones
+    ]
+    AplicacionCartera.objects.bulk_create(aplicaciones, batch_size=LOTE)
+    _recalcular({a.documento_id for a in aplicaciones} | {a.pago_id for a in aplicaciones})
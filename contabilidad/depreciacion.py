@@ -0,0 +1,260 @@
+"""
+Depreciación mensual de los activos fijos.
+
+calcular() carga los activos por depreciar de un período como arreglos de
+NumPy (montos en centavos int64, fechas como índices de mes) y calcula la
+cuota de todos en una sola pasada vectorizada. Para cada método hay una
+fórmula cerrada de la depreciación acumulada después de k meses, y la cuota
+es acumulada(meses al fin del período) - acumulada(meses ya registrados):
+la suma de las cuotas es exactamente el monto depreciable (sin arrastrar
+redondeos) y un período que no se registró se recupera en el siguiente.
+
+La depreciación empieza el mes siguiente al de adquisición y termina al
+completar la vida útil o en el mes de la baja. Lo depreciado antes del
+primer registro de un activo se supone ya contabilizado (depreciado_hasta
+vacío: se empieza por el período indicado).
+
+registrar() convierte el cálculo en un asiento de ajuste consolidado (o uno
+por clase de activo) al último día del período.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import BigIntegerField, F, Q
+from django.db.models.functions import Cast, Round
+
+from .ledger import a_decimal
+from .models import ActivoFijo, AsientoDiario, CambioLibro, ClaseActivo, Cuenta, Movimiento, PeriodoContable
+
+LINEA_RECTA, SALDO_DECRECIENTE, SUMA_DIGITOS = range(3)
+CODIGOS_METODO = {
+    ClaseActivo.Metodo.LINEA_RECTA: LINEA_RECTA,
+    ClaseActivo.Metodo.SALDO_DECRECIENTE: SALDO_DECRECIENTE,
+    ClaseActivo.Metodo.SUMA_DIGITOS: SUMA_DIGITOS,
+}
+# Índice de mes para las fechas vacías (sin baja): nunca se alcanza
+SIN_FECHA = np.iinfo(np.int64).max // 2
+
+
+def _mes(fecha):
+    return fecha.year * 12 + fecha.month - 1
+
+
+def _meses(fechas, vacio):
+    """
+    Índice de mes (año * 12 + mes - 1) de cada fecha; 'vacio' para None.
+    """
+    meses = np.full(len(fechas), vacio, dtype=np.int64)
+    presentes = [i for i, f in enumerate(fechas) if f is not None]
+    if presentes:
+        valores = np.asarray([fechas[i] for i in presentes], dtype='datetime64[M]').astype(np.int64)
+        meses[presentes] = valores + 1970 * 12
+    return meses
+
+
+def acumulada(metodo, base, costo, vida, meses):
+    """
+    Depreciación acumulada (centavos) después de 'meses' meses, para
+    arreglos paralelos de método, monto depreciable, costo y vida útil.
+    Al completar la vida útil es exactamente 'base' en todos los métodos.
+    """
+    meses = np.clip(meses, 0, vida)
+    lineal = base * meses // vida
+    # Suma de dígitos por meses: el mes i (de 1 a n) deprecia (n - i + 1) / S(n)
+    total_digitos = vida * (vida + 1) // 2
+    restantes = vida - meses
+    digitos = base * (total_digitos - restantes * (restantes + 1) // 2) // total_digitos
+    # Doble saldo decreciente sobre el costo, sin pasar del monto depreciable,
+    # hasta el mes en que conviene pasar a línea recta por lo que falta
+    tasa = np.minimum(2.0 / vida, 1.0)
+    cambio = _cambio_a_lineal(base, costo, vida, tasa)
+    saldo_decreciente = lambda k: np.minimum(base, np.rint(costo * (1 - (1 - tasa) ** k)).astype(np.int64))
+    al_cambio = saldo_decreciente(cambio)
+    decreciente = np.where(
+        meses <= cambio,
+        saldo_decreciente(np.minimum(meses, cambio)),
+        al_cambio + (base - al_cambio) * (meses - cambio) // np.maximum(vida - cambio, 1),
+    )
+    decreciente = np.where(meses >= vida, base, decreciente)
+    return np.select([metodo == LINEA_RECTA, metodo == SALDO_DECRECIENTE], [lineal, decreciente], digitos)
+
+
+def _cambio_a_lineal(base, costo, vida, tasa):
+    """
+    Meses de saldo decreciente antes de pasar a línea recta: el primer m en
+    que repartir lo que falta (libro - residual) en los vida - m meses
+    restantes da una cuota mayor o igual que la del saldo decreciente
+    (libro * tasa). Como la cuota lineal nunca alcanza a la decreciente
+    antes de la mitad de la vida útil, solo se revisan esos meses, todos los
+    activos a la vez. Si nunca conviene (un residual alto detiene antes el
+    saldo decreciente), es la vida útil.
+    """
+    residual = costo - base
+    cambio = vida.copy()
+    pendiente = np.ones(len(vida), dtype=bool)
+    desde = (vida + 1) // 2
+    for desplazamiento in range(int((vida - desde).max(initial=0))):
+        m = desde + desplazamiento
+        libro = costo * (1 - tasa) ** m
+        conviene = pendiente & (m < vida) & (libro * (1 - tasa * (vida - m)) >= residual)
+        cambio[conviene] = m[conviene]
+        pendiente &= ~conviene
+        if not pendiente.any():
+            break
+    return cambio
+
+
+def pendientes(periodo):
+    """
+    Activos que pueden tener depreciación por registrar en el período.
+    """
+    return ActivoFijo.objects.filter(
+        Q(depreciado_hasta__isnull=True) | Q(depreciado_hasta__lt=periodo.fecha_fin),
+        fecha_adquisicion__lte=periodo.fecha_fin,
+    )
+
+
+@dataclass
+class CalculoDepreciacion:
+    periodo: PeriodoContable
+    activo_id: np.ndarray
+    clase_id: np.ndarray
+    cuota: np.ndarray  # centavos
+
+    @property
+    def total(self):
+        return a_decimal(self.cuota.sum())
+
+    def por_clase(self):
+        """
+        {clase_id: cuota total en centavos} de las clases con depreciación.
+        """
+        if not len(self.cuota):
+            return {}
+        clases, indice = np.unique(self.clase_id, return_inverse=True)
+        totales = np.zeros(len(clases), dtype=np.int64)
+        np.add.at(totales, indice, self.cuota)
+        return {int(c): int(t) for c, t in zip(clases.tolist(), totales.tolist()) if t}
+
+
+def calcular(periodo):
+    """
+    Cuota de depreciación del período de cada activo pendiente.
+    """
+    filas = list(pendientes(periodo).annotate(
+        costo_centavos=Cast(Round(F('costo') * 100), BigIntegerField()),
+        residual_centavos=Cast(Round(F('valor_residual') * 100), BigIntegerField()),
+    ).values_list(
+        'pk', 'clase_id', 'costo_centavos', 'residual_centavos',
+        'vida_util_meses', 'clase__vida_util_meses', 'metodo', 'clase__metodo',
+        'fecha_adquisicion', 'fecha_baja', 'depreciado_hasta',
+    ).order_by('pk'))
+    if not filas:
+        vacio = np.zeros(0, dtype=np.int64)
+        return CalculoDepreciacion(periodo, vacio, vacio, vacio)
+
+    (activo_id, clase_id, costo, residual, vida, vida_clase,
+     metodo, metodo_clase, adquisicion, baja, depreciado) = zip(*filas)
+    costo = np.asarray(costo, dtype=np.int64)
+    base = costo - np.asarray(residual, dtype=np.int64)
+    vida = np.asarray([v or vc for v, vc in zip(vida, vida_clase)], dtype=np.int64)
+    metodo = np.asarray([CODIGOS_METODO[m or mc] for m, mc in zip(metodo, metodo_clase)], dtype=np.int64)
+
+    mes_adquisicion = _meses(adquisicion, 0)
+    mes_baja = _meses(baja, SIN_FECHA)
+    # Meses ya registrados: hasta depreciado_hasta o, sin registros, hasta el mes anterior al período
+    mes_registrado = _meses(depreciado, _mes(periodo.fecha_inicio) - 1)
+    meses_fin = np.minimum(_mes(periodo.fecha_fin), mes_baja) - mes_adquisicion
+    meses_previos = np.minimum(mes_registrado, mes_baja) - mes_adquisicion
+
+    cuota = (
+        acumulada(metodo, base, costo, vida, meses_fin)
+        - acumulada(metodo, base, costo, vida, meses_previos)
+    )
+    return CalculoDepreciacion(
+        periodo,
+        np.asarray(activo_id, dtype=np.int64),
+        np.asarray(clase_id, dtype=np.int64),
+        np.maximum(cuota, 0),
+    )
+
+
+@dataclass
+class ResultadoDepreciacion:
+    periodo: PeriodoContable
+    asientos: list = field(default_factory=list)
+    activos: int = 0
+    total: Decimal = Decimal('0.00')
+    por_clase: dict = field(default_factory=dict)  # nombre de la clase -> monto
+
+
+@transaction.atomic
+def registrar(periodo, por_clase=False, usuario=None, simular=False):
+    """
+    Registra la depreciación del período: un asiento con el gasto y la
+    depreciación acumulada de todas las clases, o uno por clase si
+    'por_clase'. Marca los activos como depreciados hasta el fin del período,
+    así que volver a ejecutarlo no duplica nada.
+
+    Lanza ValidationError si el período está cerrado o si una cuenta de las
+    clases a depreciar no es imputable o está inactiva (no se escribe nada).
+    Con 'simular' todo se escribe y al final se revierte.
+    """
+    # Mismo orden que el registro y el cierre: candado del libro y luego el estado real
+    CambioLibro.bloquear_escrituras()
+    periodo = PeriodoContable.objects.get(pk=periodo.pk)
+    if periodo.estado == PeriodoContable.EstadoPeriodo.CERRADO:
+        raise ValidationError(f"El período '{periodo.nombre}' está cerrado. No se pueden registrar transacciones.")
+
+    calculo = calcular(periodo)
+    totales = calculo.por_clase()
+    clases = ClaseActivo.objects.in_bulk(list(totales))
+    cuentas = {c.cuenta_gasto_id for c in clases.values()} | {c.cuenta_depreciacion_id for c in clases.values()}
+    validas = set(Cuenta.objects.filter(pk__in=cuentas, es_imputable=True, esta_activa=True).values_list('pk', flat=True))
+    if cuentas - validas:
+        codigos = Cuenta.objects.filter(pk__in=cuentas - validas).values_list('codigo', flat=True)
+        raise ValidationError(f"Las cuentas {', '.join(sorted(codigos))} no son imputables o están inactivas.")
+    resultado = ResultadoDepreciacion(periodo=periodo, activos=len(calculo.cuota), total=calculo.total)
+    resultado.por_clase = {clases[c].nombre: a_decimal(t) for c, t in totales.items()}
+
+    # (descripción, {(cuenta_id, lado): centavos}) de cada asiento
+    grupos = []
+    if por_clase:
+        for clase_id, centavos in totales.items():
+            clase = clases[clase_id]
+            grupos.append((f"Depreciación de {clase.nombre} - {periodo.nombre}", {
+                (clase.cuenta_gasto_id, 'debe'): centavos,
+                (clase.cuenta_depreciacion_id, 'haber'): centavos,
+            }))
+    elif totales:
+        lineas = {}
+        for clase_id, centavos in totales.items():
+            clase = clases[clase_id]
+            for llave in ((clase.cuenta_gasto_id, 'debe'), (clase.cuenta_depreciacion_id, 'haber')):
+                lineas[llave] = lineas.get(llave, 0) + centavos
+        grupos.append((f"Depreciación de activos fijos - {periodo.nombre}", lineas))
+
+    movimientos = []
+    for descripcion, lineas in grupos:
+        asiento = AsientoDiario(
+            periodo=periodo, fecha=periodo.fecha_fin, descripcion=descripcion,
+            creado_por=usuario, es_ajuste=True,
+        )
+        asiento.save()
+        resultado.asientos.append(asiento)
+        for (cuenta_id, lado), centavos in sorted(lineas.items(), key=lambda l: (l[0][1] != 'debe', l[0][0])):
+            monto = a_decimal(centavos)
+            movimientos.append(Movimiento(
+                asiento=asiento, cuenta_id=cuenta_id,
+                debe=monto if lado == 'debe' else Decimal('0.00'),
+                haber=monto if lado == 'haber' else Decimal('0.00'),
+            ))
+    Movimiento.objects.bulk_create(movimientos)
+
+    pendientes(periodo).update(depreciado_hasta=periodo.fecha_fin)
+    if simular:
+        transaction.set_rollback(True)
+    return resultado
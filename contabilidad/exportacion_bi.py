@@ -0,0 +1,245 @@
+"""
+Extracción incremental del libro para BI, a partir de la bitácora de cambios.
+
+Cada exportación cubre un tramo de la bitácora (desde, hasta] y deja, en un
+directorio propio dentro de CONTABILIDAD_BI_DIR/<modelo>/, uno o varios
+archivos comprimidos (NDJSON o CSV, partidos cada N filas) y un
+manifest.json con el tramo, las columnas, las filas y el SHA-256 de cada
+archivo. El 'hasta' del manifiesto es la marca de agua: la siguiente
+exportación parte de ahí, así que el volumen de cada carga depende de la
+actividad del día y no del tamaño del libro.
+
+Dentro de un tramo solo se emite el último estado de cada objeto (si un
+movimiento se editó tres veces, sale una fila). Las bajas salen con
+operacion 'D' y los valores que tenía el objeto, para que el destino las
+borre; las altas y modificaciones se cargan como upsert por 'id'.
+
+Como la bitácora solo contiene lo ocurrido desde que existe, la primera
+exportación es completa: copia la tabla actual y toma como marca de agua
+la última secuencia leída antes de copiarla.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import zlib
+from itertools import chain, count, islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max, Subquery
+from django.utils import timezone
+
+from . import bitacora
+from .archivo_historico import sha256
+from .models import AsientoDiario, CambioLibro, Cuenta, Movimiento
+
+FORMATO = 1
+FORMATOS_ARCHIVO = ('ndjson', 'csv')
+FILAS_POR_ARCHIVO = 100_000
+ARCHIVO_MANIFIESTO = 'manifest.json'
+
+MODELOS = {
+    CambioLibro.Modelo.CUENTA: Cuenta,
+    CambioLibro.Modelo.ASIENTO: AsientoDiario,
+    CambioLibro.Modelo.MOVIMIENTO: Movimiento,
+}
+
+
+def directorio_base():
+    return Path(getattr(settings, 'CONTABILIDAD_BI_DIR', Path(settings.BASE_DIR) / 'exportacion_bi'))
+
+
+def columnas(modelo):
+    """
+    Columnas de cada fila exportada: secuencia, operacion, id y los campos
+    que la bitácora guarda para el modelo.
+    """
+    return ('secuencia', 'operacion', 'id') + MODELOS[modelo].CAMPOS_BITACORA
+
+
+# --- Filas ---
+
+def filas_incrementales(modelo, desde, hasta):
+    """
+    Último cambio de cada objeto con secuencia en (desde, hasta], en orden
+    de secuencia. Una sola consulta: el MAX por objeto va como subconsulta
+    sobre el índice (modelo, secuencia).
+    """
+    ultimas = CambioLibro.objects.filter(
+        modelo=modelo, secuencia__gt=desde, secuencia__lte=hasta
+    ).values('objeto_id').annotate(ultima=Max('secuencia')).values('ultima')
+    cambios = CambioLibro.objects.filter(secuencia__in=Subquery(ultimas)).order_by('secuencia')
+
+    campos = MODELOS[modelo].CAMPOS_BITACORA
+    for secuencia, operacion, objeto_id, datos in cambios.values_list(
+        'secuencia', 'operacion', 'objeto_id', 'datos'
+    ).iterator(chunk_size=5000):
+        fila = {'secuencia': secuencia, 'operacion': operacion, 'id': objeto_id}
+        fila.update((campo, datos.get(campo)) for campo in campos)
+        yield fila
+
+
+def filas_completas(modelo, hasta):
+    """
+    Todas las filas actuales de la tabla, como altas con secuencia 'hasta'.
+    """
+    clase = MODELOS[modelo]
+    for valores in clase.objects.order_by('pk').values('id', *clase.CAMPOS_BITACORA).iterator(chunk_size=5000):
+        yield {'secuencia': hasta, 'operacion': CambioLibro.Operacion.INSERCION.value, **valores}
+
+
+# --- Serialización ---
+
+def _a_texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+def lineas(filas, formato, encabezado):
+    """
+    Convierte las filas en líneas de texto NDJSON o CSV (con la fila de
+    encabezado al inicio si 'formato' es csv). Decimales y fechas se
+    escriben como texto, igual que en la bitácora.
+    """
+    if formato == 'ndjson':
+        for fila in filas:
+            yield json.dumps(fila, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+        return
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+    escritor.writerow(encabezado)
+    yield buffer.getvalue()
+    for fila in filas:
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerow([_a_texto(fila.get(c)) for c in encabezado])
+        yield buffer.getvalue()
+
+
+def comprimir(textos, nivel=6):
+    """
+    Comprime al vuelo un iterable de textos como un único flujo gzip
+    (para respuestas HTTP). Entrega bloques de ~64 KB.
+    """
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    pendiente = []
+    tamano = 0
+    for texto in textos:
+        datos = texto.encode('utf-8')
+        pendiente.append(datos)
+        tamano += len(datos)
+        if tamano >= 1 << 16:
+            bloque = compresor.compress(b''.join(pendiente))
+            pendiente, tamano = [], 0
+            if bloque:
+                yield bloque
+    yield compresor.compress(b''.join(pendiente)) + compresor.flush()
+
+
+# --- Exportación a archivos ---
+
+def _leer_manifiesto(directorio):
+    with open(directorio / ARCHIVO_MANIFIESTO, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _contar(filas, info):
+    for fila in filas:
+        info['filas'] += 1
+        yield fila
+
+
+def ultimo_manifiesto(modelo):
+    """
+    Manifiesto de la exportación con mayor marca de agua del modelo (o None).
+    Solo cuentan los directorios con manifiesto: se escribe al final.
+    """
+    directorio = directorio_base() / modelo.lower()
+    if not directorio.is_dir():
+        return None
+    manifiestos = [
+        _leer_manifiesto(d) for d in directorio.iterdir()
+        if d.is_dir() and not d.name.startswith('.') and (d / ARCHIVO_MANIFIESTO).exists()
+    ]
+    return max(manifiestos, key=lambda m: m['hasta'], default=None)
+
+
+def exportar(modelo, desde=None, completa=False, formato='ndjson', filas_por_archivo=FILAS_POR_ARCHIVO):
+    """
+    Exporta los cambios del modelo posteriores a 'desde' (por defecto, la
+    marca de agua de la última exportación). Si no hay exportación previa o
+    'completa' es True, exporta la tabla entera.
+    Devuelve el manifiesto, o None si no hubo cambios desde la marca de agua.
+    """
+    if formato not in FORMATOS_ARCHIVO:
+        raise ValueError(f"Formato no válido: {formato}.")
+    if desde is None and not completa:
+        anterior = ultimo_manifiesto(modelo)
+        if anterior is None:
+            completa = True
+        else:
+            desde = anterior['hasta']
+
+    # La marca de agua se fija antes de leer: lo que llegue mientras se
+    # exporta queda para la siguiente corrida (los upserts son idempotentes).
+    hasta = bitacora.ultima_secuencia()
+    if completa:
+        desde = 0
+        filas = filas_completas(modelo, hasta)
+    else:
+        if hasta <= desde:
+            return None
+        filas = filas_incrementales(modelo, desde, hasta)
+
+    encabezado = columnas(modelo)
+    nombre_tramo = f'{desde:012d}-{hasta:012d}' + ('-completa' if completa else '')
+    base = directorio_base() / modelo.lower()
+    destino = base / nombre_tramo
+    temporal = base / f'.{nombre_tramo}.tmp'
+    shutil.rmtree(temporal, ignore_errors=True)
+    temporal.mkdir(parents=True)
+
+    archivos = []
+    filas = iter(filas)
+    for numero in count(1):
+        primera = next(filas, None)
+        if primera is None:
+            break
+        parte = chain([primera], islice(filas, filas_por_archivo - 1))
+        info = {'nombre': f'parte-{numero:05d}.{formato}.gz', 'filas': 0}
+        with gzip.open(temporal / info['nombre'], 'wt', encoding='utf-8', newline='') as salida:
+            salida.writelines(lineas(_contar(parte, info), formato, encabezado))
+        archivos.append(info)
+
+    for info in archivos:
+        info['sha256'] = sha256(temporal / info['nombre'])
+
+    manifiesto = {
+        'formato': FORMATO,
+        'modelo': modelo,
+        'tipo': 'completa' if completa else 'incremental',
+        'desde': desde,
+        'hasta': hasta,
+        'formato_archivo': formato,
+        'columnas': list(encabezado),
+        'filas': sum(info['filas'] for info in archivos),
+        'archivos': archivos,
+        'creado_en': timezone.now().isoformat(),
+    }
+    with open(temporal / ARCHIVO_MANIFIESTO, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporal, destino)
+    manifiesto['directorio'] = str(destino)
+    return manifiesto
@@ -2,7 +2,7 @@ from django import forms
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.forms import inlineformset_factory, modelformset_factory
-from .models import AsientoDiario, Movimiento, PeriodoContable, Cuenta,CostoIndirectoAnual,CosteoProyecto,SalarioEstimadoMODAnual
+from .models import AsientoDiario, Movimiento, PeriodoContable, Cuenta,CostoIndirectoAnual,CosteoProyecto,SalarioEstimadoMODAnual, Tercero
 from django.core.exceptions import ValidationError
 
 class AsientoDiarioForm(forms.ModelForm):
@@ -19,7 +19,8 @@ class AsientoDiarioForm(forms.ModelForm):
 
     class Meta:
         model = AsientoDiario
-        fields = ['fecha', 'periodo', 'descripcion']
+        fields = ['fecha', 'periodo', 'descripcion', 'es_ajuste']
+        labels = {'es_ajuste': 'Asiento de ajuste'}
         widgets = {
             'fecha': forms.DateInput(
                 attrs={
@@ -33,6 +34,9 @@ class AsientoDiarioForm(forms.ModelForm):
                     'class': 'block w-full mt-1 rounded-md border-gray-300 shadow-sm focus:border-sic-primary focus:ring-sic-primary'
                 }
             ),
+            'es_ajuste': forms.CheckboxInput(
+                attrs={'class': 'rounded border-gray-300 text-sic-primary focus:ring-sic-primary'}
+            ),
         }
 
 # --- Formset para los Movimientos (Líneas de la partida) ---
@@ -49,11 +53,32 @@ class MovimientoForm(forms.ModelForm):
         ).order_by('codigo'),
         widget=forms.Select(attrs={'class': 'w-full rounded-md border-gray-300 shadow-sm focus:border-sic-primary focus:ring-sic-primary'})
     )
+    # Cliente, proveedor o empleado de la línea, por código (miles de terceros no caben en un select)
+    tercero = forms.ModelChoiceField(
+        queryset=Tercero.objects.all(),
+        to_field_name='codigo',
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'w-full rounded-md border-gray-300 shadow-sm', 'placeholder': 'Código (opcional)'}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # El valor inicial es el id; se pasa el objeto para mostrar su código
+        if self.instance.tercero_id:
+            self.initial['tercero'] = self.instance.tercero
+
+    def clean_tercero(self):
+        tercero = self.cleaned_data.get('tercero')
+        # Un tercero inactivo no recibe líneas nuevas, pero las que ya tiene se pueden editar
+        if tercero and not tercero.activo and tercero.pk != self.instance.tercero_id:
+            raise ValidationError(f"El tercero '{tercero.codigo}' está inactivo.")
+        return tercero
 
     class Meta:
         model = Movimiento
-        fields = ['cuenta', 'debe', 'haber']
+        fields = ['cuenta', 'tercero', 'referencia', 'debe', 'haber']
         widgets = {
+            'referencia': forms.TextInput(attrs={'class': 'w-full rounded-md border-gray-300 shadow-sm', 'placeholder': 'Referencia (opcional)'}),
             'debe': forms.NumberInput(attrs={'class': 'debe-input w-full text-right rounded-md border-gray-300 shadow-sm', 'min': '0', 'step': '0.01', 'value': '0.00'}),
             'haber': forms.NumberInput(attrs={'class': 'haber-input w-full text-right rounded-md border-gray-300 shadow-sm', 'min': '0', 'step': '0.01', 'value': '0.00'}),
         }
@@ -152,6 +177,7 @@ class CuentaForm(forms.ModelForm):
             'padre', 
             'tipo_cuenta', 
             'naturaleza', 
+            'categoria_flujo',
             'es_imputable'
         ]
         widgets = {
@@ -173,6 +199,9 @@ class CuentaForm(forms.ModelForm):
             'naturaleza': forms.Select(
                 attrs={'class': 'block w-full mt-1 rounded-md border-gray-300 shadow-sm focus:border-sic-primary focus:ring-sic-primary'}
             ),
+            'categoria_flujo': forms.Select(
+                attrs={'class': 'block w-full mt-1 rounded-md border-gray-300 shadow-sm focus:border-sic-primary focus:ring-sic-primary'}
+            ),
             'es_imputable': forms.CheckboxInput(
                 attrs={'class': 'h-4 w-4 text-sic-primary rounded border-gray-300 focus:ring-sic-primary'}
             ),
@@ -181,6 +210,7 @@ class CuentaForm(forms.ModelForm):
             'padre': 'Seleccione la cuenta de grupo a la que pertenece.',
             'tipo_cuenta': 'Clasificación para reportes financieros.',
             'naturaleza': 'Indica si el saldo normal es Deudor o Acreedor.',
+            'categoria_flujo': 'Vacía = se hereda de la cuenta padre.',
         }
 
     # --- INICIO DE MODIFICACIÓN ---
@@ -0,0 +1,157 @@
+"""
+Instrumentación SQL por solicitud (opcional).
+
+Con CONTABILIDAD_INSTRUMENTACION_SQL activo, InstrumentacionSQLMiddleware
+mide cada consulta de la solicitud con un execute_wrapper y deja:
+  - la cabecera Server-Timing (tiempo en BD, cantidad de consultas y total),
+  - una línea JSON en el logger 'contabilidad.sql' con las consultas más
+    lentas y las huellas repetidas (candidatas a N+1),
+  - las peores solicitudes recientes de cada vista en memoria, para la página
+    de administración 'instrumentacion_sql'.
+
+Desactivado, el middleware se retira de la cadena al arrancar
+(MiddlewareNotUsed) y no agrega costo. CONTABILIDAD_INSTRUMENTACION_MUESTREO
+permite medir solo una fracción de las solicitudes.
+
+Las peores solicitudes viven en la memoria de cada proceso: con varios
+workers, la página muestra las del worker que la atiende. El cuerpo de las
+respuestas en streaming (api_bi_cambios) se genera después del middleware y
+no queda medido.
+"""
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger('contabilidad.sql')
+
+CONSULTAS_LENTAS = 5        # consultas más lentas que se guardan por solicitud
+REPETICIONES_N_MAS_1 = 3    # veces que debe repetirse una huella para reportarla
+PEORES_POR_VISTA = 10       # solicitudes que se conservan por vista
+LARGO_SQL = 500
+
+_peores = defaultdict(list)
+_candado = threading.Lock()
+
+_LISTA_PARAMETROS = re.compile(r'\((?:%s, )+%s\)')
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def huella(sql):
+    """
+    Forma normalizada de una consulta: los literales pasan a '?' y las
+    listas IN (%s, %s, ...) a una sola marca, para que la misma consulta con
+    distintos parámetros cuente como repetida.
+    """
+    return _LITERALES.sub('?', _LISTA_PARAMETROS.sub('(%s, ...)', sql))
+
+
+class RegistroConsultas:
+    """
+    execute_wrapper que anota (sql, milisegundos) de cada consulta ejecutada.
+    """
+
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append((sql, (time.perf_counter() - inicio) * 1000))
+
+
+def resumir(request, respuesta, consultas, total_ms):
+    """
+    Resumen de una solicitud instrumentada: totales, las consultas más
+    lentas (con la vista que las ejecutó) y las huellas repetidas.
+    """
+    coincidencia = getattr(request, 'resolver_match', None)
+    vista = coincidencia.view_name if coincidencia else request.path
+    lentas = sorted(consultas, key=lambda c: c[1], reverse=True)[:CONSULTAS_LENTAS]
+    repetidas = Counter(huella(sql) for sql, _ in consultas)
+    return {
+        'vista': vista,
+        'ruta': request.get_full_path(),
+        'metodo': request.method,
+        'estado': respuesta.status_code,
+        'ms': round(total_ms, 1),
+        'consultas': len(consultas),
+        'ms_bd': round(sum(ms for _, ms in consultas), 1),
+        'lentas': [{'vista': vista, 'sql': sql[:LARGO_SQL], 'ms': round(ms, 2)} for sql, ms in lentas],
+        'repetidas': [
+            {'sql': sql[:LARGO_SQL], 'veces': veces}
+            for sql, veces in repetidas.most_common() if veces >= REPETICIONES_N_MAS_1
+        ],
+        'fecha': timezone.now().isoformat(),
+    }
+
+
+def registrar(resumen):
+    """
+    Conserva el resumen si está entre las PEORES_POR_VISTA solicitudes más
+    lentas de su vista.
+    """
+    with _candado:
+        lista = _peores[resumen['vista']]
+        lista.append(resumen)
+        lista.sort(key=lambda r: r['ms'], reverse=True)
+        del lista[PEORES_POR_VISTA:]
+
+
+def peores():
+    """
+    [(vista, [resumenes...]), ...] ordenado por la solicitud más lenta de cada vista.
+    """
+    with _candado:
+        vistas = [(vista, list(lista)) for vista, lista in _peores.items()]
+    return sorted(vistas, key=lambda v: v[1][0]['ms'], reverse=True)
+
+
+def limpiar():
+    with _candado:
+        _peores.clear()
+
+
+def server_timing(resumen):
+    return (
+        f"db;dur={resumen['ms_bd']};desc=\"{resumen['consultas']} consultas\", "
+        f"total;dur={resumen['ms']}"
+    )
+
+
+class InstrumentacionSQLMiddleware:
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CONTABILIDAD_INSTRUMENTACION_SQL', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.muestreo = getattr(settings, 'CONTABILIDAD_INSTRUMENTACION_MUESTREO', 1.0)
+
+    def __call__(self, request):
+        if self.muestreo < 1 and random.random() >= self.muestreo:
+            return self.get_response(request)
+
+        registro = RegistroConsultas()
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(registro))
+            respuesta = self.get_response(request)
+        resumen = resumir(request, respuesta, registro.consultas, (time.perf_counter() - inicio) * 1000)
+
+        previo = respuesta.get('Server-Timing')
+        respuesta['Server-Timing'] = f"{previo}, {server_timing(resumen)}" if previo else server_timing(resumen)
+        logger.info(json.dumps(resumen, ensure_ascii=False))
+        registrar(resumen)
+        return respuesta
@@ -0,0 +1,305 @@
+"""
+Motor vectorizado del libro mayor para análisis (LedgerFrame).
+
+Carga los movimientos de uno o varios períodos (o de un rango de fechas)
+como arreglos paralelos de NumPy: cuenta, período, asiento, fecha (ordinal)
+y montos en centavos int64, más las banderas de asiento automático y de
+apertura. Los agregados por cuenta, período, día o tipo se calculan con
+sumas agrupadas vectorizadas y exactas (enteros), y solo al final se
+convierten a Decimal.
+
+Los períodos archivados se leen del archivo histórico y el resto de la base
+de datos, así que un mismo LedgerFrame puede cubrir varios años.
+"""
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+from .models import ArchivoPeriodo, Cuenta, Movimiento, PeriodoContable
+
+# date(1970, 1, 1).toordinal(): convierte datetime64[D] a date.toordinal()
+ORDINAL_EPOCA = 719163
+
+
+def a_centavos(valor):
+    return int((Decimal(valor) * 100).to_integral_value())
+
+
+def a_decimal(centavos):
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+def ids_asientos_apertura():
+    """
+    Ids de los asientos de apertura (referenciados desde el período anterior).
+    """
+    return set(
+        PeriodoContable.objects.filter(asiento_apertura_siguiente__isnull=False)
+        .values_list('asiento_apertura_siguiente_id', flat=True)
+    )
+
+
+class LedgerFrame:
+    """
+    Movimientos contables como columnas NumPy. Los filtros devuelven un nuevo
+    LedgerFrame; los agregados devuelven diccionarios con montos Decimal.
+    """
+    COLUMNAS = {
+        'cuenta_id': np.int64,
+        'periodo_id': np.int64,
+        'asiento_id': np.int64,
+        'fecha': np.int32,          # date.toordinal()
+        'debe': np.int64,           # centavos
+        'haber': np.int64,          # centavos
+        'es_automatico': np.bool_,
+        'es_apertura': np.bool_,
+    }
+
+    def __init__(self, **columnas):
+        for nombre, tipo in self.COLUMNAS.items():
+            setattr(self, nombre, np.asarray(columnas[nombre], dtype=tipo))
+
+    def __len__(self):
+        return len(self.cuenta_id)
+
+    # --- Construcción ---
+
+    @classmethod
+    def vacio(cls):
+        return cls(**{nombre: [] for nombre in cls.COLUMNAS})
+
+    @classmethod
+    def concatenar(cls, marcos):
+        marcos = [m for m in marcos if len(m)]
+        if not marcos:
+            return cls.vacio()
+        if len(marcos) == 1:
+            return marcos[0]
+        return cls(**{
+            nombre: np.concatenate([getattr(m, nombre) for m in marcos])
+            for nombre in cls.COLUMNAS
+        })
+
+    @classmethod
+    def desde_archivo(cls, archivo, columnas):
+        """
+        Construye el marco a partir de las columnas de un período archivado
+        (ver archivo_historico.columnas). No copia los arreglos mapeados.
+        """
+        return cls(
+            cuenta_id=columnas['cuenta_id'],
+            periodo_id=np.full(len(columnas['cuenta_id']), archivo.periodo_id, dtype=np.int64),
+            asiento_id=columnas['asiento_id'],
+            fecha=columnas['fecha'],
+            debe=columnas['debe'],
+            haber=columnas['haber'],
+            es_automatico=columnas['es_automatico'],
+            es_apertura=columnas['es_apertura'],
+        )
+
+    @classmethod
+    def desde_queryset(cls, movimientos, ids_apertura=None):
+        """
+        Carga un queryset de Movimiento. La base de datos entrega los montos
+        ya convertidos a centavos enteros, así no se crea un Decimal por fila.
+        """
+        filas = list(movimientos.annotate(
+            debe_centavos=Cast(Round(F('debe') * 100), BigIntegerField()),
+            haber_centavos=Cast(Round(F('haber') * 100), BigIntegerField()),
+        ).values_list(
+            'cuenta_id', 'periodo_id', 'asiento_id', 'fecha',
+            'debe_centavos', 'haber_centavos', 'es_asiento_automatico'
+        ).order_by())
+        if not filas:
+            return cls.vacio()
+
+        cuenta_id, periodo_id, asiento_id, fecha, debe, haber, es_automatico = zip(*filas)
+        asiento_id = np.asarray(asiento_id, dtype=np.int64)
+        if ids_apertura is None:
+            ids_apertura = ids_asientos_apertura()
+        return cls(
+            cuenta_id=cuenta_id,
+            periodo_id=periodo_id,
+            asiento_id=asiento_id,
+            fecha=np.asarray(fecha, dtype='datetime64[D]').astype(np.int64) + ORDINAL_EPOCA,
+            debe=debe,
+            haber=haber,
+            es_automatico=es_automatico,
+            es_apertura=np.isin(asiento_id, list(ids_apertura)),
+        )
+
+    @classmethod
+    def desde_periodos(cls, periodos):
+        """
+        Movimientos de los períodos indicados (archivados o no).
+        """
+        from . import archivo_historico
+
+        periodos = list(periodos)
+        ids_apertura = ids_asientos_apertura()
+        marcos = []
+        en_base = []
+        for periodo in periodos:
+            archivo = archivo_historico.archivo_de(periodo)
+            if archivo:
+                marcos.append(cls.desde_archivo(archivo, archivo_historico.columnas(archivo)))
+            else:
+                en_base.append(periodo.pk)
+        if en_base:
+            marcos.append(cls.desde_queryset(Movimiento.objects.filter(periodo_id__in=en_base), ids_apertura))
+        return cls.concatenar(marcos)
+
+    @classmethod
+    def desde_rango(cls, fecha_desde=None, fecha_hasta=None):
+        """
+        Movimientos con fecha dentro del rango (ambos extremos opcionales e
+        incluidos). Los períodos archivados se leen del archivo; sus asientos
+        de arrastre, que viven en períodos archivados, no se duplican.
+        """
+        from . import archivo_historico
+
+        archivos = ArchivoPeriodo.objects.all()
+        movimientos = Movimiento.objects.filter(periodo__archivo__isnull=True)
+        if fecha_desde:
+            archivos = archivos.filter(periodo__fecha_fin__gte=fecha_desde)
+            movimientos = movimientos.filter(fecha__gte=fecha_desde)
+        if fecha_hasta:
+            archivos = archivos.filter(periodo__fecha_inicio__lte=fecha_hasta)
+            movimientos = movimientos.filter(fecha__lte=fecha_hasta)
+
+        marcos = [cls.desde_archivo(a, archivo_historico.columnas(a)) for a in archivos]
+        marcos.append(cls.desde_queryset(movimientos))
+        marco = cls.concatenar(marcos)
+        if fecha_desde:
+            marco = marco.desde(fecha_desde)
+        if fecha_hasta:
+            marco = marco.hasta(fecha_hasta)
+        return marco
+
+    # --- Filtros ---
+
+    def filtrar(self, mascara):
+        return LedgerFrame(**{nombre: getattr(self, nombre)[mascara] for nombre in self.COLUMNAS})
+
+    def sin_automaticos(self):
+        return self.filtrar(~self.es_automatico)
+
+    def sin_aperturas(self):
+        return self.filtrar(~self.es_apertura)
+
+    def de_cuentas(self, cuentas_ids):
+        return self.filtrar(np.isin(self.cuenta_id, list(cuentas_ids)))
+
+    def desde(self, fecha):
+        return self.filtrar(self.fecha >= fecha.toordinal())
+
+    def hasta(self, fecha):
+        return self.filtrar(self.fecha <= fecha.toordinal())
+
+    def desde_ultima_apertura(self):
+        """
+        Movimientos desde el último asiento de apertura (incluido). Un asiento
+        de apertura reexpresa todos los saldos de balance, así que lo anterior
+        a él no debe sumarse otra vez.
+        """
+        if not self.es_apertura.any():
+            return self
+        return self.filtrar(self.fecha >= self.fecha[self.es_apertura].max())
+
+    def contrapartidas(self, cuentas_ids):
+        """
+        Líneas que NO son de 'cuentas_ids' dentro de los asientos que sí
+        tienen alguna línea en 'cuentas_ids'.
+        """
+        en_cuentas = np.isin(self.cuenta_id, list(cuentas_ids))
+        asientos = np.unique(self.asiento_id[en_cuentas])
+        return self.filtrar(np.isin(self.asiento_id, asientos) & ~en_cuentas)
+
+    # --- Agregados ---
+
+    def _agrupar(self, llave):
+        """
+        Suma debe y haber por cada valor distinto de 'llave' (ordenando y
+        sumando por tramos). Devuelve (llaves, debe, haber) en centavos.
+        """
+        if not len(self):
+            vacio = np.zeros(0, dtype=np.int64)
+            return vacio, vacio, vacio
+        orden = np.argsort(llave, kind='stable')
+        llave_ordenada = llave[orden]
+        inicios = np.flatnonzero(np.r_[True, llave_ordenada[1:] != llave_ordenada[:-1]])
+        return (
+            llave_ordenada[inicios],
+            np.add.reduceat(self.debe[orden], inicios),
+            np.add.reduceat(self.haber[orden], inicios),
+        )
+
+    @staticmethod
+    def _a_diccionario(llaves, debe, haber, convertir=int):
+        return {
+            convertir(llave): (a_decimal(d), a_decimal(h))
+            for llave, d, h in zip(llaves.tolist(), debe.tolist(), haber.tolist())
+        }
+
+    def totales(self):
+        """
+        (total_debe, total_haber) de todo el marco.
+        """
+        return a_decimal(self.debe.sum()), a_decimal(self.haber.sum())
+
+    def por_cuenta(self):
+        """
+        {cuenta_id: (total_debe, total_haber)}
+        """
+        return self._a_diccionario(*self._agrupar(self.cuenta_id))
+
+    def por_periodo(self):
+        """
+        {periodo_id: (total_debe, total_haber)}
+        """
+        return self._a_diccionario(*self._agrupar(self.periodo_id))
+
+    def por_dia(self):
+        """
+        {fecha: (total_debe, total_haber)}, con las fechas en orden.
+        """
+        return self._a_diccionario(*self._agrupar(self.fecha), convertir=date.fromordinal)
+
+    def por_cuenta_y_periodo(self):
+        """
+        {(cuenta_id, periodo_id): (total_debe, total_haber)}
+        """
+        if not len(self):
+            return {}
+        periodos, periodo_idx = np.unique(self.periodo_id, return_inverse=True)
+        llave = self.cuenta_id * len(periodos) + periodo_idx
+        llaves, debe, haber = self._agrupar(llave)
+        return {
+            (int(llave // len(periodos)), int(periodos[llave % len(periodos)])): (a_decimal(d), a_decimal(h))
+            for llave, d, h in zip(llaves.tolist(), debe.tolist(), haber.tolist())
+        }
+
+    def por_grupo(self, grupo_por_cuenta):
+        """
+        Suma por un atributo de la cuenta (ej. tipo_cuenta).
+        'grupo_por_cuenta' es {cuenta_id: grupo}; las cuentas que no estén
+        en el diccionario se omiten. Devuelve {grupo: (total_debe, total_haber)}.
+        """
+        sumas = {}
+        for cuenta_id, d, h in zip(*(a.tolist() for a in self._agrupar(self.cuenta_id))):
+            grupo = grupo_por_cuenta.get(cuenta_id)
+            if grupo is None:
+                continue
+            previo_debe, previo_haber = sumas.get(grupo, (0, 0))
+            sumas[grupo] = (previo_debe + d, previo_haber + h)
+        return {grupo: (a_decimal(d), a_decimal(h)) for grupo, (d, h) in sumas.items()}
+
+    def por_tipo(self):
+        """
+        {tipo_cuenta: (total_debe, total_haber)}
+        """
+        tipos = dict(Cuenta.objects.filter(pk__in=np.unique(self.cuenta_id).tolist()).values_list('pk', 'tipo_cuenta'))
+        return self.por_grupo(tipos)
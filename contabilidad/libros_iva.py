@@ -0,0 +1,197 @@
+"""
+Libros de IVA (Compras y Ventas) y resumen mensual.
+
+Se generan desde DatoFiscal, la tabla aparte con los datos del documento
+de cada movimiento de IVA. Cada libro es una consulta agrupada sobre su
+índice (período, libro, fecha y número del documento) unida por llave
+primaria a los movimientos etiquetados, y nunca recorre el resto del libro
+diario. Las filas se leen con iterator() y se convierten en CSV al vuelo
+(exportacion_bi.lineas), así que un libro con miles de documentos no se
+arma completo en memoria.
+
+El IVA de cada documento es el monto de su movimiento: debe - haber en
+compras (crédito fiscal) y haber - debe en ventas (débito fiscal), así que
+una nota de crédito registrada al lado contrario resta sola.
+
+Los períodos archivados guardan sus datos fiscales en el archivo histórico
+(archivo_historico.datos_fiscales): sus libros y su resumen se agrupan en
+memoria con las mismas columnas.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import archivo_historico
+from .models import Cuenta, DatoFiscal, Movimiento
+
+# Cuentas de IVA del catálogo (y sus subcuentas): sus movimientos deberían tener datos fiscales
+CUENTAS_IVA = {
+    DatoFiscal.Libro.COMPRAS: '141',  # IVA Crédito Fiscal
+    DatoFiscal.Libro.VENTAS: '221',   # IVA Débito Fiscal
+}
+
+COLUMNAS_LIBRO = (
+    'fecha_documento', 'tipo_documento', 'numero_documento', 'tercero_nit', 'tercero_nombre',
+    'monto_exento', 'base_gravada', 'iva', 'total', 'partida',
+)
+COLUMNAS_RESUMEN = ('concepto', 'tipo_documento', 'documentos', 'monto_exento', 'base_gravada', 'iva')
+
+_MONTO = DecimalField(max_digits=14, decimal_places=2)
+CERO = Decimal('0.00')
+COLUMNAS_MONTO = ('monto_exento', 'base_gravada', 'iva', 'total')
+
+
+def _al_centavo(filas):
+    # Las sumas de expresiones no vuelven redondeadas en todos los motores (SQLite)
+    for fila in filas:
+        for columna in COLUMNAS_MONTO:
+            if fila.get(columna) is not None:
+                fila[columna] = fila[columna].quantize(CERO)
+        yield fila
+
+
+def _iva(libro):
+    if libro == DatoFiscal.Libro.COMPRAS:
+        return F('movimiento__debe') - F('movimiento__haber')
+    return F('movimiento__haber') - F('movimiento__debe')
+
+
+def _del_periodo(periodo):
+    # El período también sobre el movimiento: con la tabla particionada, la
+    # unión lee solo la partición del período
+    return DatoFiscal.objects.filter(periodo=periodo, movimiento__periodo=periodo)
+
+
+def _iva_de(libro, debe, haber):
+    return debe - haber if libro == DatoFiscal.Libro.COMPRAS else haber - debe
+
+
+def _filas_archivadas(archivo, libro):
+    # Mismo agrupamiento que filas_libro, sobre los datos fiscales del archivo
+    documentos = {}
+    for dato in archivo_historico.datos_fiscales(archivo):
+        if dato['libro'] != libro:
+            continue
+        llave = tuple(dato[columna] for columna in COLUMNAS_LIBRO[:5])
+        fila = documentos.setdefault(llave, {
+            **dict(zip(COLUMNAS_LIBRO[:5], llave)),
+            'monto_exento': CERO, 'base_gravada': CERO, 'iva': CERO, 'partida': 0,
+        })
+        fila['monto_exento'] += dato['monto_exento']
+        fila['base_gravada'] += dato['base_gravada']
+        fila['iva'] += _iva_de(libro, dato['debe'], dato['haber'])
+        fila['partida'] = max(fila['partida'], dato['partida'])
+    for fila in documentos.values():
+        fila['total'] = fila['monto_exento'] + fila['base_gravada'] + fila['iva']
+    return sorted(documentos.values(), key=lambda fila: (fila['fecha_documento'], fila['numero_documento']))
+
+
+def filas_libro(periodo, libro):
+    """
+    Un diccionario por documento del libro ('COMPRAS' o 'VENTAS') del
+    período, en orden de fecha y número. Las líneas de IVA de un mismo
+    documento se suman en una sola fila.
+    """
+    archivo = archivo_historico.archivo_de(periodo)
+    if archivo:
+        return _al_centavo(_filas_archivadas(archivo, libro))
+    return _al_centavo(
+        _del_periodo(periodo).filter(libro=libro)
+        .values('fecha_documento', 'tipo_documento', 'numero_documento', 'tercero_nit', 'tercero_nombre')
+        .annotate(
+            monto_exento=Sum('monto_exento'),
+            base_gravada=Sum('base_gravada'),
+            iva=Sum(ExpressionWrapper(_iva(libro), output_field=_MONTO)),
+            partida=Max('movimiento__asiento__numero_partida'),
+        )
+        .annotate(total=ExpressionWrapper(F('monto_exento') + F('base_gravada') + F('iva'), output_field=_MONTO))
+        .order_by('fecha_documento', 'numero_documento')
+        .iterator(chunk_size=2000)
+    )
+
+
+def sin_datos_fiscales(periodo):
+    """
+    Cantidad de movimientos del período en las cuentas de IVA (por libro)
+    que no tienen datos fiscales: lo que falta etiquetar antes de declarar.
+    """
+    archivo = archivo_historico.archivo_de(periodo)
+    faltantes = {}
+    for libro, codigo in CUENTAS_IVA.items():
+        if archivo:
+            cuentas_ids = Cuenta.objects.filter(codigo__startswith=codigo).values_list('pk', flat=True)
+            faltantes[libro] = archivo_historico.movimientos_sin_datos_fiscales(archivo, cuentas_ids)
+            continue
+        faltantes[libro] = Movimiento.objects.filter(
+            periodo=periodo, cuenta__codigo__startswith=codigo, dato_fiscal__isnull=True,
+        ).count()
+    return faltantes
+
+
+def _totales_archivados(archivo):
+    # Mismos totales por libro y tipo de documento que la consulta de resumen()
+    totales = {}
+    for dato in archivo_historico.datos_fiscales(archivo):
+        total = totales.setdefault((dato['libro'], dato['tipo_documento']), {
+            'libro': dato['libro'], 'tipo_documento': dato['tipo_documento'], 'documentos': 0,
+            'exento': CERO, 'base': CERO, 'debe': CERO, 'haber': CERO,
+        })
+        total['documentos'] += 1
+        total['exento'] += dato['monto_exento']
+        total['base'] += dato['base_gravada']
+        total['debe'] += dato['debe']
+        total['haber'] += dato['haber']
+    return [totales[llave] for llave in sorted(totales)]
+
+
+def resumen(periodo):
+    """
+    Resumen mensual del IVA: totales por libro y tipo de documento (una
+    consulta agrupada), el débito y el crédito fiscal del período y el
+    impuesto a pagar (o el remanente de crédito fiscal).
+    """
+    archivo = archivo_historico.archivo_de(periodo)
+    totales = _totales_archivados(archivo) if archivo else (
+        _del_periodo(periodo)
+        .values('libro', 'tipo_documento')
+        .annotate(
+            documentos=Count('pk'),
+            exento=Coalesce(Sum('monto_exento'), Value(CERO), output_field=_MONTO),
+            base=Coalesce(Sum('base_gravada'), Value(CERO), output_field=_MONTO),
+            debe=Coalesce(Sum('movimiento__debe'), Value(CERO), output_field=_MONTO),
+            haber=Coalesce(Sum('movimiento__haber'), Value(CERO), output_field=_MONTO),
+        )
+        .order_by('libro', 'tipo_documento')
+    )
+
+    filas = []
+    iva_libro = {libro: CERO for libro in DatoFiscal.Libro.values}
+    for total in totales:
+        libro = total['libro']
+        iva = _iva_de(libro, total['debe'], total['haber'])
+        iva_libro[libro] += iva
+        filas.append({
+            'concepto': DatoFiscal.Libro(libro).label,
+            'tipo_documento': total['tipo_documento'],
+            'documentos': total['documentos'],
+            'monto_exento': total['exento'],
+            'base_gravada': total['base'],
+            'iva': iva,
+        })
+
+    debito = iva_libro[DatoFiscal.Libro.VENTAS]
+    credito = iva_libro[DatoFiscal.Libro.COMPRAS]
+    filas.append({'concepto': 'Débito fiscal del período', 'iva': debito})
+    filas.append({'concepto': 'Crédito fiscal del período', 'iva': credito})
+    if debito >= credito:
+        filas.append({'concepto': 'Impuesto a pagar', 'iva': debito - credito})
+    else:
+        filas.append({'concepto': 'Remanente de crédito fiscal', 'iva': credito - debito})
+    for libro, cantidad in sin_datos_fiscales(periodo).items():
+        if cantidad:
+            filas.append({
+                'concepto': f'Movimientos de {CUENTAS_IVA[libro]} sin datos fiscales',
+                'documentos': cantidad,
+            })
+    return list(_al_centavo(filas))
@@ -0,0 +1,170 @@
+import shutil
+from datetime import date
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from contabilidad.models import PeriodoContable, AsientoDiario, Movimiento, ArchivoPeriodo
+from contabilidad import archivo_historico, cartera
+from contabilidad.ledger import LedgerFrame, a_centavos, a_decimal, ids_asientos_apertura
+
+# python manage.py archivar_periodos --hasta 2024-12-31
+# python manage.py archivar_periodos --periodo 3 --periodo 4
+# python manage.py archivar_periodos --verificar
+
+class Command(BaseCommand):
+    help = ('Archiva los movimientos de períodos cerrados en archivos columnares y los reemplaza '
+            'en la base de datos por un asiento de arrastre con el saldo neto de cada cuenta (y de cada tercero) '
+            'y una línea por cada partida de cartera abierta.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Archiva los períodos cerrados que terminan en o antes de esta fecha (AAAA-MM-DD).')
+        parser.add_argument('--periodo', type=int, action='append', default=[], metavar='PERIODO_ID', help='Archiva un período específico (se puede repetir).')
+        parser.add_argument('--verificar', action='store_true', help='Verifica los checksums de todos los archivos existentes.')
+
+    def handle(self, *args, **options):
+        if options['verificar']:
+            return self._verificar()
+
+        if not options['hasta'] and not options['periodo']:
+            raise CommandError('Indique --hasta o al menos un --periodo.')
+
+        periodos = PeriodoContable.objects.filter(archivo__isnull=True)
+        if options['hasta']:
+            periodos = periodos.filter(fecha_fin__lte=options['hasta'])
+        if options['periodo']:
+            periodos = periodos.filter(pk__in=options['periodo'])
+        periodos = list(periodos.order_by('fecha_inicio'))
+
+        if not periodos:
+            self.stdout.write(self.style.WARNING('No hay períodos por archivar.'))
+            return
+
+        abiertos = [p.nombre for p in periodos if p.estado != PeriodoContable.EstadoPeriodo.CERRADO]
+        if abiertos:
+            raise CommandError(f"Solo se archivan períodos cerrados. Abiertos: {', '.join(abiertos)}.")
+
+        # El asiento de arrastre resume todo lo anterior a él: solo se archivan
+        # los períodos más antiguos, sin dejar huecos.
+        pendientes = PeriodoContable.objects.filter(
+            archivo__isnull=True,
+            fecha_inicio__lt=periodos[-1].fecha_inicio
+        ).exclude(pk__in=[p.pk for p in periodos])
+        if pendientes.exists():
+            nombres = ', '.join(pendientes.order_by('fecha_inicio').values_list('nombre', flat=True))
+            raise CommandError(f"Hay períodos anteriores sin archivar ({nombres}). Archívelos en el mismo lote.")
+
+        rutas_creadas = []
+        try:
+            with transaction.atomic():
+                self._archivar(periodos, rutas_creadas)
+        except Exception:
+            # La transacción se revirtió: borrar los archivos que alcanzaron a escribirse
+            for ruta in rutas_creadas:
+                shutil.rmtree(archivo_historico.directorio_base() / ruta, ignore_errors=True)
+            raise
+
+    def _archivar(self, periodos, rutas_creadas):
+        ids_apertura = ids_asientos_apertura()
+        ultimo = periodos[-1]
+
+        # 1. Exportar cada período y verificar lo escrito antes de borrar nada
+        exportados = []
+        for periodo in periodos:
+            ruta, manifiesto, checksum = archivo_historico.exportar_periodo(periodo, ids_apertura)
+            rutas_creadas.append(ruta)
+            if Decimal(manifiesto['total_debe']) != Decimal(manifiesto['total_haber']):
+                raise CommandError(f"El período '{periodo.nombre}' está descuadrado. No se archivó nada.")
+            exportados.append((periodo, ruta, manifiesto, checksum))
+            self.stdout.write(self.style.NOTICE(f" -> '{periodo.nombre}': {manifiesto['filas']} movimientos exportados a {ruta}."))
+
+        for periodo, ruta, manifiesto, checksum in exportados:
+            registro = ArchivoPeriodo(ruta=ruta, checksum_manifiesto=checksum)
+            errores = archivo_historico.verificar(registro)
+            if errores:
+                raise CommandError(f"El archivo de '{periodo.nombre}' no pasó la verificación: {errores}")
+
+        # 2. Saldo de cada cuenta al final del último período archivado
+        #    (desde el último asiento de apertura, igual que los reportes)
+        #    Lo que se borra con tercero vuelve en una línea por (cuenta, tercero)
+        #    con su neto, así los saldos por tercero (auxiliares) no cambian; el
+        #    resto del saldo de la cuenta va en una línea sin tercero.
+        saldos = LedgerFrame.desde_rango(fecha_hasta=ultimo.fecha_fin).desde_ultima_apertura().por_cuenta()
+        netos = {cuenta_id: a_centavos(debe) - a_centavos(haber) for cuenta_id, (debe, haber) in saldos.items()}
+        por_tercero = {}
+        for cuenta_id, tercero_id, debe, haber in Movimiento.objects.filter(
+            periodo__in=periodos, tercero__isnull=False,
+        ).values('cuenta_id', 'tercero_id').annotate(debe=Sum('debe'), haber=Sum('haber')).values_list(
+            'cuenta_id', 'tercero_id', 'debe', 'haber',
+        ).order_by('cuenta_id', 'tercero_id'):
+            por_tercero.setdefault(cuenta_id, []).append((tercero_id, a_centavos(debe) - a_centavos(haber)))
+
+        #    Las partidas de cartera abiertas vuelven una por una (con su
+        #    referencia) y salen del neto de su tercero
+        arrastradas = cartera.por_arrastrar(periodos)
+        lineas_arrastre = [partida.movimiento for partida in arrastradas]
+        abiertas = {}
+        for mov in lineas_arrastre:
+            llave = (mov.cuenta_id, mov.tercero_id)
+            abiertas[llave] = abiertas.get(llave, 0) + a_centavos(mov.debe) - a_centavos(mov.haber)
+
+        for cuenta_id in sorted(set(netos) | set(por_tercero)):
+            terceros = por_tercero.get(cuenta_id, [])
+            resto = netos.get(cuenta_id, 0) - sum(neto for _, neto in terceros)
+            for tercero_id, neto in [*terceros, (None, resto)]:
+                neto -= abiertas.get((cuenta_id, tercero_id), 0)
+                if neto:
+                    lineas_arrastre.append(Movimiento(
+                        cuenta_id=cuenta_id, tercero_id=tercero_id,
+                        debe=a_decimal(max(neto, 0)), haber=a_decimal(max(-neto, 0)),
+                    ))
+
+        # 3. Eliminar los asientos archivados (los movimientos se borran en cascada)
+        AsientoDiario.objects.filter(periodo__in=periodos).delete()
+
+        # 4. Asiento de arrastre en el último período archivado
+        asiento_arrastre = None
+        if lineas_arrastre:
+            asiento_arrastre = AsientoDiario.objects.create(
+                periodo=ultimo,
+                fecha=ultimo.fecha_fin,
+                descripcion=f"Saldos arrastrados de períodos archivados ({periodos[0].nombre} a {ultimo.nombre})",
+                es_asiento_automatico=True
+            )
+            for mov in lineas_arrastre:
+                mov.asiento = asiento_arrastre
+            Movimiento.objects.bulk_create(lineas_arrastre)
+            cartera.arrastrar(arrastradas)
+
+        ArchivoPeriodo.objects.bulk_create([
+            ArchivoPeriodo(
+                periodo=periodo,
+                ruta=ruta,
+                num_movimientos=manifiesto['filas'],
+                total_debe=Decimal(manifiesto['total_debe']),
+                total_haber=Decimal(manifiesto['total_haber']),
+                checksum_manifiesto=checksum,
+                asiento_arrastre=asiento_arrastre,
+                fecha_arrastre=ultimo.fecha_fin,
+            )
+            for periodo, ruta, manifiesto, checksum in exportados
+        ])
+
+        total = sum(m['filas'] for _, _, m, _ in exportados)
+        self.stdout.write(self.style.SUCCESS(
+            f'--- {len(periodos)} período(s) archivados ({total} movimientos). '
+            f'Asiento de arrastre con {len(lineas_arrastre)} líneas en \'{ultimo.nombre}\'. ---'
+        ))
+
+    def _verificar(self):
+        errores_totales = 0
+        for registro in ArchivoPeriodo.objects.select_related('periodo'):
+            errores = archivo_historico.verificar(registro)
+            if errores:
+                errores_totales += len(errores)
+                for error in errores:
+                    self.stdout.write(self.style.ERROR(f"{registro.periodo.nombre}: {error}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{registro.periodo.nombre}: OK ({registro.num_movimientos} movimientos)"))
+        if errores_totales:
+            raise CommandError(f'Se encontraron {errores_totales} errores en el archivo histórico.')
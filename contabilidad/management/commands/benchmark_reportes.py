@@ -0,0 +1,255 @@
+import io
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+from contabilidad.models import PeriodoContable, Cuenta, Movimiento
+from contabilidad.views import _crear_asiento_cierre
+
+# python manage.py benchmark_reportes                                  -> tamaños 200 y 2000 asientos por período
+# python manage.py benchmark_reportes --tamanos 1000,10000,100000 --salida bench.json
+# python manage.py benchmark_reportes --presupuestos presupuestos.json --vista balance_general
+#
+# Cada tamaño se mide en una base de datos de prueba nueva (como el test runner:
+# 'test_<nombre>' o SQLite en memoria), llenada con generate_ledger. La base real
+# no se toca.
+
+# Consultas máximas por vista. Ninguna debe depender del tamaño del libro: si una
+# vista pasa de su presupuesto casi siempre es un N+1. Un archivo --presupuestos
+# ({"vista": {"consultas": n, "ms": m}}) reemplaza o completa estos valores.
+PRESUPUESTOS = {
+    'dashboard': {'consultas': 17},
+    # La plantilla del catálogo es recursiva: una consulta por cuenta (crece con el catálogo, no con el libro)
+    'gestionar_catalogo': {'consultas': 200},
+    'libro_mayor_detalle': {'consultas': 19},
+    'libro_mayor_saldos': {'consultas': 18},
+    'balanza_comprobacion': {'consultas': 17},
+    'balanza_rango': {'consultas': 17},
+    'hoja_de_trabajo': {'consultas': 17},
+    'estado_resultados': {'consultas': 21},
+    'balance_general': {'consultas': 23},
+    'flujo_efectivo': {'consultas': 23},
+    'estado_patrimonio': {'consultas': 19},
+    'registrar_asiento': {'consultas': 32},
+    'cerrar_periodo': {'consultas': 49},
+    'abrir_periodo': {'consultas': 112},
+}
+
+
+class Command(BaseCommand):
+    help = ('Mide tiempo, consultas SQL y memoria pico de los reportes, el dashboard, el catálogo, el registro '
+            'de asientos, el cierre y la apertura sobre libros generados de tamaño creciente. Escribe los '
+            'resultados en JSON y falla si una vista excede su presupuesto de consultas o de latencia.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', default='200,2000',
+                            help='Asientos por período de cada libro generado, separados por comas.')
+        parser.add_argument('--periodos', type=int, default=3)
+        parser.add_argument('--lineas', type=int, default=4)
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--repeticiones', type=int, default=3, help='Mediciones por vista (se informa la mediana).')
+        parser.add_argument('--vista', action='append', default=[], help='Mide solo esta vista (se puede repetir).')
+        parser.add_argument('--presupuestos', help='Archivo JSON con presupuestos por vista.')
+        parser.add_argument('--salida', default='benchmark_reportes.json', help='Archivo JSON de resultados.')
+
+    def handle(self, *args, **options):
+        try:
+            tamanos = [int(t) for t in options['tamanos'].split(',') if t.strip()]
+        except ValueError:
+            raise CommandError('--tamanos debe ser una lista de enteros separados por comas.')
+        if not tamanos or min(tamanos) < 1 or options['repeticiones'] < 1:
+            raise CommandError('--tamanos y --repeticiones deben ser mayores que cero.')
+
+        presupuestos = {vista: dict(valores) for vista, valores in PRESUPUESTOS.items()}
+        if options['presupuestos']:
+            with open(options['presupuestos'], encoding='utf-8') as f:
+                for vista, valores in json.load(f).items():
+                    presupuestos.setdefault(vista, {}).update(valores)
+
+        resultados = []
+        setup_test_environment()
+        try:
+            for tamano in tamanos:
+                resultados.extend(self._medir_tamano(tamano, options))
+        finally:
+            teardown_test_environment()
+
+        fallas = self._fallas(resultados, presupuestos)
+        with open(options['salida'], 'w', encoding='utf-8') as f:
+            json.dump({
+                'creado_en': timezone.now().isoformat(),
+                'base_de_datos': connection.vendor,
+                'parametros': {
+                    'tamanos': tamanos,
+                    'periodos': options['periodos'],
+                    'lineas': options['lineas'],
+                    'semilla': options['semilla'],
+                    'repeticiones': options['repeticiones'],
+                },
+                'presupuestos': presupuestos,
+                'resultados': resultados,
+                'fallas': fallas,
+            }, f, ensure_ascii=False, indent=2)
+
+        self._imprimir(resultados)
+        self.stdout.write(f'Resultados en {options["salida"]}.')
+        if fallas:
+            for falla in fallas:
+                self.stdout.write(self.style.ERROR(f' - {falla}'))
+            raise CommandError(f'{len(fallas)} vista(s) fuera de presupuesto.')
+        self.stdout.write(self.style.SUCCESS('--- Todas las vistas dentro de presupuesto. ---'))
+
+    # --- Medición ---
+
+    def _medir_tamano(self, tamano, options):
+        configuracion = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            inicio = time.perf_counter()
+            call_command(
+                'generate_ledger', periodos=options['periodos'], asientos=tamano, lineas=options['lineas'],
+                semilla=options['semilla'], cierre=True, stdout=io.StringIO()
+            )
+            movimientos = Movimiento.objects.count()
+            self.stdout.write(self.style.NOTICE(
+                f" -> Libro de {tamano} asientos por período: {movimientos} movimientos "
+                f"({time.perf_counter() - inicio:.1f} s)."
+            ))
+
+            cliente = Client()
+            cliente.force_login(get_user_model().objects.filter(is_superuser=True).order_by('pk').first())
+            resultados = []
+            for vista, metodo, url, datos, preparar in self._escenarios():
+                if options['vista'] and vista not in options['vista']:
+                    continue
+                medicion = self._medir(cliente, metodo, url, datos, preparar, options['repeticiones'])
+                medicion.update({'tamano': tamano, 'movimientos': movimientos, 'vista': vista})
+                resultados.append(medicion)
+            return resultados
+        finally:
+            teardown_databases(configuracion, verbosity=0)
+
+    def _escenarios(self):
+        """
+        (vista, método, url, datos POST, preparar). Las vistas que escriben
+        se miden dentro de una transacción que se revierte, así que todas se
+        pueden repetir sobre el mismo libro; 'preparar' deja el estado que la
+        vista necesita (dentro de esa misma transacción).
+        """
+        abierto = PeriodoContable.objects.get(estado=PeriodoContable.EstadoPeriodo.ABIERTO)
+        primero = PeriodoContable.objects.order_by('fecha_inicio').first()
+        banco = Cuenta.objects.get(codigo='113')
+        ventas = Cuenta.objects.get(codigo='41')
+        usuario = get_user_model().objects.filter(is_superuser=True).order_by('pk').first()
+        rango = f'?fecha_desde={primero.fecha_inicio}&fecha_hasta={abierto.fecha_fin}'
+
+        def cerrar_abierto():
+            _crear_asiento_cierre(PeriodoContable.objects.get(pk=abierto.pk), usuario)
+
+        return [
+            ('dashboard', 'get', reverse('contabilidad:dashboard'), None, None),
+            ('gestionar_catalogo', 'get', reverse('contabilidad:gestionar_catalogo'), None, None),
+            ('libro_mayor_detalle', 'get', reverse('contabilidad:libro_mayor_detalle', args=[abierto.pk, banco.pk]), None, None),
+            ('libro_mayor_saldos', 'get', reverse('contabilidad:libro_mayor_saldos', args=[abierto.pk, banco.pk]), None, None),
+            ('balanza_comprobacion', 'get', reverse('contabilidad:balanza_comprobacion', args=[abierto.pk]), None, None),
+            ('balanza_rango', 'get', reverse('contabilidad:balanza_rango') + rango, None, None),
+            ('hoja_de_trabajo', 'get', reverse('contabilidad:hoja_de_trabajo') + rango, None, None),
+            ('estado_resultados', 'get', reverse('contabilidad:estado_resultados', args=[abierto.pk]), None, None),
+            ('balance_general', 'get', reverse('contabilidad:balance_general', args=[abierto.pk]), None, None),
+            ('flujo_efectivo', 'get', reverse('contabilidad:flujo_efectivo', args=[abierto.pk]), None, None),
+            ('estado_patrimonio', 'get', reverse('contabilidad:estado_patrimonio', args=[abierto.pk]), None, None),
+            ('registrar_asiento', 'post', reverse('contabilidad:registrar_asiento'), {
+                'fecha': abierto.fecha_fin.isoformat(), 'periodo': abierto.pk, 'descripcion': 'Benchmark',
+                'movimientos-TOTAL_FORMS': '2', 'movimientos-INITIAL_FORMS': '0',
+                'movimientos-MIN_NUM_FORMS': '2', 'movimientos-MAX_NUM_FORMS': '1000',
+                'movimientos-0-cuenta': banco.pk, 'movimientos-0-debe': '300.00', 'movimientos-0-haber': '0.00',
+                'movimientos-1-cuenta': ventas.pk, 'movimientos-1-debe': '0.00', 'movimientos-1-haber': '300.00',
+            }, None),
+            ('cerrar_periodo', 'post', reverse('contabilidad:cerrar_periodo', args=[abierto.pk]), {}, None),
+            ('abrir_periodo', 'post', reverse('contabilidad:gestionar_periodos'), {
+                'nombre': 'Benchmark apertura',
+                'fecha_inicio': (abierto.fecha_fin + timedelta(days=1)).isoformat(),
+                'fecha_fin': (abierto.fecha_fin + timedelta(days=30)).isoformat(),
+            }, cerrar_abierto),
+        ]
+
+    def _medir(self, cliente, metodo, url, datos, preparar, repeticiones):
+        """
+        Una pasada de calentamiento, 'repeticiones' pasadas con tiempo y
+        consultas, y una pasada con tracemalloc para la memoria pico (aparte,
+        porque tracemalloc hace más lenta la ejecución).
+        """
+        def ejecutar():
+            with transaction.atomic():
+                if preparar:
+                    preparar()
+                # El registro de consultas guarda a lo sumo 9000: se vacía antes de medir
+                reset_queries()
+                with CaptureQueriesContext(connection) as consultas:
+                    inicio = time.perf_counter()
+                    respuesta = getattr(cliente, metodo)(url, datos)
+                    duracion = time.perf_counter() - inicio
+                transaction.set_rollback(True)
+            return respuesta.status_code, duracion, len(consultas)
+
+        ejecutar()
+        tiempos = []
+        for _ in range(repeticiones):
+            estado, duracion, consultas = ejecutar()
+            tiempos.append(duracion * 1000)
+
+        tracemalloc.start()
+        try:
+            ejecutar()
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'estado': estado,
+            'ms': round(statistics.median(tiempos), 2),
+            'ms_min': round(min(tiempos), 2),
+            'consultas': consultas,
+            'memoria_pico_kb': round(pico / 1024, 1),
+        }
+
+    # --- Resultados ---
+
+    def _fallas(self, resultados, presupuestos):
+        fallas = []
+        consultas_por_vista = {}
+        for r in resultados:
+            etiqueta = f"{r['vista']} ({r['tamano']} asientos/período)"
+            esperado = 302 if r['vista'] in ('registrar_asiento', 'cerrar_periodo', 'abrir_periodo') else 200
+            if r['estado'] != esperado:
+                fallas.append(f"{etiqueta}: respondió {r['estado']} (se esperaba {esperado}).")
+            presupuesto = presupuestos.get(r['vista'], {})
+            if 'consultas' in presupuesto and r['consultas'] > presupuesto['consultas']:
+                fallas.append(f"{etiqueta}: {r['consultas']} consultas (presupuesto {presupuesto['consultas']}).")
+            if 'ms' in presupuesto and r['ms'] > presupuesto['ms']:
+                fallas.append(f"{etiqueta}: {r['ms']} ms (presupuesto {presupuesto['ms']} ms).")
+            consultas_por_vista.setdefault(r['vista'], set()).add(r['consultas'])
+        for vista, conteos in consultas_por_vista.items():
+            if len(conteos) > 1:
+                fallas.append(f"{vista}: las consultas cambian con el tamaño del libro ({sorted(conteos)}), posible N+1.")
+        return fallas
+
+    def _imprimir(self, resultados):
+        self.stdout.write(f"{'vista':<22} {'asientos':>9} {'movs':>9} {'estado':>6} {'ms':>10} {'consultas':>9} {'mem. KB':>10}")
+        for r in resultados:
+            self.stdout.write(
+                f"{r['vista']:<22} {r['tamano']:>9} {r['movimientos']:>9} {r['estado']:>6} "
+                f"{r['ms']:>10.1f} {r['consultas']:>9} {r['memoria_pico_kb']:>10.1f}"
+            )
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from contabilidad import cartera
+
+# python manage.py conciliar_cartera                    (pone al día las partidas, la primera vez las construye, y concilia ambas carteras)
+# python manage.py conciliar_cartera --cartera cobrar --simular
+# python manage.py conciliar_cartera --reconstruir      (rehace las partidas desde los movimientos)
+#
+# Pensado para correr a diario (cron). Los reportes de cartera solo aplican
+# los cambios nuevos antes de leer: la construcción inicial es de este comando.
+
+class Command(BaseCommand):
+    help = ('Pone al día las partidas de cartera con la bitácora y aplica en lote los pagos pendientes '
+            'a los documentos del mismo tercero (por referencia y por monto exacto).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cartera', choices=sorted(cartera.CUENTAS_CARTERA), help='Solo cuentas por cobrar o por pagar.')
+        parser.add_argument('--reconstruir', action='store_true', help='Rehace las partidas desde los movimientos antes de conciliar.')
+        parser.add_argument('--simular', action='store_true', help='Muestra lo que se aplicaría sin guardar nada.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['reconstruir'] or not cartera.construida():
+            partidas = cartera.reconstruir()
+            self.stdout.write(self.style.NOTICE(f" -> {partidas} partida(s) reconstruidas."))
+        else:
+            cambios = cartera.actualizar()
+            self.stdout.write(self.style.NOTICE(f" -> {cambios} cambio(s) de movimientos aplicados."))
+
+        resultado = cartera.conciliar(options['cartera'], simular=options['simular'])
+        accion = 'simuladas' if options['simular'] else 'registradas'
+        self.stdout.write(self.style.SUCCESS(
+            f"--- {resultado.total} aplicación(es) {accion} ({resultado.por_referencia} por referencia, "
+            f"{resultado.por_monto} por monto) por ${resultado.monto} en {time.perf_counter() - inicio:.2f} s. ---"
+        ))
@@ -0,0 +1,45 @@
+import time
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from contabilidad.models import PeriodoContable
+from contabilidad import depreciacion
+
+# python manage.py depreciar_activos                    (períodos abiertos, un asiento consolidado)
+# python manage.py depreciar_activos --periodo 7 --por-clase
+# python manage.py depreciar_activos --simular
+
+class Command(BaseCommand):
+    help = ('Calcula la depreciación del período de todos los activos fijos y la registra '
+            'en un asiento de ajuste consolidado (o uno por clase de activo).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periodo', type=int, action='append', default=[], metavar='PERIODO_ID', help='Período a depreciar (se puede repetir). Por defecto, los abiertos.')
+        parser.add_argument('--por-clase', action='store_true', help='Un asiento por clase de activo en lugar de uno consolidado.')
+        parser.add_argument('--simular', action='store_true', help='Muestra la depreciación sin guardar nada.')
+
+    def handle(self, *args, **options):
+        if options['periodo']:
+            periodos = list(PeriodoContable.objects.filter(pk__in=options['periodo']).order_by('fecha_inicio'))
+            faltantes = set(options['periodo']) - {p.pk for p in periodos}
+            if faltantes:
+                raise CommandError(f"No existen los períodos: {', '.join(map(str, sorted(faltantes)))}.")
+        else:
+            periodos = list(PeriodoContable.objects.filter(estado=PeriodoContable.EstadoPeriodo.ABIERTO).order_by('fecha_inicio'))
+        if not periodos:
+            raise CommandError('No hay períodos abiertos para depreciar.')
+
+        for periodo in periodos:
+            inicio = time.perf_counter()
+            try:
+                resultado = depreciacion.registrar(periodo, por_clase=options['por_clase'], simular=options['simular'])
+            except ValidationError as e:
+                raise CommandError(' '.join(e.messages))
+
+            for nombre, monto in sorted(resultado.por_clase.items()):
+                self.stdout.write(self.style.NOTICE(f" -> {nombre}: ${monto}"))
+            partidas = ', '.join(f"N° {a.numero_partida}" for a in resultado.asientos) or 'ninguna'
+            accion = 'simulada' if options['simular'] else f'registrada (partidas: {partidas})'
+            self.stdout.write(self.style.SUCCESS(
+                f"--- '{periodo.nombre}': depreciación de {resultado.activos} activo(s) por ${resultado.total} "
+                f"{accion} en {time.perf_counter() - inicio:.2f} s. ---"
+            ))
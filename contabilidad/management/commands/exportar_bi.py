@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from contabilidad.models import CambioLibro
+from contabilidad import exportacion_bi
+
+# python manage.py exportar_bi                          -> movimientos cambiados desde la última exportación
+# python manage.py exportar_bi --modelo ASIENTO --modelo CUENTA
+# python manage.py exportar_bi --completa --formato csv -> copia completa de la tabla actual
+# python manage.py exportar_bi --desde 1200             -> cambios posteriores a la secuencia 1200
+
+class Command(BaseCommand):
+    help = ('Exporta para BI las filas que cambiaron desde la última exportación (según la bitácora '
+            'de cambios), en archivos comprimidos con un manifiesto que registra la marca de agua.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', action='append', choices=CambioLibro.Modelo.values, default=[],
+                            help='Modelo a exportar (se puede repetir). Por defecto, MOVIMIENTO.')
+        parser.add_argument('--desde', type=int, metavar='SECUENCIA',
+                            help='Exporta los cambios posteriores a esta secuencia en lugar de la última marca de agua.')
+        parser.add_argument('--completa', action='store_true', help='Exporta la tabla completa (carga inicial).')
+        parser.add_argument('--formato', choices=exportacion_bi.FORMATOS_ARCHIVO, default='ndjson')
+        parser.add_argument('--filas-por-archivo', type=int, default=exportacion_bi.FILAS_POR_ARCHIVO)
+
+    def handle(self, *args, **options):
+        if options['desde'] is not None and options['completa']:
+            raise CommandError('Use --desde o --completa, no ambos.')
+        if options['filas_por_archivo'] < 1:
+            raise CommandError('--filas-por-archivo debe ser mayor que cero.')
+
+        for modelo in options['modelo'] or [CambioLibro.Modelo.MOVIMIENTO]:
+            manifiesto = exportacion_bi.exportar(
+                modelo,
+                desde=options['desde'],
+                completa=options['completa'],
+                formato=options['formato'],
+                filas_por_archivo=options['filas_por_archivo'],
+            )
+            if manifiesto is None:
+                self.stdout.write(self.style.WARNING(f'{modelo}: sin cambios desde la última exportación.'))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"{modelo}: exportación {manifiesto['tipo']} de la secuencia {manifiesto['desde']} a "
+                f"{manifiesto['hasta']}: {manifiesto['filas']} filas en {len(manifiesto['archivos'])} "
+                f"archivo(s) -> {manifiesto['directorio']}"
+            ))
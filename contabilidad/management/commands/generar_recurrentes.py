@@ -0,0 +1,50 @@
+import time
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from contabilidad.models import PeriodoContable, PlantillaAsiento
+from contabilidad import recurrentes
+
+# python manage.py generar_recurrentes                      (todos los períodos abiertos)
+# python manage.py generar_recurrentes --periodo 7 --periodo 8
+# python manage.py generar_recurrentes --plantilla "Alquiler oficina" --simular
+
+class Command(BaseCommand):
+    help = ('Genera en un solo lote los asientos de las plantillas recurrentes que vencen '
+            'en los períodos abiertos (o en los indicados).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periodo', type=int, action='append', default=[], metavar='PERIODO_ID', help='Genera solo en este período (se puede repetir).')
+        parser.add_argument('--plantilla', action='append', default=[], metavar='NOMBRE', help='Genera solo esta plantilla (se puede repetir).')
+        parser.add_argument('--simular', action='store_true', help='Muestra lo que se generaría sin guardar nada.')
+
+    def handle(self, *args, **options):
+        periodos = None
+        if options['periodo']:
+            periodos = list(PeriodoContable.objects.filter(pk__in=options['periodo']))
+            faltantes = set(options['periodo']) - {p.pk for p in periodos}
+            if faltantes:
+                raise CommandError(f"No existen los períodos: {', '.join(map(str, sorted(faltantes)))}.")
+
+        plantillas = None
+        if options['plantilla']:
+            plantillas = list(PlantillaAsiento.objects.filter(nombre__in=options['plantilla']))
+            faltantes = set(options['plantilla']) - {p.nombre for p in plantillas}
+            if faltantes:
+                raise CommandError(f"No existen las plantillas: {', '.join(sorted(faltantes))}.")
+
+        inicio = time.perf_counter()
+        try:
+            resultado = recurrentes.generar(periodos, plantillas, simular=options['simular'])
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+
+        for nombre, motivo in resultado.omitidas.items():
+            self.stdout.write(self.style.WARNING(f" -> '{nombre}' omitida: {motivo}."))
+        for nombre, cantidad in sorted(resultado.por_plantilla.items()):
+            self.stdout.write(self.style.NOTICE(f" -> '{nombre}': {cantidad} asiento(s)."))
+
+        accion = 'se generarían' if options['simular'] else 'generados'
+        self.stdout.write(self.style.SUCCESS(
+            f"--- {len(resultado.asientos)} asiento(s) y {resultado.movimientos} movimiento(s) {accion} "
+            f"en {time.perf_counter() - inicio:.1f} s. ---"
+        ))
@@ -0,0 +1,211 @@
+import time
+from calendar import monthrange
+from datetime import date, timedelta
+
+import numpy as np
+from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from contabilidad.models import PeriodoContable, Cuenta, AsientoDiario, Movimiento, CambioLibro
+from contabilidad.ledger import a_decimal
+from contabilidad import particiones
+from contabilidad.views import _crear_asiento_cierre, _crear_asiento_apertura
+
+# python manage.py generate_ledger --periodos 12 --asientos 5000 --lineas 4
+# python manage.py generate_ledger --periodos 24 --asientos 100000 --cierre --semilla 7   (~10M movimientos)
+# python manage.py generate_ledger --desde 2020-01-01 --periodos 3   (sin período abierto)
+
+# Si ya hay un período abierto, es el primero que se llena; luego se cierra y
+# se crean los siguientes períodos mensuales. El último queda abierto.
+
+# Plantillas de asiento: (nombre, peso, cuentas al debe, cuentas al haber).
+# Las cuentas son códigos del catálogo por defecto (0002_cargar_catalogo_default);
+# dentro de cada lista las primeras se usan más (pesos 1/rango), como en un libro real.
+PLANTILLAS = [
+    ('Venta', 30, ['121', '113', '122'], ['41', '42', '221', '43', '44']),
+    ('Gasto', 25, ['521', '522', '523', '524', '141', '529', '530', '527', '525', '532'], ['113', '213', '211']),
+    ('Costo', 10, ['511', '514', '512', '513'], ['113', '231', '211']),
+    ('Cobro', 15, ['113', '114'], ['121', '122', '123']),
+    ('Pago', 12, ['211', '213', '231', '222', '223', '232', '233', '212'], ['113', '114']),
+    ('Financiamiento', 3, ['113'], ['251', '252', '31']),
+    ('Depreciación', 5, ['526'], ['154', '163']),
+]
+
+
+class Command(BaseCommand):
+    help = ('Genera un libro sintético de volumen configurable (períodos mensuales, asientos por período, '
+            'líneas por asiento) con cuentas del catálogo, siempre cuadrado y reproducible con --semilla.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periodos', type=int, default=3, help='Cantidad de períodos mensuales a generar.')
+        parser.add_argument('--asientos', type=int, default=1000, help='Asientos por período.')
+        parser.add_argument('--lineas', type=int, default=4, help='Líneas (movimientos) por asiento, mínimo 2.')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla del generador aleatorio.')
+        parser.add_argument('--desde', type=date.fromisoformat,
+                            help='Primer día del primer período (AAAA-MM-DD). Por defecto, el día siguiente al último período.')
+        parser.add_argument('--cierre', action='store_true',
+                            help='Genera los asientos de cierre y de apertura entre períodos (como al cerrar desde la aplicación).')
+        parser.add_argument('--lote', type=int, default=2000, help='Asientos por lote de inserción.')
+
+    def handle(self, *args, **options):
+        if options['lineas'] < 2:
+            raise CommandError('Cada asiento necesita al menos 2 líneas.')
+        if options['periodos'] < 1 or options['asientos'] < 1 or options['lote'] < 1:
+            raise CommandError('--periodos, --asientos y --lote deben ser mayores que cero.')
+
+        # Si hay un período abierto, se llena primero (es el primero de los N)
+        periodo = PeriodoContable.objects.filter(estado=PeriodoContable.EstadoPeriodo.ABIERTO).order_by('fecha_inicio').first()
+        if periodo and options['desde']:
+            raise CommandError(f"Ya existe un período abierto ({periodo.nombre}); no se puede usar --desde.")
+
+        plantillas = self._plantillas()
+        rng = np.random.default_rng(options['semilla'])
+        usuario = get_user_model().objects.filter(is_superuser=True).order_by('pk').first()
+
+        inicio = options['desde']
+        if inicio is None:
+            ultimo = PeriodoContable.objects.order_by('-fecha_fin').first()
+            inicio = ultimo.fecha_fin + timedelta(days=1) if ultimo else date(date.today().year, 1, 1)
+        anterior = PeriodoContable.objects.filter(
+            estado=PeriodoContable.EstadoPeriodo.CERRADO, fecha_fin__lt=periodo.fecha_inicio if periodo else inicio
+        ).order_by('-fecha_fin').first()
+
+        inicio_total = time.perf_counter()
+        for numero in range(options['periodos']):
+            if periodo is None:
+                periodo = self._crear_periodo(inicio, anterior, usuario, options)
+
+            inicio_periodo = time.perf_counter()
+            movimientos = self._generar_periodo(periodo, plantillas, rng, usuario, options)
+            self.stdout.write(self.style.NOTICE(
+                f" -> '{periodo.nombre}': {options['asientos']} asientos, {movimientos} movimientos "
+                f"({time.perf_counter() - inicio_periodo:.1f} s)."
+            ))
+
+            # Solo el último período queda abierto
+            if numero < options['periodos'] - 1:
+                with transaction.atomic():
+                    if options['cierre']:
+                        _crear_asiento_cierre(periodo, usuario)
+                    else:
+                        periodo.estado = PeriodoContable.EstadoPeriodo.CERRADO
+                        periodo.save()
+            anterior = periodo
+            inicio = periodo.fecha_fin + timedelta(days=1)
+            periodo = None
+
+        self.stdout.write(self.style.SUCCESS(
+            f"--- {options['periodos']} período(s) generados en {time.perf_counter() - inicio_total:.1f} s. ---"
+        ))
+
+    @transaction.atomic
+    def _crear_periodo(self, inicio, anterior, usuario, options):
+        """
+        Crea y abre el período mensual que empieza en 'inicio' (con su
+        partición y, con --cierre, el asiento de apertura desde 'anterior').
+        """
+        periodo = PeriodoContable.objects.create(
+            nombre=f"Generado {inicio:%Y-%m} (semilla {options['semilla']})",
+            fecha_inicio=inicio,
+            fecha_fin=inicio.replace(day=monthrange(inicio.year, inicio.month)[1]),
+            estado=PeriodoContable.EstadoPeriodo.ABIERTO,
+        )
+        particiones.asegurar_particion(periodo)
+        if options['cierre'] and anterior:
+            for nivel, texto in _crear_asiento_apertura(periodo, anterior, usuario):
+                self.stdout.write(f"    {texto}", self.style.ERROR if nivel == messages.ERROR else None)
+        return periodo
+
+    def _plantillas(self):
+        """
+        Resuelve los códigos de PLANTILLAS contra el catálogo actual (solo
+        cuentas imputables y activas). Devuelve una lista de
+        (nombre, peso, ids_debe, pesos_debe, ids_haber, pesos_haber).
+        """
+        ids = dict(Cuenta.objects.filter(es_imputable=True, esta_activa=True).values_list('codigo', 'pk'))
+
+        def resolver(codigos):
+            cuentas = np.array([ids[c] for c in codigos if c in ids], dtype=np.int64)
+            pesos = 1 / np.arange(1, len(cuentas) + 1)
+            return cuentas, pesos / pesos.sum()
+
+        plantillas = []
+        for nombre, peso, debe, haber in PLANTILLAS:
+            ids_debe, pesos_debe = resolver(debe)
+            ids_haber, pesos_haber = resolver(haber)
+            if len(ids_debe) and len(ids_haber):
+                plantillas.append((nombre, peso, ids_debe, pesos_debe, ids_haber, pesos_haber))
+        if not plantillas:
+            raise CommandError('El catálogo no tiene las cuentas del catálogo por defecto (0002_cargar_catalogo_default).')
+        return plantillas
+
+    def _repartir(self, rng, totales, partes):
+        """
+        Divide cada total (centavos) en 'partes' montos positivos que suman
+        exactamente el total.
+        """
+        pesos = rng.random((len(totales), partes)) + 0.1
+        montos = totales[:, None] * pesos // pesos.sum(axis=1)[:, None]
+        montos = montos.astype(np.int64)
+        montos[:, -1] += totales - montos.sum(axis=1)
+        return montos
+
+    def _generar_periodo(self, periodo, plantillas, rng, usuario, options):
+        """
+        Inserta los asientos del período por lotes. Todo se sortea por lote
+        con NumPy: plantilla, fecha, cuentas y montos en centavos (el haber
+        reparte exactamente el mismo total que el debe).
+        """
+        lineas = options['lineas']
+        lineas_debe = lineas // 2
+        lineas_haber = lineas - lineas_debe
+        pesos = np.array([p[1] for p in plantillas], dtype=float)
+        pesos /= pesos.sum()
+        dias = (periodo.fecha_fin - periodo.fecha_inicio).days + 1
+
+        # Fechas ordenadas en todo el período, para que el número de partida siga a la fecha
+        desplazamientos = np.sort(rng.integers(0, dias, options['asientos']))
+
+        total_movimientos = 0
+        for desde in range(0, options['asientos'], options['lote']):
+            cantidad = min(options['lote'], options['asientos'] - desde)
+            plantilla = rng.choice(len(plantillas), size=cantidad, p=pesos)
+            totales = np.maximum(np.rint(rng.lognormal(np.log(500), 1.2, cantidad) * 100), 100 * lineas).astype(np.int64)
+            montos_debe = self._repartir(rng, totales, lineas_debe)
+            montos_haber = self._repartir(rng, totales, lineas_haber)
+
+            cuentas_debe = np.empty((cantidad, lineas_debe), dtype=np.int64)
+            cuentas_haber = np.empty((cantidad, lineas_haber), dtype=np.int64)
+            for i, (_nombre, _peso, ids_debe, p_debe, ids_haber, p_haber) in enumerate(plantillas):
+                filas = plantilla == i
+                n = int(filas.sum())
+                if n:
+                    cuentas_debe[filas] = rng.choice(ids_debe, size=(n, lineas_debe), p=p_debe)
+                    cuentas_haber[filas] = rng.choice(ids_haber, size=(n, lineas_haber), p=p_haber)
+
+            with transaction.atomic():
+                # Los asientos del lote ocupan números correlativos desde el siguiente libre.
+                # Con el candado del libro nadie más numera entre la lectura y la inserción.
+                CambioLibro.bloquear_escrituras()
+                siguiente = (AsientoDiario.objects.filter(periodo=periodo).aggregate(m=Max('numero_partida'))['m'] or 0) + 1
+                asientos = AsientoDiario.objects.bulk_create([
+                    AsientoDiario(
+                        periodo=periodo,
+                        numero_partida=siguiente + k,
+                        fecha=periodo.fecha_inicio + timedelta(days=int(desplazamientos[desde + k])),
+                        descripcion=f"{plantillas[plantilla[k]][0]} - asiento generado #{desde + k + 1}",
+                        creado_por=usuario,
+                    )
+                    for k in range(cantidad)
+                ])
+                movimientos = []
+                for k, asiento in enumerate(asientos):
+                    for cuenta_id, monto in zip(cuentas_debe[k].tolist(), montos_debe[k].tolist()):
+                        movimientos.append(Movimiento(asiento=asiento, cuenta_id=cuenta_id, debe=a_decimal(monto), haber=0))
+                    for cuenta_id, monto in zip(cuentas_haber[k].tolist(), montos_haber[k].tolist()):
+                        movimientos.append(Movimiento(asiento=asiento, cuenta_id=cuenta_id, debe=0, haber=a_decimal(monto)))
+                Movimiento.objects.bulk_create(movimientos, batch_size=5000)
+            total_movimientos += len(movimientos)
+        return total_movimientos
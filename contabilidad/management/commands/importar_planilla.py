@@ -0,0 +1,95 @@
+import csv
+import time
+from datetime import date
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from contabilidad.ledger import a_decimal
+from contabilidad.models import Cuenta, PeriodoContable, Planilla
+from contabilidad import planillas
+
+# python manage.py importar_planilla planilla.csv --nombre "Quincena 1"   (período abierto, fecha de fin)
+# python manage.py importar_planilla planilla.csv --nombre "Quincena 1" --fecha 2026-01-15 --contabilizar
+# python manage.py importar_planilla planilla.csv --nombre "Enero" --contabilizar --por-empleado --simular
+#
+# El CSV lleva encabezado con las columnas: codigo, nombre, salario
+
+class Command(BaseCommand):
+    help = ('Importa las líneas de pago de una planilla desde un CSV (codigo, nombre, salario), '
+            'calcula las deducciones y, opcionalmente, registra los asientos de provisión y pago.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='CSV con las columnas codigo, nombre, salario.')
+        parser.add_argument('--nombre', required=True, help='Nombre de la planilla dentro del período.')
+        parser.add_argument('--periodo', type=int, metavar='PERIODO_ID', help='Período de la planilla. Por defecto, el abierto.')
+        parser.add_argument('--fecha', type=date.fromisoformat, help='Fecha de la provisión y del pago (AAAA-MM-DD). Por defecto, el fin del período.')
+        parser.add_argument('--gasto', default='521', metavar='CODIGO', help='Cuenta de gasto por sueldos (por defecto 521).')
+        parser.add_argument('--por-pagar', default='231', metavar='CODIGO', help='Cuenta de sueldos por pagar (por defecto 231).')
+        parser.add_argument('--pago', default='113', metavar='CODIGO', help='Cuenta de la que se paga (por defecto 113).')
+        parser.add_argument('--contabilizar', action='store_true', help='Registra los asientos de provisión y de pago.')
+        parser.add_argument('--por-empleado', action='store_true', help='Una línea de sueldos por pagar por empleado en lugar de una consolidada.')
+        parser.add_argument('--simular', action='store_true', help='Muestra el resultado sin guardar nada.')
+
+    def handle(self, *args, **options):
+        if options['periodo']:
+            periodo = PeriodoContable.objects.filter(pk=options['periodo']).first()
+            if periodo is None:
+                raise CommandError(f"No existe el período {options['periodo']}.")
+        else:
+            periodo = PeriodoContable.objects.filter(estado=PeriodoContable.EstadoPeriodo.ABIERTO).first()
+            if periodo is None:
+                raise CommandError('No hay un período abierto para la planilla.')
+
+        cuentas = {}
+        for opcion in ('gasto', 'por_pagar', 'pago'):
+            cuenta = Cuenta.objects.filter(codigo=options[opcion]).first()
+            if cuenta is None:
+                raise CommandError(f"No existe la cuenta {options[opcion]}.")
+            cuentas[f'cuenta_{opcion}'] = cuenta
+
+        try:
+            with open(options['archivo'], newline='', encoding='utf-8-sig') as archivo:
+                filas = [(f.get('codigo'), f.get('nombre'), f.get('salario')) for f in csv.DictReader(archivo)]
+        except OSError as e:
+            raise CommandError(f"No se pudo leer el archivo: {e}")
+
+        inicio = time.perf_counter()
+        try:
+            with transaction.atomic():
+                planilla, _ = Planilla.objects.get_or_create(
+                    periodo=periodo, nombre=options['nombre'],
+                    defaults={'fecha': options['fecha'] or periodo.fecha_fin, **cuentas},
+                )
+                nuevos = planillas.importar(planilla, filas)
+                if options['contabilizar']:
+                    resultado = planillas.contabilizar(planilla, por_empleado=options['por_empleado'])
+                else:
+                    calculo = planillas.calcular(planilla)
+                    planillas.guardar(calculo)
+                if options['simular']:
+                    transaction.set_rollback(True)
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+
+        self.stdout.write(self.style.NOTICE(
+            f" -> {len(filas)} línea(s) importadas en '{planilla}' ({nuevos} empleado(s) nuevos)."
+        ))
+        segundos = time.perf_counter() - inicio
+        if not options['contabilizar']:
+            self.stdout.write(self.style.SUCCESS(
+                f"--- Deducciones calculadas: salarios ${a_decimal(calculo.salario.sum())}, "
+                f"líquido ${a_decimal(calculo.liquido.sum())} en {segundos:.2f} s. ---"
+            ))
+            return
+
+        for nombre, monto in resultado.deducciones.items():
+            self.stdout.write(self.style.NOTICE(f" -> {nombre}: ${monto}"))
+        if options['simular']:
+            accion = 'simulada'
+        else:
+            accion = (f"registrada (partidas: N° {resultado.planilla.asiento_provision.numero_partida}, "
+                      f"N° {resultado.planilla.asiento_pago.numero_partida})")
+        self.stdout.write(self.style.SUCCESS(
+            f"--- '{planilla}': {resultado.empleados} empleado(s), salarios ${resultado.total_salarios}, "
+            f"líquido ${resultado.total_liquido}, {accion} en {segundos:.2f} s. ---"
+        ))
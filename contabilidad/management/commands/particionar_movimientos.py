@@ -0,0 +1,73 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from contabilidad.models import PeriodoContable
+from contabilidad import particiones
+
+# python manage.py particionar_movimientos                 -> crea las particiones faltantes
+# python manage.py particionar_movimientos --convertir     -> convierte la tabla actual
+# python manage.py particionar_movimientos --revertir      -> vuelve a una tabla normal
+# python manage.py particionar_movimientos --tablespace frio    -> mueve los períodos cerrados
+# python manage.py particionar_movimientos --desprender 12      -> desprende la partición (vacía) del período 12
+
+class Command(BaseCommand):
+    help = 'Administra el particionamiento por período de la tabla de movimientos (solo PostgreSQL).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convertir', action='store_true', help='Convierte la tabla de movimientos en tabla particionada.')
+        parser.add_argument('--revertir', action='store_true', help='Convierte la tabla particionada en una tabla normal.')
+        parser.add_argument('--tablespace', help='Mueve las particiones de los períodos cerrados a este tablespace.')
+        parser.add_argument('--desprender', type=int, metavar='PERIODO_ID', help='Desprende la partición vacía de un período cerrado (limpieza).')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('El particionamiento solo está disponible en PostgreSQL. No se hizo nada.'))
+            return
+
+        if options['revertir']:
+            if particiones.revertir_particionado():
+                self.stdout.write(self.style.SUCCESS('La tabla de movimientos volvió a ser una tabla normal.'))
+            else:
+                self.stdout.write(self.style.WARNING('La tabla de movimientos no estaba particionada.'))
+            return
+
+        if options['convertir']:
+            periodo_ids = list(PeriodoContable.objects.values_list('pk', flat=True))
+            if particiones.convertir_a_particionada(periodo_ids):
+                self.stdout.write(self.style.SUCCESS(f'Tabla convertida con {len(periodo_ids)} particiones de período.'))
+            else:
+                self.stdout.write(self.style.WARNING('La tabla de movimientos ya estaba particionada.'))
+
+        if not particiones.esta_particionada():
+            raise CommandError('La tabla de movimientos no está particionada. Use --convertir primero.')
+
+        # Crear las particiones que falten (ej. períodos creados desde el admin)
+        creadas = 0
+        for periodo in PeriodoContable.objects.all():
+            if particiones.asegurar_particion(periodo):
+                creadas += 1
+                self.stdout.write(self.style.NOTICE(f" -> Partición creada para '{periodo.nombre}'."))
+
+        if options['tablespace']:
+            cerrados = PeriodoContable.objects.filter(estado=PeriodoContable.EstadoPeriodo.CERRADO)
+            for periodo in cerrados:
+                if particiones.mover_particion(periodo, options['tablespace']):
+                    self.stdout.write(self.style.NOTICE(f" -> '{periodo.nombre}' movido a '{options['tablespace']}'."))
+
+        if options['desprender']:
+            try:
+                periodo = PeriodoContable.objects.get(pk=options['desprender'])
+            except PeriodoContable.DoesNotExist:
+                raise CommandError(f"No existe el período {options['desprender']}.")
+            try:
+                desprendida = particiones.desprender_particion(periodo)
+            except ValidationError as e:
+                raise CommandError(e.messages[0])
+            if desprendida:
+                self.stdout.write(self.style.WARNING(
+                    f"Partición vacía de '{periodo.nombre}' desprendida. Se puede borrar con DROP TABLE."
+                ))
+
+        self.stdout.write(self.style.SUCCESS(f'--- Particiones ({creadas} nuevas) ---'))
+        for nombre, limites, filas in particiones.listar_particiones():
+            self.stdout.write(f'{nombre:45} {limites:30} ~{filas} filas')
@@ -0,0 +1,281 @@
+import io
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+import numpy as np
+from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+from contabilidad.models import PeriodoContable, Cuenta, AsientoDiario, Movimiento
+
+# python manage.py prueba_carga                                   -> 20 clientes x 50 asientos
+# python manage.py prueba_carga --clientes 40 --asientos 100 --cerrar-en 0.5
+# python manage.py prueba_carga --libro 20000 --salida carga.json
+#
+# Corre sobre una base de datos de prueba nueva (como el test runner), nunca
+# sobre la real. Cada cliente es un hilo con su propia conexión que registra
+# asientos por la vista real (registrar_asiento). Los resultados de
+# concurrencia son representativos en PostgreSQL; con SQLite la base de
+# prueba vive en memoria compartida y muchas escrituras simultáneas fallan con
+# "database table is locked" (sirve solo para revisar los invariantes).
+
+DESCRIPCION = 'Prueba de carga'
+
+
+class Command(BaseCommand):
+    help = ('Registra asientos desde muchos clientes simultáneos (opcionalmente cerrando el período a mitad '
+            'de la prueba), informa rendimiento y latencias p50/p95/p99 y verifica los invariantes del libro: '
+            'números de partida únicos y correlativos, asientos cuadrados y nada registrado en períodos cerrados.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=20, help='Clientes simultáneos (hilos).')
+        parser.add_argument('--asientos', type=int, default=50, help='Asientos que registra cada cliente.')
+        parser.add_argument('--lineas', type=int, default=2, help='Líneas por asiento (mínimo 2).')
+        parser.add_argument('--cerrar-en', type=float, metavar='FRACCION',
+                            help='Cierra el período cuando se haya enviado esta fracción de los asientos (0 a 1).')
+        parser.add_argument('--libro', type=int, default=0, metavar='ASIENTOS',
+                            help='Asientos que generate_ledger carga en el período antes de la prueba.')
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--salida', help='Archivo JSON con el resumen.')
+
+    def handle(self, *args, **options):
+        if options['clientes'] < 1 or options['asientos'] < 1 or options['lineas'] < 2:
+            raise CommandError('--clientes y --asientos deben ser mayores que cero y --lineas al menos 2.')
+        if options['cerrar_en'] is not None and not 0 <= options['cerrar_en'] <= 1:
+            raise CommandError('--cerrar-en debe estar entre 0 y 1.')
+
+        setup_test_environment()
+        configuracion = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            if options['libro']:
+                call_command('generate_ledger', periodos=1, asientos=options['libro'],
+                             semilla=options['semilla'], stdout=io.StringIO())
+            resumen = self._ejecutar(options)
+            resumen['violaciones'] = self._verificar()
+        finally:
+            teardown_databases(configuracion, verbosity=0)
+            teardown_test_environment()
+        resumen['fallas'] = self._fallas(resumen)
+
+        self._imprimir(resumen)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as f:
+                json.dump(resumen, f, ensure_ascii=False, indent=2)
+        if resumen['violaciones']:
+            raise CommandError(f"{len(resumen['violaciones'])} invariante(s) violados.")
+        # Un libro vacío también cumple los invariantes: la prueba solo vale si la carga se hizo
+        if resumen['fallas']:
+            raise CommandError(
+                f"La prueba no se completó ({len(resumen['fallas'])} falla(s)); los invariantes se cumplen "
+                f"sobre lo que sí se registró."
+            )
+        self.stdout.write(self.style.SUCCESS('--- Invariantes verificados: el libro quedó consistente. ---'))
+
+    # --- Carga ---
+
+    def _ejecutar(self, options):
+        periodo = PeriodoContable.objects.get(estado=PeriodoContable.EstadoPeriodo.ABIERTO)
+        cuentas = list(Cuenta.objects.filter(es_imputable=True, esta_activa=True).values_list('pk', flat=True))
+        usuario = get_user_model().objects.filter(is_superuser=True).order_by('pk').first()
+        url = reverse('contabilidad:registrar_asiento')
+
+        total = options['clientes'] * options['asientos']
+        umbral_cierre = None if options['cerrar_en'] is None else int(total * options['cerrar_en'])
+        enviados = [0]
+        candado = threading.Lock()
+        senal_cierre = threading.Event()
+        inicio = threading.Barrier(options['clientes'] + (1 if umbral_cierre is not None else 0))
+        solicitudes = []   # (resultado, segundos, mensaje)
+        cierre = {}
+
+        def datos_asiento(rng, numero):
+            lineas = options['lineas']
+            montos = [Decimal(rng.randint(100, 500_000)).scaleb(-2) for _ in range(lineas - 1)]
+            datos = {
+                'fecha': periodo.fecha_inicio.isoformat(),
+                'periodo': periodo.pk,
+                'descripcion': f'{DESCRIPCION} #{numero}',
+                'movimientos-TOTAL_FORMS': str(lineas), 'movimientos-INITIAL_FORMS': '0',
+                'movimientos-MIN_NUM_FORMS': '2', 'movimientos-MAX_NUM_FORMS': '1000',
+            }
+            # Las primeras líneas van al debe y la última al haber por el total
+            for i, monto in enumerate(montos):
+                datos.update({f'movimientos-{i}-cuenta': rng.choice(cuentas),
+                              f'movimientos-{i}-debe': str(monto), f'movimientos-{i}-haber': '0.00'})
+            datos.update({f'movimientos-{lineas - 1}-cuenta': rng.choice(cuentas),
+                          f'movimientos-{lineas - 1}-debe': '0.00',
+                          f'movimientos-{lineas - 1}-haber': str(sum(montos))})
+            return datos
+
+        # Las sesiones se abren antes de arrancar, para que la carga sea solo de registro
+        navegadores = []
+        for _ in range(options['clientes'] + 1):
+            navegador = Client()
+            navegador.force_login(usuario)
+            navegadores.append(navegador)
+
+        def cliente(indice):
+            rng = random.Random(options['semilla'] * 1_000_003 + indice)
+            navegador = navegadores[indice]
+            propias = []
+            try:
+                inicio.wait()
+                for n in range(options['asientos']):
+                    datos = datos_asiento(rng, indice * options['asientos'] + n + 1)
+                    t0 = time.perf_counter()
+                    try:
+                        respuesta = navegador.post(url, datos)
+                        duracion = time.perf_counter() - t0
+                        if respuesta.status_code == 302:
+                            propias.append(('registrado', duracion, ''))
+                        else:
+                            # Los avisos de éxito anteriores siguen en la cookie (no se sigue la redirección)
+                            errores = [str(m) for m in messages.get_messages(respuesta.wsgi_request) if m.level >= messages.WARNING]
+                            propias.append(('rechazado', duracion, errores[-1] if errores else f'HTTP {respuesta.status_code}'))
+                    except Exception as e:
+                        propias.append(('error', time.perf_counter() - t0, f'{type(e).__name__}: {e}'))
+                    with candado:
+                        enviados[0] += 1
+                        if umbral_cierre is not None and enviados[0] >= umbral_cierre:
+                            senal_cierre.set()
+            finally:
+                with candado:
+                    solicitudes.extend(propias)
+                connection.close()
+
+        def cerrador():
+            navegador = navegadores[-1]
+            try:
+                inicio.wait()
+                senal_cierre.wait()
+                cierre['tras_enviados'] = enviados[0]
+                t0 = time.perf_counter()
+                try:
+                    respuesta = navegador.post(reverse('contabilidad:cerrar_periodo', args=[periodo.pk]))
+                    cierre['estado'] = f'HTTP {respuesta.status_code}'
+                except Exception as e:
+                    cierre['estado'] = f'{type(e).__name__}: {e}'
+                cierre['segundos'] = round(time.perf_counter() - t0, 4)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(options['clientes'])]
+        if umbral_cierre is not None:
+            hilos.append(threading.Thread(target=cerrador))
+        t_inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion_total = time.perf_counter() - t_inicio
+        if cierre:
+            # La vista redirige aunque el cierre falle: vale el estado del período
+            cierre['cerrado'] = PeriodoContable.objects.filter(
+                pk=periodo.pk, estado=PeriodoContable.EstadoPeriodo.CERRADO
+            ).exists()
+
+        # Latencias por resultado: un rechazo vuelve a dibujar el formulario y cuesta distinto que un registro
+        resultados = Counter(r for r, _, _ in solicitudes)
+        latencias = {}
+        for resultado in resultados:
+            muestras = np.array([s for r, s, _ in solicitudes if r == resultado]) * 1000
+            latencias[resultado] = dict(zip(('p50', 'p95', 'p99'), (round(float(v), 1) for v in np.percentile(muestras, [50, 95, 99]))))
+        return {
+            'base_de_datos': connection.vendor,
+            'clientes': options['clientes'],
+            'solicitudes': len(solicitudes),
+            'registrados': resultados['registrado'],
+            'rechazados': resultados['rechazado'],
+            'errores': resultados['error'],
+            'motivos': Counter(m for r, _, m in solicitudes if r != 'registrado').most_common(5),
+            'segundos': round(duracion_total, 3),
+            'asientos_por_segundo': round(resultados['registrado'] / duracion_total, 1) if duracion_total else 0,
+            'latencia_ms': latencias,
+            'cierre': cierre or None,
+        }
+
+    # --- Invariantes ---
+
+    def _verificar(self):
+        violaciones = []
+
+        # 1. Números de partida únicos y correlativos (1..n) en cada período
+        numeros = defaultdict(list)
+        for periodo_id, numero in AsientoDiario.objects.values_list('periodo_id', 'numero_partida'):
+            numeros[periodo_id].append(numero)
+        for periodo_id, lista in numeros.items():
+            if len(set(lista)) != len(lista):
+                violaciones.append(f'Período {periodo_id}: números de partida repetidos.')
+            if sorted(set(lista)) != list(range(1, len(set(lista)) + 1)):
+                violaciones.append(f'Período {periodo_id}: números de partida con huecos (máximo {max(lista)}, {len(lista)} asientos).')
+
+        # 2. Asientos cuadrados (sumas exactas en Python; SQLite suma decimales como REAL)
+        saldos = defaultdict(Decimal)
+        for asiento_id, debe, haber in Movimiento.objects.values_list('asiento_id', 'debe', 'haber').iterator():
+            saldos[asiento_id] += debe - haber
+        descuadrados = [pk for pk, saldo in saldos.items() if saldo]
+        if descuadrados:
+            violaciones.append(f'{len(descuadrados)} asiento(s) descuadrados (ej. {descuadrados[:5]}).')
+
+        # 3. Nada registrado en un período después de su cierre, y cierre completo
+        tipos_resultado = [Cuenta.TipoCuenta.INGRESO, Cuenta.TipoCuenta.COSTO, Cuenta.TipoCuenta.GASTO]
+        for periodo in PeriodoContable.objects.filter(estado=PeriodoContable.EstadoPeriodo.CERRADO, asiento_cierre__isnull=False):
+            tardios = AsientoDiario.objects.filter(
+                periodo=periodo, es_asiento_automatico=False, pk__gt=periodo.asiento_cierre_id
+            ).count()
+            if tardios:
+                violaciones.append(f"'{periodo.nombre}': {tardios} asiento(s) registrados después del cierre.")
+            residuo = sum(
+                (d - h for d, h in Movimiento.objects.filter(
+                    periodo=periodo, cuenta__tipo_cuenta__in=tipos_resultado
+                ).values_list('debe', 'haber')),
+                Decimal('0.00')
+            )
+            if residuo:
+                violaciones.append(f"'{periodo.nombre}': las cuentas de resultado quedaron con saldo {residuo} tras el cierre.")
+
+        return violaciones
+
+    def _fallas(self, resumen):
+        """
+        Lo que invalida la prueba aunque se cumplan los invariantes: nada
+        registrado, solicitudes con error o un cierre pedido que no terminó.
+        """
+        fallas = []
+        if not resumen['registrados']:
+            fallas.append('No se registró ningún asiento.')
+        if resumen['errores']:
+            fallas.append(f"{resumen['errores']} solicitud(es) terminaron con error.")
+        if resumen['cierre'] and not resumen['cierre'].get('cerrado'):
+            fallas.append(f"El cierre del período no se completó ({resumen['cierre']['estado']}).")
+        return fallas
+
+    def _imprimir(self, resumen):
+        self.stdout.write(
+            f"{resumen['solicitudes']} solicitudes de {resumen['clientes']} clientes en {resumen['segundos']} s "
+            f"({resumen['base_de_datos']}): {resumen['registrados']} registrados, {resumen['rechazados']} rechazados, "
+            f"{resumen['errores']} errores."
+        )
+        self.stdout.write(f"Rendimiento: {resumen['asientos_por_segundo']} asientos/s.")
+        for resultado, p in resumen['latencia_ms'].items():
+            self.stdout.write(f"Latencia {resultado} (ms): p50 {p['p50']}, p95 {p['p95']}, p99 {p['p99']}.")
+        if resumen['cierre']:
+            self.stdout.write(
+                f"Cierre: {resumen['cierre']['estado']} en {resumen['cierre']['segundos']} s, "
+                f"tras {resumen['cierre']['tras_enviados']} asientos enviados."
+            )
+        for motivo, cantidad in resumen['motivos']:
+            self.stdout.write(f"  {cantidad} x {motivo}")
+        for problema in resumen['violaciones'] + resumen['fallas']:
+            self.stdout.write(self.style.ERROR(f' - {problema}'))
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from contabilidad import auxiliares
+
+# python manage.py saldos_terceros                  (aplica los cambios nuevos de la bitácora; la primera vez, construye)
+# python manage.py saldos_terceros --reconstruir    (recalcula todo desde los movimientos)
+#
+# Pensado para correr seguido (cron). Los reportes de auxiliares solo aplican
+# los cambios nuevos antes de leer: la construcción inicial es de este comando.
+
+class Command(BaseCommand):
+    help = ('Pone al día los saldos por cuenta, tercero y período con los cambios de movimientos '
+            'de la bitácora, o los recalcula completos con --reconstruir.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconstruir', action='store_true', help='Recalcula los saldos desde los movimientos.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['reconstruir'] or not auxiliares.construido():
+            saldos = auxiliares.reconstruir()
+            self.stdout.write(self.style.SUCCESS(
+                f"--- {saldos} saldo(s) por tercero reconstruidos en {time.perf_counter() - inicio:.2f} s. ---"
+            ))
+            return
+        cambios = auxiliares.actualizar()
+        self.stdout.write(self.style.SUCCESS(
+            f"--- {cambios} cambio(s) de movimientos aplicados en {time.perf_counter() - inicio:.2f} s. ---"
+        ))
@@ -0,0 +1,252 @@
+"""
+Métricas de la aplicación en formato de texto de Prometheus.
+
+Cada proceso lleva sus contadores e histogramas en memoria (registro). Si
+CONTABILIDAD_METRICAS_DIR está definido, cada proceso vuelca su estado a
+<dir>/<pid>-<id>.json como máximo cada INTERVALO_VOLCADO segundos, y la vista
+'metricas' suma los archivos de todos los procesos: así se agregan los
+workers de gunicorn sin un servidor aparte. Sin directorio, solo se ve el
+proceso que atiende la solicitud (suficiente con runserver).
+
+Los archivos de procesos terminados se conservan (los contadores son
+acumulados): el directorio se debe vaciar al desplegar, antes de arrancar
+los workers.
+
+Métricas (ver METRICAS):
+  sic_solicitud_segundos{vista,metodo}    latencia por nombre de URL
+  sic_etapa_segundos{etapa}               etapas del cierre y la apertura
+  sic_cierre_periodo_segundos             duración total de cada cierre
+  sic_asientos_registrados_total          asientos confirmados
+  sic_movimientos_escritos_total          movimientos confirmados
+  sic_cache_reportes_total{vista,resultado}  304 (acierto) o reporte calculado (fallo)
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger('contabilidad.metricas')
+
+INTERVALO_VOLCADO = 5
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRICAS = {
+    'sic_solicitud_segundos': ('histogram', 'Latencia de las solicitudes por nombre de URL.'),
+    'sic_etapa_segundos': ('histogram', 'Duración de cada etapa del cierre y la apertura de períodos.'),
+    'sic_cierre_periodo_segundos': ('histogram', 'Duración total del cierre de un período.'),
+    'sic_asientos_registrados_total': ('counter', 'Asientos registrados (confirmados).'),
+    'sic_movimientos_escritos_total': ('counter', 'Movimientos escritos (confirmados).'),
+    'sic_cache_reportes_total': ('counter', 'Reportes respondidos con 304 (acierto) o calculados (fallo).'),
+}
+
+
+def directorio_base():
+    directorio = getattr(settings, 'CONTABILIDAD_METRICAS_DIR', None)
+    return Path(directorio) if directorio else None
+
+
+class Registro:
+    """
+    Contadores e histogramas del proceso. Las llaves son (nombre, etiquetas)
+    con las etiquetas como tupla ordenada de pares.
+    """
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._candado_volcado = threading.Lock()
+        self._contadores = defaultdict(float)
+        self._histogramas = {}
+        self._pid = None
+        self._archivo = None
+        self._ultimo_volcado = 0.0
+
+    def _proceso_actual(self):
+        # Tras un fork (gunicorn --preload) cada worker empieza de cero con su
+        # propio archivo. Se llama con el candado tomado.
+        if self._pid != os.getpid():
+            if self._pid is not None:
+                self._contadores.clear()
+                self._histogramas.clear()
+            self._pid = os.getpid()
+            self._archivo = f"{self._pid}-{uuid.uuid4().hex[:8]}.json"
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        with self._candado:
+            self._proceso_actual()
+            self._contadores[(nombre, tuple(sorted(etiquetas.items())))] += valor
+        self.volcar()
+
+    def observar(self, nombre, segundos, **etiquetas):
+        llave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._candado:
+            self._proceso_actual()
+            # [cuentas por límite (+Inf al final), suma]
+            histograma = self._histogramas.setdefault(llave, [[0] * (len(LIMITES_SEGUNDOS) + 1), 0.0])
+            histograma[0][bisect_left(LIMITES_SEGUNDOS, segundos)] += 1
+            histograma[1] += segundos
+        self.volcar()
+
+    def estado(self):
+        with self._candado:
+            self._proceso_actual()
+            return {
+                'contadores': [[n, dict(e), v] for (n, e), v in self._contadores.items()],
+                'histogramas': [[n, dict(e), list(h[0]), h[1]] for (n, e), h in self._histogramas.items()],
+            }
+
+    def volcar(self, forzar=False):
+        """
+        Escribe el estado del proceso en el directorio compartido (si hay uno
+        y pasó INTERVALO_VOLCADO desde el último volcado, o si 'forzar').
+        Un solo hilo vuelca a la vez: los demás siguen sin esperar al disco.
+        Un error de escritura se registra en el log y no llega a la solicitud.
+        """
+        directorio = directorio_base()
+        if directorio is None or not self._candado_volcado.acquire(blocking=forzar):
+            return
+        try:
+            if not forzar and time.monotonic() - self._ultimo_volcado < INTERVALO_VOLCADO:
+                return
+            self._ultimo_volcado = time.monotonic()
+            estado = self.estado()
+            try:
+                directorio.mkdir(parents=True, exist_ok=True)
+                temporal = directorio / f".{self._archivo}.tmp"
+                with open(temporal, 'w', encoding='utf-8') as f:
+                    json.dump(estado, f)
+                os.replace(temporal, directorio / self._archivo)
+            except OSError:
+                logger.warning("No se pudieron volcar las métricas en %s.", directorio, exc_info=True)
+        finally:
+            self._candado_volcado.release()
+
+registro = Registro()
+# Lo que quedó sin volcar (un comando corto, un worker que se recicla) se escribe al salir
+atexit.register(registro.volcar, forzar=True)
+
+
+def incrementar(nombre, valor=1, **etiquetas):
+    registro.incrementar(nombre, valor, **etiquetas)
+
+
+def observar(nombre, segundos, **etiquetas):
+    registro.observar(nombre, segundos, **etiquetas)
+
+
+class Cronometro:
+    """
+    Mide etapas consecutivas de un proceso: cada marcar('x') registra en
+    sic_etapa_segundos{etapa="<prefijo>.x"} el tiempo desde la marca anterior.
+    """
+
+    def __init__(self, prefijo):
+        self.prefijo = prefijo
+        self.inicio = self._ultima = time.perf_counter()
+
+    def marcar(self, etapa):
+        ahora = time.perf_counter()
+        observar('sic_etapa_segundos', ahora - self._ultima, etapa=f"{self.prefijo}.{etapa}")
+        self._ultima = ahora
+
+    def total(self):
+        return time.perf_counter() - self.inicio
+
+
+# --- Exposición ---
+
+def _estados():
+    directorio = directorio_base()
+    if directorio is None:
+        return [registro.estado()]
+    registro.volcar(forzar=True)
+    estados = []
+    for ruta in directorio.glob('*.json'):
+        try:
+            with open(ruta, encoding='utf-8') as f:
+                estados.append(json.load(f))
+        except (OSError, ValueError):
+            # Un worker pudo reiniciarse y borrar o reemplazar el archivo mientras se leía
+            continue
+    return estados
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _numero(valor):
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+def _etiquetas(etiquetas, **extra):
+    pares = {**etiquetas, **extra}
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in sorted(pares.items())) + '}'
+
+
+def exposicion():
+    """
+    Texto de todas las métricas, sumando los procesos (formato 0.0.4).
+    """
+    contadores = defaultdict(float)
+    histogramas = {}
+    for estado in _estados():
+        for nombre, etiquetas, valor in estado['contadores']:
+            contadores[(nombre, tuple(sorted(etiquetas.items())))] += valor
+        for nombre, etiquetas, cuentas, suma in estado['histogramas']:
+            llave = (nombre, tuple(sorted(etiquetas.items())))
+            acumulado = histogramas.setdefault(llave, [[0] * len(cuentas), 0.0])
+            acumulado[0] = [a + b for a, b in zip(acumulado[0], cuentas)]
+            acumulado[1] += suma
+
+    lineas = []
+    for nombre, (tipo, ayuda) in METRICAS.items():
+        lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+        if tipo == 'counter':
+            for (n, etiquetas), valor in sorted(contadores.items()):
+                if n == nombre:
+                    lineas.append(f"{nombre}{_etiquetas(dict(etiquetas))} {_numero(valor)}")
+            continue
+        for (n, etiquetas), (cuentas, suma) in sorted(histogramas.items()):
+            if n != nombre:
+                continue
+            etiquetas = dict(etiquetas)
+            acumulada = 0
+            for limite, cuenta in zip(LIMITES_SEGUNDOS + (math.inf,), cuentas):
+                acumulada += cuenta
+                le = '+Inf' if limite == math.inf else f'{limite:g}'
+                lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas, le=le)} {acumulada}")
+            lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {suma:.6f}")
+            lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {acumulada}")
+    return '\n'.join(lineas) + '\n'
+
+
+# --- Middleware ---
+
+class MetricasMiddleware:
+    """
+    Observa la latencia de cada solicitud que resolvió a una vista con
+    nombre, con etiquetas vista (namespace:nombre) y método.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        respuesta = self.get_response(request)
+        coincidencia = getattr(request, 'resolver_match', None)
+        if coincidencia and coincidencia.view_name:
+            observar('sic_solicitud_segundos', time.perf_counter() - inicio,
+                     vista=coincidencia.view_name, metodo=request.method)
+        return respuesta
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0008_poblar_costos_indirectos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimiento',
+            name='fecha',
+            field=models.DateField(editable=False, help_text='Copia de la fecha del asiento', null=True),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='periodo',
+            field=models.ForeignKey(editable=False, help_text='Copia del período del asiento', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='contabilidad.periodocontable'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='es_asiento_automatico',
+            field=models.BooleanField(default=False, editable=False, help_text='Copia de la marca de asiento automático (Cierre/Apertura)'),
+        ),
+    ]
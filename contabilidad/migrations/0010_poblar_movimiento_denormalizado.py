@@ -0,0 +1,32 @@
+# Archivo: contabilidad/migrations/0010_poblar_movimiento_denormalizado.py
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def poblar_columnas_denormalizadas(apps, schema_editor):
+    """
+    Función 'up': Copia fecha, período y marca de automático del asiento
+    a cada movimiento existente, en un solo UPDATE con subconsultas.
+    """
+    AsientoDiario = apps.get_model('contabilidad', 'AsientoDiario')
+    Movimiento = apps.get_model('contabilidad', 'Movimiento')
+
+    asiento = AsientoDiario.objects.filter(pk=OuterRef('asiento_id'))
+    Movimiento.objects.update(
+        fecha=Subquery(asiento.values('fecha')[:1]),
+        periodo_id=Subquery(asiento.values('periodo_id')[:1]),
+        es_asiento_automatico=Subquery(asiento.values('es_asiento_automatico')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0009_movimiento_fecha_periodo_automatico'),
+    ]
+
+    operations = [
+        # La función 'down' no hace nada: la 0009 revertida borra las columnas
+        migrations.RunPython(poblar_columnas_denormalizadas, migrations.RunPython.noop),
+    ]
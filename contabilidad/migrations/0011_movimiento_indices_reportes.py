@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0010_poblar_movimiento_denormalizado'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimiento',
+            name='fecha',
+            field=models.DateField(editable=False, help_text='Copia de la fecha del asiento'),
+        ),
+        migrations.AlterField(
+            model_name='movimiento',
+            name='periodo',
+            field=models.ForeignKey(editable=False, help_text='Copia del período del asiento', on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='contabilidad.periodocontable'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['cuenta', 'periodo', 'debe', 'haber'], name='mov_cuenta_periodo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['cuenta', 'fecha', 'debe', 'haber'], name='mov_cuenta_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['periodo', 'es_asiento_automatico', 'cuenta', 'debe', 'haber'], name='mov_periodo_auto_cuenta_idx'),
+        ),
+    ]
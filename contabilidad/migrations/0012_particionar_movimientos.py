@@ -0,0 +1,36 @@
+# Archivo: contabilidad/migrations/0012_particionar_movimientos.py
+
+from django.db import migrations
+
+from contabilidad import particiones
+
+
+def convertir_tabla_movimientos(apps, schema_editor):
+    """
+    Función 'up': Convierte contabilidad_movimiento en tabla particionada por
+    período. Solo actúa en PostgreSQL y con CONTABILIDAD_PARTICIONAR_MOVIMIENTOS
+    activado; en cualquier otro caso no hace nada.
+    """
+    if not particiones.particionado_habilitado():
+        return
+    PeriodoContable = apps.get_model('contabilidad', 'PeriodoContable')
+    periodo_ids = PeriodoContable.objects.values_list('pk', flat=True)
+    particiones.convertir_a_particionada(list(periodo_ids), schema_editor.connection)
+
+
+def revertir_tabla_movimientos(apps, schema_editor):
+    """
+    Función 'down': Vuelve a una tabla normal si estaba particionada.
+    """
+    particiones.revertir_particionado(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0011_movimiento_indices_reportes'),
+    ]
+
+    operations = [
+        migrations.RunPython(convertir_tabla_movimientos, revertir_tabla_movimientos),
+    ]
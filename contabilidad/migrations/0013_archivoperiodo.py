@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0012_particionar_movimientos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoPeriodo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ruta', models.CharField(help_text='Directorio del archivo, relativo a CONTABILIDAD_ARCHIVO_DIR', max_length=255)),
+                ('num_movimientos', models.PositiveIntegerField(default=0)),
+                ('total_debe', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_haber', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('checksum_manifiesto', models.CharField(help_text='SHA-256 del manifest.json del archivo', max_length=64)),
+                ('fecha_arrastre', models.DateField(help_text='Fecha del asiento de arrastre. Los saldos a una fecha anterior se leen del archivo.')),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('asiento_arrastre', models.ForeignKey(blank=True, help_text='Asiento con los saldos arrastrados de este archivo.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archivos_arrastrados', to='contabilidad.asientodiario')),
+                ('periodo', models.OneToOneField(help_text='Período archivado', on_delete=django.db.models.deletion.PROTECT, related_name='archivo', to='contabilidad.periodocontable')),
+            ],
+            options={
+                'verbose_name': 'Período Archivado',
+                'verbose_name_plural': 'Períodos Archivados',
+                'ordering': ['-periodo__fecha_inicio'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0013_archivoperiodo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['cuenta', 'periodo', 'fecha', 'asiento', 'id'], name='mov_cuenta_periodo_orden_idx'),
+        ),
+    ]
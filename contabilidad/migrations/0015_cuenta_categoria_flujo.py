@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0014_movimiento_indice_libro_mayor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cuenta',
+            name='categoria_flujo',
+            field=models.CharField(blank=True, choices=[('EFECTIVO', 'Efectivo y Equivalentes'), ('OPERACION', 'Actividades de Operación'), ('INVERSION', 'Actividades de Inversión'), ('FINANCIACION', 'Actividades de Financiación')], default='', help_text='Categoría en el Flujo de Efectivo. Si se deja vacía se hereda de la cuenta padre.', max_length=12),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Archivo: contabilidad/migrations/0016_asignar_categorias_flujo.py
+
+from django.db import migrations
+
+# Categorías de las cuentas de grupo del catálogo por defecto.
+# Las subcuentas las heredan (equivale a la clasificación por prefijo
+# que antes estaba fija en la vista de flujo de efectivo).
+CATEGORIAS_POR_CODIGO = {
+    '11': 'EFECTIVO',
+    '12': 'OPERACION',
+    '13': 'OPERACION',
+    '14': 'OPERACION',
+    '15': 'INVERSION',
+    '16': 'INVERSION',
+    '17': 'INVERSION',
+    '21': 'OPERACION',
+    '22': 'OPERACION',
+    '23': 'OPERACION',
+    '24': 'OPERACION',
+    '25': 'FINANCIACION',
+    '3': 'FINANCIACION',
+    '4': 'OPERACION',
+    '5': 'OPERACION',
+}
+
+
+def asignar_categorias(apps, schema_editor):
+    """
+    Función 'up': Asigna la categoría de flujo a las cuentas de grupo.
+    """
+    Cuenta = apps.get_model('contabilidad', 'Cuenta')
+    for codigo, categoria in CATEGORIAS_POR_CODIGO.items():
+        Cuenta.objects.filter(codigo=codigo, categoria_flujo='').update(categoria_flujo=categoria)
+
+
+def quitar_categorias(apps, schema_editor):
+    """
+    Función 'down': Deja las categorías vacías.
+    """
+    Cuenta = apps.get_model('contabilidad', 'Cuenta')
+    Cuenta.objects.filter(codigo__in=CATEGORIAS_POR_CODIGO).update(categoria_flujo='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0015_cuenta_categoria_flujo'),
+    ]
+
+    operations = [
+        migrations.RunPython(asignar_categorias, quitar_categorias),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0016_asignar_categorias_flujo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asientodiario',
+            name='es_ajuste',
+            field=models.BooleanField(default=False, help_text='Asiento de ajuste: se muestra en la columna de Ajustes de la hoja de trabajo.'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0017_asientodiario_es_ajuste'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='periodocontable',
+            name='modificado_en',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Fecha y hora del último cambio registrado en version_libro.', null=True),
+        ),
+        migrations.AddField(
+            model_name='periodocontable',
+            name='version_libro',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Se incrementa con cada cambio en el período, sus asientos o el catálogo.'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:16
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0018_periodocontable_version_libro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioLibro',
+            fields=[
+                ('secuencia', models.BigAutoField(primary_key=True, serialize=False)),
+                ('modelo', models.CharField(choices=[('CUENTA', 'Cuenta'), ('ASIENTO', 'Asiento'), ('MOVIMIENTO', 'Movimiento')], max_length=10)),
+                ('operacion', models.CharField(choices=[('I', 'Inserción'), ('U', 'Actualización'), ('D', 'Eliminación')], max_length=1)),
+                ('objeto_id', models.BigIntegerField(help_text='Id del objeto modificado')),
+                ('periodo_id', models.BigIntegerField(blank=True, help_text='Período del asiento o movimiento (vacío para cuentas)', null=True)),
+                ('datos', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('registrado_en', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Cambio del Libro',
+                'verbose_name_plural': 'Bitácora de Cambios',
+                'ordering': ['secuencia'],
+                'indexes': [models.Index(fields=['modelo', 'secuencia'], name='cambio_modelo_secuencia_idx'), models.Index(fields=['periodo_id', 'secuencia'], name='cambio_periodo_secuencia_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0019_cambiolibro'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asientodiario',
+            name='reversa_de',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Asiento que este revierte (ver servicios.revertir_asientos).', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reversiones', to='contabilidad.asientodiario'),
+        ),
+    ]
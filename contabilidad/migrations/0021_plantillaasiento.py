@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0020_asientodiario_reversa_de'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlantillaAsiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('descripcion', models.TextField(blank=True, help_text='Descripción de los asientos generados (por defecto, el nombre)')),
+                ('monto_base', models.DecimalField(decimal_places=2, default=0, help_text='Base de las líneas calculadas como porcentaje o tasa', max_digits=12)),
+                ('es_ajuste', models.BooleanField(default=False)),
+                ('activa', models.BooleanField(default=True)),
+                ('recurrente', models.BooleanField(default=False, help_text='Si el comando generar_recurrentes la genera. Si no, solo se usa en el registro manual.')),
+                ('frecuencia', models.CharField(choices=[('MENSUAL', 'Mensual'), ('TRIMESTRAL', 'Trimestral'), ('ANUAL', 'Anual')], default='MENSUAL', max_length=10)),
+                ('dia', models.PositiveSmallIntegerField(default=1, help_text='Día del mes del asiento (en meses más cortos, el último día)')),
+                ('vigente_desde', models.DateField(blank=True, help_text='Primer mes en que vence (la frecuencia se cuenta desde aquí)', null=True)),
+                ('vigente_hasta', models.DateField(blank=True, null=True)),
+                ('generada_hasta', models.DateField(blank=True, editable=False, help_text='Fecha de la última ocurrencia generada. Las anteriores no se vuelven a generar.', null=True)),
+            ],
+            options={
+                'verbose_name': 'Plantilla de Asiento',
+                'verbose_name_plural': 'Plantillas de Asientos',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LineaPlantilla',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lado', models.CharField(choices=[('DEBE', 'Debe'), ('HABER', 'Haber')], max_length=5)),
+                ('formula', models.CharField(choices=[('FIJO', 'Monto fijo'), ('PORCENTAJE', 'Porcentaje de la base'), ('TASA', 'Base más tasa de impuesto'), ('CUADRE', 'Diferencia para cuadrar')], default='FIJO', max_length=10)),
+                ('valor', models.DecimalField(decimal_places=4, default=0, help_text='Monto (fijo), porcentaje o tasa en % (ej. 13 para el IVA). No se usa en la línea de cuadre.', max_digits=12)),
+                ('orden', models.PositiveSmallIntegerField(default=0)),
+                ('cuenta', models.ForeignKey(limit_choices_to={'es_imputable': True, 'esta_activa': True}, on_delete=django.db.models.deletion.PROTECT, to='contabilidad.cuenta')),
+                ('plantilla', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='contabilidad.plantillaasiento')),
+            ],
+            options={
+                'verbose_name': 'Línea de Plantilla',
+                'verbose_name_plural': 'Líneas de Plantilla',
+                'ordering': ['plantilla', 'orden', 'pk'],
+            },
+        ),
+    ]
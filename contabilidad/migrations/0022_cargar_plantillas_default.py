@@ -0,0 +1,70 @@
+# Archivo: contabilidad/migrations/0022_cargar_plantillas_default.py
+
+from django.db import migrations
+
+# Las plantillas que antes estaban fijas en el JavaScript de registro_asiento.html.
+# (nombre, [(código de cuenta, lado, fórmula, valor), ...]). Quedan con monto
+# base 0: al cargarlas en el registro manual solo se eligen las cuentas,
+# como antes, hasta que se les asigne una base.
+PLANTILLAS = [
+    ('Venta de Software (IVA)', [
+        ('121', 'DEBE', 'TASA', 13),        # Clientes: base + IVA
+        ('41', 'HABER', 'PORCENTAJE', 100),  # Venta
+        ('221', 'HABER', 'PORCENTAJE', 13),  # IVA Débito
+    ]),
+    ('Pago de Salarios', [
+        ('521', 'DEBE', 'PORCENTAJE', 100),  # Sueldos
+        ('232', 'HABER', 'PORCENTAJE', 7.25),  # AFP
+        ('233', 'HABER', 'PORCENTAJE', 3),   # ISSS
+        ('113', 'HABER', 'CUADRE', 0),       # Banco: líquido a pagar
+    ]),
+    ('Compra de Equipo (IVA)', [
+        ('152', 'DEBE', 'PORCENTAJE', 100),  # Equipo
+        ('141', 'DEBE', 'PORCENTAJE', 13),   # IVA Crédito
+        ('211', 'HABER', 'TASA', 13),        # Proveedores
+    ]),
+    ('Pago de Alquiler (IVA)', [
+        ('523', 'DEBE', 'PORCENTAJE', 100),  # Alquiler
+        ('141', 'DEBE', 'PORCENTAJE', 13),   # IVA Crédito
+        ('113', 'HABER', 'TASA', 13),        # Banco
+    ]),
+]
+
+
+def cargar_plantillas(apps, schema_editor):
+    """
+    Función 'up': Crea las plantillas del catálogo por defecto (si existen sus cuentas).
+    """
+    Cuenta = apps.get_model('contabilidad', 'Cuenta')
+    PlantillaAsiento = apps.get_model('contabilidad', 'PlantillaAsiento')
+    LineaPlantilla = apps.get_model('contabilidad', 'LineaPlantilla')
+    cuentas = dict(Cuenta.objects.values_list('codigo', 'pk'))
+    for nombre, lineas in PLANTILLAS:
+        if any(codigo not in cuentas for codigo, _, _, _ in lineas):
+            continue
+        plantilla, creada = PlantillaAsiento.objects.get_or_create(nombre=nombre)
+        if not creada:
+            continue
+        LineaPlantilla.objects.bulk_create([
+            LineaPlantilla(plantilla=plantilla, cuenta_id=cuentas[codigo], lado=lado, formula=formula, valor=valor, orden=orden)
+            for orden, (codigo, lado, formula, valor) in enumerate(lineas)
+        ])
+
+
+def quitar_plantillas(apps, schema_editor):
+    """
+    Función 'down': Elimina las plantillas por defecto.
+    """
+    PlantillaAsiento = apps.get_model('contabilidad', 'PlantillaAsiento')
+    PlantillaAsiento.objects.filter(nombre__in=[nombre for nombre, _ in PLANTILLAS]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0021_plantillaasiento'),
+    ]
+
+    operations = [
+        migrations.RunPython(cargar_plantillas, quitar_plantillas),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0022_cargar_plantillas_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaseActivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('vida_util_meses', models.PositiveSmallIntegerField(default=60)),
+                ('metodo', models.CharField(choices=[('LINEA_RECTA', 'Línea recta'), ('SALDO_DECRECIENTE', 'Doble saldo decreciente'), ('SUMA_DIGITOS', 'Suma de dígitos')], default='LINEA_RECTA', max_length=20)),
+                ('cuenta_activo', models.ForeignKey(help_text='Cuenta del costo del activo (ej. 152)', limit_choices_to={'es_imputable': True}, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='contabilidad.cuenta')),
+                ('cuenta_depreciacion', models.ForeignKey(help_text='Cuenta de depreciación acumulada (ej. 154)', limit_choices_to={'es_imputable': True}, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='contabilidad.cuenta')),
+                ('cuenta_gasto', models.ForeignKey(help_text='Cuenta del gasto por depreciación (ej. 526)', limit_choices_to={'es_imputable': True}, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='contabilidad.cuenta')),
+            ],
+            options={
+                'verbose_name': 'Clase de Activo Fijo',
+                'verbose_name_plural': 'Clases de Activos Fijos',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ActivoFijo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=30, unique=True)),
+                ('descripcion', models.CharField(max_length=200)),
+                ('fecha_adquisicion', models.DateField()),
+                ('costo', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('valor_residual', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vida_util_meses', models.PositiveSmallIntegerField(blank=True, help_text='Vacío: la de su clase', null=True)),
+                ('metodo', models.CharField(blank=True, choices=[('LINEA_RECTA', 'Línea recta'), ('SALDO_DECRECIENTE', 'Doble saldo decreciente'), ('SUMA_DIGITOS', 'Suma de dígitos')], help_text='Vacío: el de su clase', max_length=20)),
+                ('fecha_baja', models.DateField(blank=True, help_text='Venta o retiro: no se deprecia después de este mes', null=True)),
+                ('depreciado_hasta', models.DateField(blank=True, editable=False, help_text='Fin del último período cuya depreciación se registró', null=True)),
+                ('clase', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='activos', to='contabilidad.claseactivo')),
+            ],
+            options={
+                'verbose_name': 'Activo Fijo',
+                'verbose_name_plural': 'Activos Fijos',
+                'ordering': ['codigo'],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Archivo: contabilidad/migrations/0024_cargar_clases_activo.py
+
+from django.db import migrations
+
+# Clases de activo del catálogo por defecto:
+# (nombre, cuenta del activo, vida útil en meses). Todas se deprecian en
+# línea recta contra 154 Depreciación Acumulada y 526 Depreciación y Amortización.
+CLASES = [
+    ('Mobiliario y Equipo de Oficina', '151', 60),
+    ('Equipo de Computación', '152', 36),
+    ('Vehículos', '153', 48),
+]
+
+
+def cargar_clases(apps, schema_editor):
+    """
+    Función 'up': Crea las clases de activo (si existen sus cuentas).
+    """
+    Cuenta = apps.get_model('contabilidad', 'Cuenta')
+    ClaseActivo = apps.get_model('contabilidad', 'ClaseActivo')
+    cuentas = dict(Cuenta.objects.values_list('codigo', 'pk'))
+    if '154' not in cuentas or '526' not in cuentas:
+        return
+    for nombre, codigo, vida in CLASES:
+        if codigo in cuentas:
+            ClaseActivo.objects.get_or_create(nombre=nombre, defaults={
+                'cuenta_activo_id': cuentas[codigo],
+                'cuenta_depreciacion_id': cuentas['154'],
+                'cuenta_gasto_id': cuentas['526'],
+                'vida_util_meses': vida,
+            })
+
+
+def quitar_clases(apps, schema_editor):
+    """
+    Función 'down': Elimina las clases por defecto que no tienen activos.
+    """
+    ClaseActivo = apps.get_model('contabilidad', 'ClaseActivo')
+    ClaseActivo.objects.filter(nombre__in=[nombre for nombre, _, _ in CLASES], activos__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0023_activofijo'),
+    ]
+
+    operations = [
+        migrations.RunPython(cargar_clases, quitar_clases),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:54
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0024_cargar_clases_activo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Empleado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=30, unique=True)),
+                ('nombre', models.CharField(max_length=200)),
+                ('activo', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Empleado',
+                'verbose_name_plural': 'Empleados',
+                'ordering': ['codigo'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Planilla',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(help_text='Ej. Planilla quincenal 1', max_length=100)),
+                ('fecha', models.DateField(help_text='Fecha de la provisión y del pago')),
+                ('estado', models.CharField(choices=[('BORRADOR', 'Borrador'), ('CONTABILIZADA', 'Contabilizada')], default='BORRADOR', max_length=15)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('asiento_pago', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='contabilidad.asientodiario')),
+                ('asiento_provision', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='contabilidad.asientodiario')),
+                ('cuenta_gasto', models.ForeignKey(help_text='Gasto por sueldos (ej. 521)', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='contabilidad.cuenta')),
+                ('cuenta_pago', models.ForeignKey(help_text='Cuenta de la que se paga (ej. 113 Banco)', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='contabilidad.cuenta')),
+                ('cuenta_por_pagar', models.ForeignKey(help_text='Sueldos por pagar (ej. 231)', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='contabilidad.cuenta')),
+                ('periodo', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='planillas', to='contabilidad.periodocontable')),
+            ],
+            options={
+                'verbose_name': 'Planilla',
+                'verbose_name_plural': 'Planillas',
+                'ordering': ['-fecha', 'nombre'],
+                'unique_together': {('periodo', 'nombre')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TablaDeduccion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('base_maxima', models.DecimalField(blank=True, decimal_places=2, help_text='Salario máximo sobre el que se calcula (vacío: sin tope)', max_digits=12, null=True)),
+                ('activa', models.BooleanField(default=True)),
+                ('orden', models.PositiveSmallIntegerField(default=0)),
+                ('cuenta', models.ForeignKey(help_text='Cuenta por pagar de la deducción (ej. 232 AFP por Pagar)', limit_choices_to={'es_imputable': True}, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='contabilidad.cuenta')),
+            ],
+            options={
+                'verbose_name': 'Tabla de Deducción',
+                'verbose_name_plural': 'Tablas de Deducciones',
+                'ordering': ['orden', 'nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LineaPlanilla',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('salario', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('deducciones', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='{nombre de la tabla: monto}')),
+                ('total_deducciones', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('liquido', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('empleado', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lineas_planilla', to='contabilidad.empleado')),
+                ('planilla', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='contabilidad.planilla')),
+            ],
+            options={
+                'verbose_name': 'Línea de Planilla',
+                'verbose_name_plural': 'Líneas de Planilla',
+                'ordering': ['planilla', 'empleado__codigo'],
+                'unique_together': {('planilla', 'empleado')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TramoDeduccion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desde', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('porcentaje', models.DecimalField(decimal_places=4, default=0, help_text="Porcentaje sobre el exceso de 'desde' (ej. 7.25)", max_digits=7)),
+                ('cuota_fija', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('tabla', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tramos', to='contabilidad.tabladeduccion')),
+            ],
+            options={
+                'verbose_name': 'Tramo de Deducción',
+                'verbose_name_plural': 'Tramos de Deducción',
+                'ordering': ['tabla', 'desde'],
+                'unique_together': {('tabla', 'desde')},
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Archivo: contabilidad/migrations/0026_cargar_tablas_deduccion.py
+
+from decimal import Decimal
+
+from django.db import migrations
+
+# Deducciones laborales de El Salvador a cargo del empleado (las mismas
+# tasas que usa load_demo_data): (nombre, cuenta, base máxima, porcentaje).
+TABLAS = [
+    ('AFP', '232', None, Decimal('7.25')),
+    ('ISSS', '233', Decimal('1000.00'), Decimal('3.00')),
+]
+
+
+def cargar_tablas(apps, schema_editor):
+    """
+    Función 'up': Crea las tablas de deducción (si existen sus cuentas).
+    """
+    Cuenta = apps.get_model('contabilidad', 'Cuenta')
+    TablaDeduccion = apps.get_model('contabilidad', 'TablaDeduccion')
+    TramoDeduccion = apps.get_model('contabilidad', 'TramoDeduccion')
+    cuentas = dict(Cuenta.objects.values_list('codigo', 'pk'))
+    for orden, (nombre, codigo, base_maxima, porcentaje) in enumerate(TABLAS):
+        if codigo not in cuentas:
+            continue
+        tabla, creada = TablaDeduccion.objects.get_or_create(nombre=nombre, defaults={
+            'cuenta_id': cuentas[codigo], 'base_maxima': base_maxima, 'orden': orden,
+        })
+        if creada:
+            TramoDeduccion.objects.create(tabla=tabla, desde=0, porcentaje=porcentaje)
+
+
+def quitar_tablas(apps, schema_editor):
+    """
+    Función 'down': Elimina las tablas por defecto.
+    """
+    TablaDeduccion = apps.get_model('contabilidad', 'TablaDeduccion')
+    TablaDeduccion.objects.filter(nombre__in=[nombre for nombre, _, _, _ in TABLAS]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0025_planilla'),
+    ]
+
+    operations = [
+        migrations.RunPython(cargar_tablas, quitar_tablas),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0026_cargar_tablas_deduccion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatoFiscal',
+            fields=[
+                ('movimiento', models.OneToOneField(db_constraint=False, help_text='Línea de IVA (141 crédito fiscal / 221 débito fiscal)', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dato_fiscal', serialize=False, to='contabilidad.movimiento')),
+                ('libro', models.CharField(choices=[('COMPRAS', 'Libro de Compras'), ('VENTAS', 'Libro de Ventas')], max_length=10)),
+                ('tipo_documento', models.CharField(choices=[('CCF', 'Comprobante de Crédito Fiscal'), ('FAC', 'Factura'), ('NC', 'Nota de Crédito'), ('ND', 'Nota de Débito')], default='CCF', max_length=3)),
+                ('numero_documento', models.CharField(max_length=50)),
+                ('fecha_documento', models.DateField()),
+                ('tercero_nit', models.CharField(max_length=20, verbose_name='NIT/NRC del tercero')),
+                ('tercero_nombre', models.CharField(max_length=200, verbose_name='Nombre del tercero')),
+                ('base_gravada', models.DecimalField(decimal_places=2, help_text='Monto gravado del documento (negativo en notas de crédito)', max_digits=12)),
+                ('monto_exento', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('periodo', models.ForeignKey(editable=False, help_text='Copia del período del movimiento', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='contabilidad.periodocontable')),
+            ],
+            options={
+                'verbose_name': 'Dato Fiscal',
+                'verbose_name_plural': 'Datos Fiscales',
+                'indexes': [models.Index(fields=['periodo', 'libro', 'fecha_documento', 'numero_documento'], name='fiscal_libro_idx'), models.Index(fields=['tercero_nit', 'fecha_documento'], name='fiscal_tercero_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0027_datofiscal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumidorBitacora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('secuencia', models.BigIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Consumidor de la Bitácora',
+                'verbose_name_plural': 'Consumidores de la Bitácora',
+            },
+        ),
+        migrations.CreateModel(
+            name='Tercero',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('CLIENTE', 'Cliente'), ('PROVEEDOR', 'Proveedor'), ('EMPLEADO', 'Empleado')], max_length=10)),
+                ('codigo', models.CharField(max_length=30, unique=True)),
+                ('nombre', models.CharField(max_length=200)),
+                ('nit', models.CharField(blank=True, max_length=20, verbose_name='NIT/NRC')),
+                ('activo', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Tercero',
+                'verbose_name_plural': 'Terceros',
+                'ordering': ['codigo'],
+                'indexes': [models.Index(fields=['tipo', 'codigo'], name='tercero_tipo_codigo_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoTercero',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('debe', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('haber', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('movimientos', models.IntegerField(default=0)),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contabilidad.cuenta')),
+                ('periodo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contabilidad.periodocontable')),
+                ('tercero', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='contabilidad.tercero')),
+            ],
+            options={
+                'verbose_name': 'Saldo por Tercero',
+                'verbose_name_plural': 'Saldos por Tercero',
+            },
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='tercero',
+            field=models.ForeignKey(blank=True, help_text='Cliente, proveedor o empleado (auxiliar de la cuenta)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='contabilidad.tercero'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['cuenta', 'tercero', 'periodo', 'debe', 'haber'], name='mov_cuenta_tercero_periodo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['tercero', 'periodo', 'fecha', 'asiento', 'id'], name='mov_tercero_periodo_orden_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saldotercero',
+            index=models.Index(fields=['tercero', 'cuenta', 'periodo'], name='saldo_tercero_cuenta_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='saldotercero',
+            constraint=models.UniqueConstraint(fields=('cuenta', 'tercero', 'periodo'), name='saldo_tercero_unico'),
+        ),
+    ]
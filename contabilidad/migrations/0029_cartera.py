@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0028_tercero'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimiento',
+            name='referencia',
+            field=models.CharField(blank=True, default='', help_text='Documento de la línea (factura, recibo); concilia pagos con documentos en la cartera', max_length=40),
+        ),
+        migrations.CreateModel(
+            name='PartidaCartera',
+            fields=[
+                ('movimiento', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='partida_cartera', serialize=False, to='contabilidad.movimiento')),
+                ('tipo', models.CharField(choices=[('DOCUMENTO', 'Documento'), ('PAGO', 'Pago')], max_length=10)),
+                ('referencia', models.CharField(blank=True, max_length=40)),
+                ('fecha', models.DateField()),
+                ('vencimiento', models.DateField()),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('pendiente', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contabilidad.cuenta')),
+                ('tercero', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='partidas_cartera', to='contabilidad.tercero')),
+            ],
+            options={
+                'verbose_name': 'Partida de Cartera',
+                'verbose_name_plural': 'Partidas de Cartera',
+            },
+        ),
+        migrations.CreateModel(
+            name='AplicacionCartera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('automatica', models.BooleanField(default=False)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('documento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aplicaciones_recibidas', to='contabilidad.partidacartera')),
+                ('pago', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aplicaciones', to='contabilidad.partidacartera')),
+            ],
+            options={
+                'verbose_name': 'Aplicación de Cartera',
+                'verbose_name_plural': 'Aplicaciones de Cartera',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='partidacartera',
+            index=models.Index(condition=models.Q(('pendiente__gt', 0)), fields=['cuenta', 'tipo', 'vencimiento'], name='cartera_abierta_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partidacartera',
+            index=models.Index(condition=models.Q(('pendiente__gt', 0)), fields=['tercero', 'cuenta', 'referencia'], name='cartera_abierta_tercero_idx'),
+        ),
+    ]
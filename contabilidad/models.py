@@ -1,9 +1,12 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
+from functools import partial
 from django.db.models import Sum, Q # Importar Q
+from . import metricas
 
 # --- Modelo de Catálogo de Cuentas ---
 
@@ -29,6 +32,13 @@ class Cuenta(models.Model):
         DEUDORA = 'DEUDORA', 'Deudora'
         ACREEDORA = 'ACREEDORA', 'Acreedora'
 
+    # --- Categoría para el Estado de Flujo de Efectivo ---
+    class CategoriaFlujo(models.TextChoices):
+        EFECTIVO = 'EFECTIVO', 'Efectivo y Equivalentes'
+        OPERACION = 'OPERACION', 'Actividades de Operación'
+        INVERSION = 'INVERSION', 'Actividades de Inversión'
+        FINANCIACION = 'FINANCIACION', 'Actividades de Financiación'
+
     codigo = models.CharField(
         max_length=20, 
         unique=True, 
@@ -65,12 +75,23 @@ class Cuenta(models.Model):
         help_text="Indica si la cuenta puede recibir movimientos (transacciones)"
     )
     
+    categoria_flujo = models.CharField(
+        max_length=12,
+        choices=CategoriaFlujo.choices,
+        blank=True,
+        default='',
+        help_text="Categoría en el Flujo de Efectivo. Si se deja vacía se hereda de la cuenta padre."
+    )
+
     # --- NUEVO CAMPO PARA SOFT DELETE ---
     esta_activa = models.BooleanField(
         default=True,
         help_text="Indica si la cuenta está activa. Las cuentas inactivas no se pueden usar en nuevos asientos."
     )
 
+    # Campos que se copian en la bitácora de cambios (CambioLibro)
+    CAMPOS_BITACORA = ('codigo', 'nombre', 'tipo_cuenta', 'naturaleza', 'padre_id', 'es_imputable', 'esta_activa', 'categoria_flujo')
+
     class Meta:
         ordering = ['codigo']
         verbose_name = "Cuenta Contable"
@@ -79,6 +100,69 @@ class Cuenta(models.Model):
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
 
+    @classmethod
+    def mapa_categorias_flujo(cls):
+        """
+        Devuelve {cuenta_id: cuenta} para todo el catálogo, con el atributo
+        'categoria_flujo_efectiva' resuelto (heredado de la cuenta padre más
+        cercana que tenga categoría). Usa una sola consulta.
+        """
+        cuentas = {c.pk: c for c in cls.objects.all()}
+
+        def resolver(cuenta):
+            if not hasattr(cuenta, 'categoria_flujo_efectiva'):
+                padre = cuentas.get(cuenta.padre_id)
+                cuenta.categoria_flujo_efectiva = cuenta.categoria_flujo or (resolver(padre) if padre else '')
+            return cuenta.categoria_flujo_efectiva
+
+        for cuenta in cuentas.values():
+            resolver(cuenta)
+        return cuentas
+
+    def save(self, *args, **kwargs):
+        operacion = CambioLibro.Operacion.INSERCION if self.pk is None else CambioLibro.Operacion.ACTUALIZACION
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            CambioLibro.registrar_objetos(operacion, [self])
+            PeriodoContable.registrar_cambio(self._periodos_que_la_muestran())
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            periodo_ids = self._periodos_que_la_muestran()
+            CambioLibro.registrar_objetos(CambioLibro.Operacion.ELIMINACION, [self])
+            resultado = super().delete(*args, **kwargs)
+            PeriodoContable.registrar_cambio(periodo_ids)
+        return resultado
+
+    def _periodos_que_la_muestran(self):
+        """
+        Períodos cuyos reportes cambian si cambia esta cuenta (nombre, código,
+        categoría): los que tienen movimientos en ella o en sus subcuentas
+        (también los archivados) y los abiertos, donde una cuenta nueva ya
+        aparece en los listados. Los demás períodos cerrados conservan su versión.
+        """
+        from . import archivo_historico
+
+        hijos = {}
+        for pk, padre_id in Cuenta.objects.values_list('pk', 'padre_id'):
+            hijos.setdefault(padre_id, []).append(pk)
+        subcuentas, pendientes = set(), [self.pk]
+        while pendientes:
+            pk = pendientes.pop()
+            subcuentas.add(pk)
+            pendientes.extend(hijos.get(pk, []))
+
+        periodo_ids = set(
+            Movimiento.objects.filter(cuenta_id__in=subcuentas).order_by().values_list('periodo_id', flat=True).distinct()
+        )
+        periodo_ids.update(
+            PeriodoContable.objects.filter(estado=PeriodoContable.EstadoPeriodo.ABIERTO).values_list('pk', flat=True)
+        )
+        for archivo in ArchivoPeriodo.objects.all():
+            if archivo_historico.cuentas_con_movimiento(archivo) & subcuentas:
+                periodo_ids.add(archivo.periodo_id)
+        return periodo_ids
+
     def get_saldo_total(self):
         """
         Calcula el saldo neto total (histórico) de esta cuenta.
@@ -141,6 +225,20 @@ class PeriodoContable(models.Model):
     )
     # --- FIN DE NUEVOS CAMPOS ---
 
+    # --- Versión del libro (validadores HTTP de los reportes) ---
+    version_libro = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Se incrementa con cada cambio en el período, sus asientos o el catálogo."
+    )
+    modificado_en = models.DateTimeField(
+        null=True, blank=True,
+        editable=False,
+        help_text="Fecha y hora del último cambio registrado en version_libro."
+    )
+
+    CAMPOS_VERSION = ('version_libro', 'modificado_en')
+
     class Meta:
         ordering = ['-fecha_inicio']
         verbose_name = "Período Contable"
@@ -149,6 +247,31 @@ class PeriodoContable(models.Model):
     def __str__(self):
         return f"{self.nombre} ({self.get_estado_display()})"
 
+    def save(self, *args, **kwargs):
+        # La versión solo cambia con registrar_cambio (UPDATE atómico): un
+        # save() de la instancia en memoria no debe sobrescribirla.
+        if self.pk and not kwargs.get('update_fields') and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.CAMPOS_VERSION
+            ]
+        super().save(*args, **kwargs)
+        PeriodoContable.registrar_cambio([self.pk])
+
+    @classmethod
+    def registrar_cambio(cls, periodo_ids=None):
+        """
+        Incrementa version_libro y actualiza modificado_en de los períodos
+        indicados (de todos si periodo_ids es None), con un solo UPDATE.
+        """
+        periodos = cls.objects.all()
+        if periodo_ids is not None:
+            periodo_ids = {pk for pk in periodo_ids if pk is not None}
+            if not periodo_ids:
+                return
+            periodos = periodos.filter(pk__in=periodo_ids)
+        periodos.update(version_libro=models.F('version_libro') + 1, modificado_en=timezone.now())
+
     def clean(self):
         # Validación para asegurar que las fechas sean lógicas
         if self.fecha_inicio and self.fecha_fin and self.fecha_inicio > self.fecha_fin:
@@ -156,6 +279,39 @@ class PeriodoContable(models.Model):
 
 # --- Modelo de Asiento Diario (Partida) ---
 
+class AsientoDiarioQuerySet(models.QuerySet):
+    """
+    QuerySet de AsientoDiario. delete() registra en la bitácora los asientos
+    y sus movimientos, y el cambio en los períodos afectados (el borrado en
+    cascada de los movimientos no pasa por Movimiento).
+    bulk_create no llama a save(): no asigna numero_partida ni valida, así
+    que quien lo use debe traer los números ya asignados. Sí escribe la
+    bitácora y registra el cambio en los períodos.
+    """
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic():
+            creados = super().bulk_create(objs, *args, **kwargs)
+            CambioLibro.registrar_objetos(CambioLibro.Operacion.INSERCION, [a for a in creados if a.pk])
+            PeriodoContable.registrar_cambio({a.periodo_id for a in objs})
+        return creados
+
+    def delete(self):
+        with transaction.atomic():
+            periodo_ids = set(self.values_list('periodo_id', flat=True).distinct())
+            CambioLibro.registrar(
+                CambioLibro.Modelo.MOVIMIENTO, CambioLibro.Operacion.ELIMINACION,
+                Movimiento.objects.filter(asiento__in=self.values('pk')).values('id', *Movimiento.CAMPOS_BITACORA).iterator()
+            )
+            CambioLibro.registrar(
+                CambioLibro.Modelo.ASIENTO, CambioLibro.Operacion.ELIMINACION,
+                self.values('id', *AsientoDiario.CAMPOS_BITACORA).iterator()
+            )
+            resultado = super().delete()
+            PeriodoContable.registrar_cambio(periodo_ids)
+        return resultado
+
+
 class AsientoDiario(models.Model):
     """
     Representa una partida o asiento contable en el libro diario.
@@ -192,6 +348,24 @@ class AsientoDiario(models.Model):
         help_text="Indica si es un asiento de Cierre o Apertura generado por el sistema."
     )
     # --- FIN DE NUEVO CAMPO ---
+    es_ajuste = models.BooleanField(
+        default=False,
+        help_text="Asiento de ajuste: se muestra en la columna de Ajustes de la hoja de trabajo."
+    )
+    # SET_NULL: archivar el período del original no debe bloquearse por sus reversiones
+    reversa_de = models.ForeignKey(
+        'self',
+        null=True, blank=True,
+        on_delete=models.SET_NULL,
+        related_name='reversiones',
+        editable=False,
+        help_text="Asiento que este revierte (ver servicios.revertir_asientos)."
+    )
+
+    objects = AsientoDiarioQuerySet.as_manager()
+
+    # Campos que se copian en la bitácora de cambios (CambioLibro)
+    CAMPOS_BITACORA = ('periodo_id', 'numero_partida', 'fecha', 'descripcion', 'es_asiento_automatico', 'es_ajuste')
 
     class Meta:
         ordering = ['periodo', 'numero_partida']
@@ -231,40 +405,165 @@ class AsientoDiario(models.Model):
         # No validamos si es un asiento automático (para evitar problemas en el cierre)
         if not self.es_asiento_automatico:
             self.clean()
-        
-        # Asignar número de partida solo al crear un nuevo asiento
-        if not self.pk and self.periodo:
-            # 1. Obtener el último número de partida para ESTE período
-            ultimo_asiento = AsientoDiario.objects.filter(periodo=self.periodo).order_by('-numero_partida').first()
-            
-            if ultimo_asiento:
-                self.numero_partida = ultimo_asiento.numero_partida + 1
-            else:
-                # Es el primer asiento del período
-                self.numero_partida = 1
-        
-        super().save(*args, **kwargs)
+
+        es_nuevo = self.pk is None
+        with transaction.atomic():
+            # Asignar número de partida solo al crear un nuevo asiento
+            if es_nuevo and self.periodo:
+                # Con el candado del libro, dos registros simultáneos no leen el
+                # mismo último número, y un cierre en curso termina antes (o
+                # empieza después) de que el asiento entre al período
+                CambioLibro.bloquear_escrituras()
+                estado = PeriodoContable.objects.filter(pk=self.periodo_id).values_list('estado', flat=True).first()
+                if estado == PeriodoContable.EstadoPeriodo.CERRADO and not self.es_asiento_automatico:
+                    raise ValidationError(f"El período '{self.periodo.nombre}' está cerrado. No se pueden registrar transacciones.")
+
+                # 1. Obtener el último número de partida para ESTE período
+                ultimo_asiento = AsientoDiario.objects.filter(periodo=self.periodo).order_by('-numero_partida').first()
+                
+                if ultimo_asiento:
+                    self.numero_partida = ultimo_asiento.numero_partida + 1
+                else:
+                    # Es el primer asiento del período
+                    self.numero_partida = 1
+
+            super().save(*args, **kwargs)
+            CambioLibro.registrar_objetos(
+                CambioLibro.Operacion.INSERCION if es_nuevo else CambioLibro.Operacion.ACTUALIZACION, [self]
+            )
+
+            # Mantener sincronizadas las columnas denormalizadas de los movimientos
+            # (solo se actualizan las filas que realmente difieren)
+            periodos_afectados = {self.periodo_id}
+            if not es_nuevo:
+                sincronizado = {
+                    'fecha': self.fecha,
+                    'periodo_id': self.periodo_id,
+                    'es_asiento_automatico': self.es_asiento_automatico,
+                }
+                desincronizados = self.movimientos.exclude(**sincronizado)
+                anteriores = list(desincronizados.values('id', *Movimiento.CAMPOS_BITACORA))
+                if anteriores:
+                    desincronizados.update(**sincronizado)
+                    periodos_afectados.update(fila['periodo_id'] for fila in anteriores)
+                    DatoFiscal.objects.filter(
+                        movimiento_id__in=[fila['id'] for fila in anteriores]
+                    ).exclude(periodo_id=self.periodo_id).update(periodo_id=self.periodo_id)
+                    CambioLibro.registrar(
+                        CambioLibro.Modelo.MOVIMIENTO, CambioLibro.Operacion.ACTUALIZACION,
+                        ({**fila, **sincronizado, 'anterior': {c: fila[c] for c in Movimiento.CAMPOS_BITACORA}} for fila in anteriores)
+                    )
+            PeriodoContable.registrar_cambio(periodos_afectados)
+
+    def delete(self, *args, **kwargs):
+        periodo_id = self.periodo_id
+        with transaction.atomic():
+            CambioLibro.registrar(
+                CambioLibro.Modelo.MOVIMIENTO, CambioLibro.Operacion.ELIMINACION,
+                self.movimientos.values('id', *Movimiento.CAMPOS_BITACORA)
+            )
+            CambioLibro.registrar_objetos(CambioLibro.Operacion.ELIMINACION, [self])
+            resultado = super().delete(*args, **kwargs)
+            PeriodoContable.registrar_cambio([periodo_id])
+        return resultado
 
     # Propiedades para verificar la partida doble (útil en vistas y admin)
     @property
     def total_debe(self):
         # 'movimientos' es el related_name del ForeignKey en el modelo Movimiento
+        if self._movimientos_precargados():
+            return sum((m.debe for m in self.movimientos.all()), Decimal('0.00'))
         return self.movimientos.aggregate(total=models.Sum('debe'))['total'] or Decimal('0.00')
 
     @property
     def total_haber(self):
+        if self._movimientos_precargados():
+            return sum((m.haber for m in self.movimientos.all()), Decimal('0.00'))
         return self.movimientos.aggregate(total=models.Sum('haber'))['total'] or Decimal('0.00')
 
+    def _movimientos_precargados(self):
+        # Con prefetch_related('movimientos') los totales se suman en memoria
+        # (una lista de asientos no hace una consulta por fila)
+        return 'movimientos' in getattr(self, '_prefetched_objects_cache', {})
+
     @property
     def esta_cuadrado(self):
         return self.total_debe == self.total_haber
 
+# --- Terceros (auxiliares de clientes, proveedores y empleados) ---
+
+class Tercero(models.Model):
+    """
+    Cliente, proveedor o empleado al que se imputa un movimiento. Con él,
+    cuentas como Clientes (121) o Proveedores (211) tienen un auxiliar por
+    tercero: ver SaldoTercero y contabilidad/auxiliares.py.
+    """
+    class Tipo(models.TextChoices):
+        CLIENTE = 'CLIENTE', 'Cliente'
+        PROVEEDOR = 'PROVEEDOR', 'Proveedor'
+        EMPLEADO = 'EMPLEADO', 'Empleado'
+
+    tipo = models.CharField(max_length=10, choices=Tipo.choices)
+    codigo = models.CharField(max_length=30, unique=True)
+    nombre = models.CharField(max_length=200)
+    nit = models.CharField(max_length=20, blank=True, verbose_name="NIT/NRC")
+    activo = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['codigo']
+        verbose_name = "Tercero"
+        verbose_name_plural = "Terceros"
+        indexes = [
+            models.Index(fields=['tipo', 'codigo'], name='tercero_tipo_codigo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.codigo} - {self.nombre}"
+
+
 # --- Modelo de Movimiento (Línea de Asiento) ---
 
+class MovimientoQuerySet(models.QuerySet):
+    """
+    QuerySet de Movimiento. bulk_create no llama a save(), por lo que
+    aquí se copian las columnas denormalizadas del asiento antes de insertar
+    (los asientos se leen con una sola consulta, no uno por movimiento).
+    bulk_create y delete escriben la bitácora y registran el cambio en la
+    versión de los períodos. update() no lo hace: quien lo use debe
+    registrar sus cambios (ver AsientoDiario.save).
+    """
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        asientos = AsientoDiario.objects.only('fecha', 'periodo_id', 'es_asiento_automatico').in_bulk(
+            {mov.asiento_id for mov in objs if mov.asiento_id}
+        )
+        for mov in objs:
+            mov.sincronizar_con_asiento(asientos.get(mov.asiento_id))
+        with transaction.atomic():
+            creados = super().bulk_create(objs, *args, **kwargs)
+            CambioLibro.registrar_objetos(CambioLibro.Operacion.INSERCION, [mov for mov in creados if mov.pk])
+            PeriodoContable.registrar_cambio({mov.periodo_id for mov in objs})
+        return creados
+
+    def delete(self):
+        with transaction.atomic():
+            periodo_ids = set(self.values_list('periodo_id', flat=True).distinct())
+            CambioLibro.registrar(
+                CambioLibro.Modelo.MOVIMIENTO, CambioLibro.Operacion.ELIMINACION,
+                self.values('id', *Movimiento.CAMPOS_BITACORA).iterator()
+            )
+            resultado = super().delete()
+            PeriodoContable.registrar_cambio(periodo_ids)
+        return resultado
+
+
 class Movimiento(models.Model):
     """
     Representa una línea individual (débito o crédito) dentro
     de un AsientoDiario.
+
+    'fecha', 'periodo' y 'es_asiento_automatico' son copias del asiento
+    padre: permiten que los reportes agreguen sin hacer JOIN a AsientoDiario.
     """
     asiento = models.ForeignKey(
         AsientoDiario,
@@ -286,19 +585,101 @@ class Movimiento(models.Model):
         default=0
     )
     haber = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2, 
+        max_digits=12,
+        decimal_places=2,
         default=0
     )
+    tercero = models.ForeignKey(
+        Tercero,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='movimientos',
+        help_text="Cliente, proveedor o empleado (auxiliar de la cuenta)"
+    )
+    referencia = models.CharField(
+        max_length=40,
+        blank=True,
+        default='',
+        help_text="Documento de la línea (factura, recibo); concilia pagos con documentos en la cartera"
+    )
+
+    # --- Columnas denormalizadas del asiento (se copian al guardar) ---
+    fecha = models.DateField(
+        editable=False,
+        help_text="Copia de la fecha del asiento"
+    )
+    periodo = models.ForeignKey(
+        PeriodoContable,
+        on_delete=models.PROTECT,
+        related_name="movimientos",
+        editable=False,
+        help_text="Copia del período del asiento"
+    )
+    es_asiento_automatico = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text="Copia de la marca de asiento automático (Cierre/Apertura)"
+    )
+
+    objects = MovimientoQuerySet.as_manager()
+
+    # Campos que se copian en la bitácora de cambios (CambioLibro)
+    CAMPOS_BITACORA = ('asiento_id', 'cuenta_id', 'periodo_id', 'fecha', 'debe', 'haber', 'es_asiento_automatico', 'tercero_id', 'referencia')
 
     class Meta:
         ordering = ['pk'] # Ordenar por creación
         verbose_name = "Movimiento"
         verbose_name_plural = "Movimientos"
+        # Índices compuestos para los reportes. 'debe' y 'haber' van al final
+        # de la llave para que las sumas se resuelvan solo con el índice.
+        indexes = [
+            models.Index(fields=['cuenta', 'periodo', 'debe', 'haber'], name='mov_cuenta_periodo_idx'),
+            models.Index(fields=['cuenta', 'fecha', 'debe', 'haber'], name='mov_cuenta_fecha_idx'),
+            models.Index(fields=['periodo', 'es_asiento_automatico', 'cuenta', 'debe', 'haber'], name='mov_periodo_auto_cuenta_idx'),
+            # Orden del libro mayor: paginación por cursor (fecha, asiento, id)
+            models.Index(fields=['cuenta', 'periodo', 'fecha', 'asiento', 'id'], name='mov_cuenta_periodo_orden_idx'),
+            # Auxiliares: saldos por (cuenta, tercero, período) y estado de cuenta de un tercero
+            models.Index(fields=['cuenta', 'tercero', 'periodo', 'debe', 'haber'], name='mov_cuenta_tercero_periodo_idx'),
+            models.Index(fields=['tercero', 'periodo', 'fecha', 'asiento', 'id'], name='mov_tercero_periodo_orden_idx'),
+        ]
 
     def __str__(self):
         return f"{self.cuenta.codigo} | Debe: {self.debe} | Haber: {self.haber}"
 
+    def sincronizar_con_asiento(self, asiento=None):
+        """
+        Copia fecha, período y marca de automático desde el asiento padre
+        ('asiento' si ya se leyó, como en bulk_create).
+        """
+        if self.asiento_id:
+            asiento = asiento or self.asiento
+            self.fecha = asiento.fecha
+            self.periodo_id = asiento.periodo_id
+            self.es_asiento_automatico = asiento.es_asiento_automatico
+
+    def save(self, *args, **kwargs):
+        self.sincronizar_con_asiento()
+        with transaction.atomic():
+            anterior = None
+            if self.pk is not None:
+                anterior = Movimiento.objects.filter(pk=self.pk).values(*self.CAMPOS_BITACORA).first()
+            super().save(*args, **kwargs)
+            if anterior:
+                CambioLibro.registrar_objetos(CambioLibro.Operacion.ACTUALIZACION, [self], anteriores={self.pk: anterior})
+                PeriodoContable.registrar_cambio([self.periodo_id, anterior['periodo_id']])
+            else:
+                CambioLibro.registrar_objetos(CambioLibro.Operacion.INSERCION, [self])
+                PeriodoContable.registrar_cambio([self.periodo_id])
+
+    def delete(self, *args, **kwargs):
+        periodo_id = self.periodo_id
+        with transaction.atomic():
+            CambioLibro.registrar_objetos(CambioLibro.Operacion.ELIMINACION, [self])
+            resultado = super().delete(*args, **kwargs)
+            PeriodoContable.registrar_cambio([periodo_id])
+        return resultado
+
     def clean(self):
         # 1. Validar que no se ingrese debe y haber al mismo tiempo
         if self.debe > 0 and self.haber > 0:
@@ -312,8 +693,762 @@ class Movimiento(models.Model):
         if not self.cuenta.esta_activa:
             raise ValidationError(f"La cuenta '{self.cuenta.nombre}' está inactiva y no puede recibir nuevos movimientos.")
 
+# --- Modelo de Archivo Histórico (Períodos archivados en disco) ---
+
+class ArchivoPeriodo(models.Model):
+    """
+    Registro de un período cerrado cuyos movimientos se exportaron a
+    archivos columnares (ver contabilidad/archivo_historico.py) y se eliminaron de la
+    base de datos. En su lugar queda un asiento de arrastre con el saldo
+    neto de cada cuenta.
+    """
+    periodo = models.OneToOneField(
+        PeriodoContable,
+        on_delete=models.PROTECT,
+        related_name='archivo',
+        help_text="Período archivado"
+    )
+    ruta = models.CharField(
+        max_length=255,
+        help_text="Directorio del archivo, relativo a CONTABILIDAD_ARCHIVO_DIR"
+    )
+    num_movimientos = models.PositiveIntegerField(default=0)
+    total_debe = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_haber = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    checksum_manifiesto = models.CharField(
+        max_length=64,
+        help_text="SHA-256 del manifest.json del archivo"
+    )
+    asiento_arrastre = models.ForeignKey(
+        AsientoDiario,
+        null=True, blank=True,
+        on_delete=models.SET_NULL,
+        related_name='archivos_arrastrados',
+        help_text="Asiento con los saldos arrastrados de este archivo."
+    )
+    fecha_arrastre = models.DateField(
+        help_text="Fecha del asiento de arrastre. Los saldos a una fecha anterior se leen del archivo."
+    )
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-periodo__fecha_inicio']
+        verbose_name = "Período Archivado"
+        verbose_name_plural = "Períodos Archivados"
+
+    def __str__(self):
+        return f"Archivo de {self.periodo.nombre} ({self.num_movimientos} movimientos)"
+
 #COSTEO
 
+# --- Bitácora de cambios del libro (append-only) ---
+
+class CambioLibro(models.Model):
+    """
+    Registro append-only de cada alta, modificación o baja de Movimiento,
+    AsientoDiario y Cuenta, con un número de secuencia creciente. Se escribe
+    en la misma transacción que el cambio, así que un consumidor que lee
+    "los cambios después de la secuencia N" (ver contabilidad/bitacora.py)
+    nunca ve un cambio que luego se revierta.
+
+    'datos' guarda los campos del objeto (CAMPOS_BITACORA) tal como quedaron;
+    en una baja, los que tenía. Las modificaciones de movimientos incluyen
+    además 'anterior' con los valores previos, para aplicar la diferencia.
+    """
+    class Modelo(models.TextChoices):
+        CUENTA = 'CUENTA', 'Cuenta'
+        ASIENTO = 'ASIENTO', 'Asiento'
+        MOVIMIENTO = 'MOVIMIENTO', 'Movimiento'
+
+    class Operacion(models.TextChoices):
+        INSERCION = 'I', 'Inserción'
+        ACTUALIZACION = 'U', 'Actualización'
+        ELIMINACION = 'D', 'Eliminación'
+
+    # Llave del candado de PostgreSQL que ordena las escrituras de la bitácora
+    LLAVE_CANDADO = 35_0001
+    TAMANO_LOTE = 5000
+    # Contador de contabilidad/metricas.py que suma las altas confirmadas de cada modelo
+    METRICA_ALTAS = {
+        Modelo.ASIENTO: 'sic_asientos_registrados_total',
+        Modelo.MOVIMIENTO: 'sic_movimientos_escritos_total',
+    }
+
+    secuencia = models.BigAutoField(primary_key=True)
+    modelo = models.CharField(max_length=10, choices=Modelo.choices)
+    operacion = models.CharField(max_length=1, choices=Operacion.choices)
+    objeto_id = models.BigIntegerField(help_text="Id del objeto modificado")
+    periodo_id = models.BigIntegerField(
+        null=True, blank=True,
+        help_text="Período del asiento o movimiento (vacío para cuentas)"
+    )
+    datos = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    registrado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['secuencia']
+        verbose_name = "Cambio del Libro"
+        verbose_name_plural = "Bitácora de Cambios"
+        indexes = [
+            models.Index(fields=['modelo', 'secuencia'], name='cambio_modelo_secuencia_idx'),
+            models.Index(fields=['periodo_id', 'secuencia'], name='cambio_periodo_secuencia_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.secuencia} {self.get_operacion_display()} {self.modelo} {self.objeto_id}"
+
+    @classmethod
+    def bloquear_escrituras(cls):
+        """
+        En PostgreSQL, un candado de transacción hace que las transacciones
+        que escriben en la bitácora confirmen en el orden de su secuencia
+        (una secuencia menor nunca aparece después de que un consumidor leyó
+        una mayor). SQLite ya serializa las escrituras.
+
+        Como toda escritura del libro lo toma, también sirve para serializar
+        lo que debe leerse y escribirse sin que otro se cuele en medio (el
+        número de partida, el cierre de un período). Se toma siempre antes
+        de actualizar filas de PeriodoContable, para no invertir el orden.
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [cls.LLAVE_CANDADO])
+
+    @classmethod
+    def registrar(cls, modelo, operacion, filas):
+        """
+        Agrega una entrada por cada fila. 'filas' es un iterable de dicts con
+        'id' y los campos del modelo (por ejemplo, de .values()). Se inserta
+        por lotes dentro de la transacción en curso.
+        """
+        with transaction.atomic(savepoint=False):
+            ordenado = False
+            lote = []
+            cantidad = 0
+            for fila in filas:
+                if not ordenado:
+                    cls.bloquear_escrituras()
+                    ordenado = True
+                cantidad += 1
+                datos = dict(fila)
+                objeto_id = datos.pop('id')
+                lote.append(cls(
+                    modelo=modelo,
+                    operacion=operacion,
+                    objeto_id=objeto_id,
+                    periodo_id=datos.get('periodo_id'),
+                    datos=datos,
+                ))
+                if len(lote) >= cls.TAMANO_LOTE:
+                    cls.objects.bulk_create(lote)
+                    lote = []
+            if lote:
+                cls.objects.bulk_create(lote)
+            if cantidad and operacion == cls.Operacion.INSERCION and modelo in cls.METRICA_ALTAS:
+                transaction.on_commit(partial(metricas.incrementar, cls.METRICA_ALTAS[modelo], cantidad))
+
+    @classmethod
+    def registrar_objetos(cls, operacion, objetos, anteriores=None):
+        """
+        Igual que registrar(), a partir de instancias de un mismo modelo.
+        'anteriores' es {pk: valores previos} (se guardan en 'anterior').
+        """
+        if not objetos:
+            return
+        modelo = {
+            Cuenta: cls.Modelo.CUENTA,
+            AsientoDiario: cls.Modelo.ASIENTO,
+            Movimiento: cls.Modelo.MOVIMIENTO,
+        }[type(objetos[0])]
+        filas = []
+        for obj in objetos:
+            fila = {'id': obj.pk, **{campo: getattr(obj, campo) for campo in obj.CAMPOS_BITACORA}}
+            if anteriores and obj.pk in anteriores:
+                fila['anterior'] = anteriores[obj.pk]
+            filas.append(fila)
+        cls.registrar(modelo, operacion, filas)
+
+
+# --- Plantillas de asientos (registro manual y asientos recurrentes) ---
+
+class PlantillaAsiento(models.Model):
+    """
+    Asiento modelo: líneas con cuenta y fórmula sobre un monto base.
+    Todas las plantillas activas se ofrecen en el registro manual; las
+    recurrentes, además, las genera el comando generar_recurrentes en cada
+    fecha que vence según su frecuencia (ver contabilidad/recurrentes.py).
+    """
+    class Frecuencia(models.TextChoices):
+        MENSUAL = 'MENSUAL', 'Mensual'
+        TRIMESTRAL = 'TRIMESTRAL', 'Trimestral'
+        ANUAL = 'ANUAL', 'Anual'
+
+    MESES_FRECUENCIA = {Frecuencia.MENSUAL: 1, Frecuencia.TRIMESTRAL: 3, Frecuencia.ANUAL: 12}
+
+    nombre = models.CharField(max_length=100, unique=True)
+    descripcion = models.TextField(
+        blank=True,
+        help_text="Descripción de los asientos generados (por defecto, el nombre)"
+    )
+    monto_base = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text="Base de las líneas calculadas como porcentaje o tasa"
+    )
+    es_ajuste = models.BooleanField(default=False)
+    activa = models.BooleanField(default=True)
+
+    # --- Programación (solo plantillas recurrentes) ---
+    recurrente = models.BooleanField(
+        default=False,
+        help_text="Si el comando generar_recurrentes la genera. Si no, solo se usa en el registro manual."
+    )
+    frecuencia = models.CharField(max_length=10, choices=Frecuencia.choices, default=Frecuencia.MENSUAL)
+    dia = models.PositiveSmallIntegerField(
+        default=1,
+        help_text="Día del mes del asiento (en meses más cortos, el último día)"
+    )
+    vigente_desde = models.DateField(
+        null=True, blank=True,
+        help_text="Primer mes en que vence (la frecuencia se cuenta desde aquí)"
+    )
+    vigente_hasta = models.DateField(null=True, blank=True)
+    generada_hasta = models.DateField(
+        null=True, blank=True,
+        editable=False,
+        help_text="Fecha de la última ocurrencia generada. Las anteriores no se vuelven a generar."
+    )
+
+    class Meta:
+        ordering = ['nombre']
+        verbose_name = "Plantilla de Asiento"
+        verbose_name_plural = "Plantillas de Asientos"
+
+    def __str__(self):
+        return self.nombre
+
+    def clean(self):
+        if not 1 <= self.dia <= 31:
+            raise ValidationError("El día debe estar entre 1 y 31.")
+        if self.recurrente and not self.vigente_desde:
+            raise ValidationError("Una plantilla recurrente necesita la fecha 'vigente desde'.")
+        if self.vigente_desde and self.vigente_hasta and self.vigente_desde > self.vigente_hasta:
+            raise ValidationError("La fecha 'vigente desde' no puede ser posterior a 'vigente hasta'.")
+
+    def calcular_lineas(self, lineas=None):
+        """
+        [(cuenta_id, debe, haber), ...] con los montos de cada línea sobre
+        monto_base. La línea de cuadre (si hay) toma la diferencia entre el
+        debe y el haber de las demás. 'lineas' permite pasar las líneas ya
+        cargadas (por defecto, self.lineas.all()).
+        """
+        lineas = list(self.lineas.all() if lineas is None else lineas)
+        debe, haber = LineaPlantilla.Lado.DEBE, LineaPlantilla.Lado.HABER
+        montos = [linea.monto(self.monto_base) for linea in lineas]
+        totales = {debe: Decimal('0.00'), haber: Decimal('0.00')}
+        for linea, monto in zip(lineas, montos):
+            if monto is not None:
+                totales[linea.lado] += monto
+
+        resultado = []
+        for linea, monto in zip(lineas, montos):
+            if monto is None:
+                otro_lado = haber if linea.lado == debe else debe
+                monto = max(totales[otro_lado] - totales[linea.lado], Decimal('0.00'))
+            if linea.lado == debe:
+                resultado.append((linea.cuenta_id, monto, Decimal('0.00')))
+            else:
+                resultado.append((linea.cuenta_id, Decimal('0.00'), monto))
+        return resultado
+
+
+class LineaPlantilla(models.Model):
+    """
+    Línea de una PlantillaAsiento: la cuenta, el lado y cómo se calcula
+    el monto a partir del monto base de la plantilla.
+    """
+    class Lado(models.TextChoices):
+        DEBE = 'DEBE', 'Debe'
+        HABER = 'HABER', 'Haber'
+
+    class Formula(models.TextChoices):
+        FIJO = 'FIJO', 'Monto fijo'
+        PORCENTAJE = 'PORCENTAJE', 'Porcentaje de la base'
+        TASA = 'TASA', 'Base más tasa de impuesto'
+        CUADRE = 'CUADRE', 'Diferencia para cuadrar'
+
+    plantilla = models.ForeignKey(PlantillaAsiento, on_delete=models.CASCADE, related_name='lineas')
+    cuenta = models.ForeignKey(
+        Cuenta,
+        on_delete=models.PROTECT,
+        limit_choices_to={'es_imputable': True, 'esta_activa': True}
+    )
+    lado = models.CharField(max_length=5, choices=Lado.choices)
+    formula = models.CharField(max_length=10, choices=Formula.choices, default=Formula.FIJO)
+    valor = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        default=0,
+        help_text="Monto (fijo), porcentaje o tasa en % (ej. 13 para el IVA). No se usa en la línea de cuadre."
+    )
+    orden = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ['plantilla', 'orden', 'pk']
+        verbose_name = "Línea de Plantilla"
+        verbose_name_plural = "Líneas de Plantilla"
+
+    def __str__(self):
+        return f"{self.cuenta.codigo} | {self.get_lado_display()} | {self.get_formula_display()} {self.valor}"
+
+    def monto(self, base):
+        """
+        Monto de la línea sobre 'base', redondeado a centavos. None para la
+        línea de cuadre (la calcula PlantillaAsiento.calcular_lineas).
+        """
+        centavo = Decimal('0.01')
+        if self.formula == self.Formula.FIJO:
+            return Decimal(self.valor).quantize(centavo, rounding=ROUND_HALF_UP)
+        if self.formula == self.Formula.PORCENTAJE:
+            return (base * self.valor / 100).quantize(centavo, rounding=ROUND_HALF_UP)
+        if self.formula == self.Formula.TASA:
+            return (base * (100 + self.valor) / 100).quantize(centavo, rounding=ROUND_HALF_UP)
+        return None
+
+
+# --- Activos fijos y depreciación ---
+
+class ClaseActivo(models.Model):
+    """
+    Clase de activo fijo (ej. Equipo de Computación): las cuentas donde se
+    registra y deprecia, y la vida útil y el método por defecto de sus activos.
+    """
+    class Metodo(models.TextChoices):
+        LINEA_RECTA = 'LINEA_RECTA', 'Línea recta'
+        SALDO_DECRECIENTE = 'SALDO_DECRECIENTE', 'Doble saldo decreciente'
+        SUMA_DIGITOS = 'SUMA_DIGITOS', 'Suma de dígitos'
+
+    nombre = models.CharField(max_length=100, unique=True)
+    cuenta_activo = models.ForeignKey(
+        Cuenta, on_delete=models.PROTECT, related_name='+',
+        limit_choices_to={'es_imputable': True},
+        help_text="Cuenta del costo del activo (ej. 152)"
+    )
+    cuenta_depreciacion = models.ForeignKey(
+        Cuenta, on_delete=models.PROTECT, related_name='+',
+        limit_choices_to={'es_imputable': True},
+        help_text="Cuenta de depreciación acumulada (ej. 154)"
+    )
+    cuenta_gasto = models.ForeignKey(
+        Cuenta, on_delete=models.PROTECT, related_name='+',
+        limit_choices_to={'es_imputable': True},
+        help_text="Cuenta del gasto por depreciación (ej. 526)"
+    )
+    vida_util_meses = models.PositiveSmallIntegerField(default=60)
+    metodo = models.CharField(max_length=20, choices=Metodo.choices, default=Metodo.LINEA_RECTA)
+
+    # 50 años: mantiene los cálculos en centavos dentro de int64 (ver depreciacion.py)
+    VIDA_UTIL_MAXIMA = 600
+
+    class Meta:
+        ordering = ['nombre']
+        verbose_name = "Clase de Activo Fijo"
+        verbose_name_plural = "Clases de Activos Fijos"
+
+    def __str__(self):
+        return self.nombre
+
+    def clean(self):
+        if not 1 <= self.vida_util_meses <= self.VIDA_UTIL_MAXIMA:
+            raise ValidationError(f"La vida útil debe estar entre 1 y {self.VIDA_UTIL_MAXIMA} meses.")
+
+
+class ActivoFijo(models.Model):
+    """
+    Activo fijo del registro de activos. La depreciación de cada mes se
+    calcula (ver contabilidad/depreciacion.py) desde el mes siguiente al de
+    adquisición hasta completar la vida útil o hasta el mes de la baja.
+    """
+    codigo = models.CharField(max_length=30, unique=True)
+    descripcion = models.CharField(max_length=200)
+    clase = models.ForeignKey(ClaseActivo, on_delete=models.PROTECT, related_name='activos')
+    fecha_adquisicion = models.DateField()
+    costo = models.DecimalField(max_digits=14, decimal_places=2)
+    valor_residual = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    vida_util_meses = models.PositiveSmallIntegerField(
+        null=True, blank=True,
+        help_text="Vacío: la de su clase"
+    )
+    metodo = models.CharField(
+        max_length=20, choices=ClaseActivo.Metodo.choices, blank=True,
+        help_text="Vacío: el de su clase"
+    )
+    fecha_baja = models.DateField(
+        null=True, blank=True,
+        help_text="Venta o retiro: no se deprecia después de este mes"
+    )
+    depreciado_hasta = models.DateField(
+        null=True, blank=True,
+        editable=False,
+        help_text="Fin del último período cuya depreciación se registró"
+    )
+
+    class Meta:
+        ordering = ['codigo']
+        verbose_name = "Activo Fijo"
+        verbose_name_plural = "Activos Fijos"
+
+    def __str__(self):
+        return f"{self.codigo} - {self.descripcion}"
+
+    def clean(self):
+        if self.costo is not None and self.costo <= 0:
+            raise ValidationError("El costo debe ser mayor que cero.")
+        if self.costo is not None and self.valor_residual is not None and not 0 <= self.valor_residual < self.costo:
+            raise ValidationError("El valor residual debe ser menor que el costo.")
+        if self.vida_util_meses is not None and not 1 <= self.vida_util_meses <= ClaseActivo.VIDA_UTIL_MAXIMA:
+            raise ValidationError(f"La vida útil debe estar entre 1 y {ClaseActivo.VIDA_UTIL_MAXIMA} meses.")
+        if self.fecha_baja and self.fecha_adquisicion and self.fecha_baja < self.fecha_adquisicion:
+            raise ValidationError("La fecha de baja no puede ser anterior a la de adquisición.")
+
+
+# --- Planillas (nómina) ---
+
+class Empleado(models.Model):
+    codigo = models.CharField(max_length=30, unique=True)
+    nombre = models.CharField(max_length=200)
+    activo = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['codigo']
+        verbose_name = "Empleado"
+        verbose_name_plural = "Empleados"
+
+    def __str__(self):
+        return f"{self.codigo} - {self.nombre}"
+
+
+class TablaDeduccion(models.Model):
+    """
+    Deducción de planilla (ej. AFP, ISSS) con sus tramos. El monto de cada
+    empleado es la cuota fija del tramo que corresponde a su salario (hasta
+    base_maxima) más el porcentaje sobre el exceso del inicio del tramo.
+    Una tasa única es un solo tramo desde 0.
+    """
+    nombre = models.CharField(max_length=50, unique=True)
+    cuenta = models.ForeignKey(
+        Cuenta, on_delete=models.PROTECT, related_name='+',
+        limit_choices_to={'es_imputable': True},
+        help_text="Cuenta por pagar de la deducción (ej. 232 AFP por Pagar)"
+    )
+    base_maxima = models.DecimalField(
+        max_digits=12, decimal_places=2, null=True, blank=True,
+        help_text="Salario máximo sobre el que se calcula (vacío: sin tope)"
+    )
+    activa = models.BooleanField(default=True)
+    orden = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ['orden', 'nombre']
+        verbose_name = "Tabla de Deducción"
+        verbose_name_plural = "Tablas de Deducciones"
+
+    def __str__(self):
+        return self.nombre
+
+
+class TramoDeduccion(models.Model):
+    """
+    Tramo de una TablaDeduccion: va desde 'desde' hasta el inicio del
+    tramo siguiente.
+    """
+    tabla = models.ForeignKey(TablaDeduccion, on_delete=models.CASCADE, related_name='tramos')
+    desde = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    porcentaje = models.DecimalField(
+        max_digits=7, decimal_places=4, default=0,
+        help_text="Porcentaje sobre el exceso de 'desde' (ej. 7.25)"
+    )
+    cuota_fija = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['tabla', 'desde']
+        unique_together = ('tabla', 'desde')
+        verbose_name = "Tramo de Deducción"
+        verbose_name_plural = "Tramos de Deducción"
+
+    def __str__(self):
+        return f"{self.tabla.nombre} desde {self.desde}: {self.cuota_fija} + {self.porcentaje}%"
+
+
+class Planilla(models.Model):
+    """
+    Planilla de un período: las líneas de pago de cada empleado y, al
+    contabilizarla (ver contabilidad/planillas.py), los asientos de
+    provisión y de pago.
+    """
+    class Estado(models.TextChoices):
+        BORRADOR = 'BORRADOR', 'Borrador'
+        CONTABILIZADA = 'CONTABILIZADA', 'Contabilizada'
+
+    nombre = models.CharField(max_length=100, help_text="Ej. Planilla quincenal 1")
+    periodo = models.ForeignKey(PeriodoContable, on_delete=models.PROTECT, related_name='planillas')
+    fecha = models.DateField(help_text="Fecha de la provisión y del pago")
+    cuenta_gasto = models.ForeignKey(
+        Cuenta, on_delete=models.PROTECT, related_name='+',
+        help_text="Gasto por sueldos (ej. 521)"
+    )
+    cuenta_por_pagar = models.ForeignKey(
+        Cuenta, on_delete=models.PROTECT, related_name='+',
+        help_text="Sueldos por pagar (ej. 231)"
+    )
+    cuenta_pago = models.ForeignKey(
+        Cuenta, on_delete=models.PROTECT, related_name='+',
+        help_text="Cuenta de la que se paga (ej. 113 Banco)"
+    )
+    estado = models.CharField(max_length=15, choices=Estado.choices, default=Estado.BORRADOR)
+    asiento_provision = models.ForeignKey(
+        AsientoDiario, null=True, blank=True, on_delete=models.SET_NULL, related_name='+', editable=False
+    )
+    asiento_pago = models.ForeignKey(
+        AsientoDiario, null=True, blank=True, on_delete=models.SET_NULL, related_name='+', editable=False
+    )
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-fecha', 'nombre']
+        unique_together = ('periodo', 'nombre')
+        verbose_name = "Planilla"
+        verbose_name_plural = "Planillas"
+
+    def __str__(self):
+        return f"{self.nombre} ({self.periodo.nombre})"
+
+
+class LineaPlanilla(models.Model):
+    """
+    Pago de un empleado en una planilla. Las deducciones y el líquido los
+    calcula planillas.calcular con las tablas vigentes.
+    """
+    planilla = models.ForeignKey(Planilla, on_delete=models.CASCADE, related_name='lineas')
+    empleado = models.ForeignKey(Empleado, on_delete=models.PROTECT, related_name='lineas_planilla')
+    salario = models.DecimalField(max_digits=12, decimal_places=2)
+    deducciones = models.JSONField(
+        default=dict, blank=True, encoder=DjangoJSONEncoder,
+        help_text="{nombre de la tabla: monto}"
+    )
+    total_deducciones = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    liquido = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['planilla', 'empleado__codigo']
+        unique_together = ('planilla', 'empleado')
+        verbose_name = "Línea de Planilla"
+        verbose_name_plural = "Líneas de Planilla"
+
+    def __str__(self):
+        return f"{self.empleado} | {self.salario}"
+
+
+# --- Datos fiscales (IVA) ---
+
+class DatoFiscalQuerySet(models.QuerySet):
+    """
+    bulk_create no llama a save(): aquí se copia el período de cada
+    movimiento (una sola consulta) antes de insertar.
+    """
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        faltantes = [d.movimiento_id for d in objs if d.periodo_id is None]
+        if faltantes:
+            periodos = dict(Movimiento.objects.filter(pk__in=faltantes).values_list('pk', 'periodo_id'))
+            for dato in objs:
+                if dato.periodo_id is None:
+                    dato.periodo_id = periodos.get(dato.movimiento_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class DatoFiscal(models.Model):
+    """
+    Datos fiscales de un movimiento de IVA (crédito fiscal en compras,
+    débito fiscal en ventas): el documento, el tercero y la base. Van en una
+    tabla aparte, con el id del movimiento como llave, porque la mayoría de
+    los movimientos no los tienen; los libros de IVA (ver libros_iva.py) se
+    generan desde aquí.
+
+    La llave hacia el movimiento no es una restricción de la base de datos:
+    con la tabla de movimientos particionada (particiones.py) su llave
+    primaria es (id, periodo_id). 'periodo' es una copia del período del
+    movimiento, para que los libros filtren por el índice de esta tabla.
+    """
+    class Libro(models.TextChoices):
+        COMPRAS = 'COMPRAS', 'Libro de Compras'
+        VENTAS = 'VENTAS', 'Libro de Ventas'
+
+    class TipoDocumento(models.TextChoices):
+        CCF = 'CCF', 'Comprobante de Crédito Fiscal'
+        FACTURA = 'FAC', 'Factura'
+        NOTA_CREDITO = 'NC', 'Nota de Crédito'
+        NOTA_DEBITO = 'ND', 'Nota de Débito'
+
+    movimiento = models.OneToOneField(
+        Movimiento, on_delete=models.CASCADE, primary_key=True, db_constraint=False,
+        related_name='dato_fiscal',
+        help_text="Línea de IVA (141 crédito fiscal / 221 débito fiscal)"
+    )
+    periodo = models.ForeignKey(
+        PeriodoContable, on_delete=models.PROTECT, related_name='+', editable=False,
+        help_text="Copia del período del movimiento"
+    )
+    libro = models.CharField(max_length=10, choices=Libro.choices)
+    tipo_documento = models.CharField(max_length=3, choices=TipoDocumento.choices, default=TipoDocumento.CCF)
+    numero_documento = models.CharField(max_length=50)
+    fecha_documento = models.DateField()
+    tercero_nit = models.CharField(max_length=20, verbose_name="NIT/NRC del tercero")
+    tercero_nombre = models.CharField(max_length=200, verbose_name="Nombre del tercero")
+    base_gravada = models.DecimalField(
+        max_digits=12, decimal_places=2,
+        help_text="Monto gravado del documento (negativo en notas de crédito)"
+    )
+    monto_exento = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    objects = DatoFiscalQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Dato Fiscal"
+        verbose_name_plural = "Datos Fiscales"
+        indexes = [
+            # Orden de los libros: período, libro, fecha y número del documento
+            models.Index(fields=['periodo', 'libro', 'fecha_documento', 'numero_documento'], name='fiscal_libro_idx'),
+            models.Index(fields=['tercero_nit', 'fecha_documento'], name='fiscal_tercero_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_documento_display()} {self.numero_documento} - {self.tercero_nombre}"
+
+    def clean(self):
+        if self.movimiento_id and self.movimiento.periodo.estado == PeriodoContable.EstadoPeriodo.CERRADO:
+            raise ValidationError(f"El período '{self.movimiento.periodo.nombre}' está cerrado. No se pueden modificar sus libros de IVA.")
+
+    def save(self, *args, **kwargs):
+        self.periodo_id = self.movimiento.periodo_id
+        super().save(*args, **kwargs)
+
+
+# --- Saldos por tercero (auxiliares) ---
+
+class SaldoTercero(models.Model):
+    """
+    Acumulado de los movimientos de un tercero en una cuenta y un período.
+    No se escribe junto con los movimientos: contabilidad/auxiliares.py lo
+    pone al día aplicando los cambios de la bitácora posteriores a su
+    posición (ConsumidorBitacora), así que ninguna escritura del libro paga
+    por mantenerlo.
+    """
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='+')
+    tercero = models.ForeignKey(Tercero, on_delete=models.CASCADE, related_name='saldos')
+    periodo = models.ForeignKey(PeriodoContable, on_delete=models.CASCADE, related_name='+')
+    debe = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    haber = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    movimientos = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Saldo por Tercero"
+        verbose_name_plural = "Saldos por Tercero"
+        constraints = [
+            models.UniqueConstraint(fields=['cuenta', 'tercero', 'periodo'], name='saldo_tercero_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['tercero', 'cuenta', 'periodo'], name='saldo_tercero_cuenta_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tercero_id} | {self.cuenta_id} | {self.periodo_id}: {self.debe} / {self.haber}"
+
+
+class ConsumidorBitacora(models.Model):
+    """
+    Posición (última secuencia aplicada) de un proceso que mantiene datos
+    derivados a partir de la bitácora de cambios.
+    """
+    nombre = models.CharField(max_length=50, unique=True)
+    secuencia = models.BigIntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Consumidor de la Bitácora"
+        verbose_name_plural = "Consumidores de la Bitácora"
+
+    def __str__(self):
+        return f"{self.nombre} (#{self.secuencia})"
+
+
+# --- Cartera (cuentas por cobrar y por pagar) ---
+
+class PartidaCartera(models.Model):
+    """
+    Partida abierta de cartera: un movimiento con tercero en una cuenta de
+    clientes o de obligaciones por pagar (ver contabilidad/cartera.py).
+    DOCUMENTO es la línea que aumenta el saldo de la cuenta (la factura) y
+    PAGO la que lo disminuye (el cobro, el pago o una nota de crédito).
+
+    Se deriva de la bitácora igual que SaldoTercero: cuenta, tercero,
+    referencia, fecha y monto son copias del movimiento. 'pendiente' es el
+    monto menos lo aplicado (AplicacionCartera); los índices parciales solo
+    guardan las partidas con saldo pendiente.
+    """
+    class Tipo(models.TextChoices):
+        DOCUMENTO = 'DOCUMENTO', 'Documento'
+        PAGO = 'PAGO', 'Pago'
+
+    # La tabla de movimientos puede estar particionada (llave primaria
+    # compuesta): sin restricción en la base de datos. Al borrar el
+    # movimiento, la partida la retira cartera.actualizar().
+    movimiento = models.OneToOneField(
+        Movimiento, on_delete=models.DO_NOTHING, primary_key=True, db_constraint=False, related_name='partida_cartera',
+    )
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='+')
+    tercero = models.ForeignKey(Tercero, on_delete=models.CASCADE, related_name='partidas_cartera')
+    tipo = models.CharField(max_length=10, choices=Tipo.choices)
+    referencia = models.CharField(max_length=40, blank=True)
+    fecha = models.DateField()
+    vencimiento = models.DateField()
+    monto = models.DecimalField(max_digits=12, decimal_places=2)
+    pendiente = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Partida de Cartera"
+        verbose_name_plural = "Partidas de Cartera"
+        indexes = [
+            # Partidas abiertas por vencimiento (antigüedad) y por tercero (conciliación)
+            models.Index(fields=['cuenta', 'tipo', 'vencimiento'], name='cartera_abierta_venc_idx', condition=Q(pendiente__gt=0)),
+            models.Index(fields=['tercero', 'cuenta', 'referencia'], name='cartera_abierta_tercero_idx', condition=Q(pendiente__gt=0)),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.referencia or self.movimiento_id} | {self.tercero_id}: {self.pendiente} de {self.monto}"
+
+
+class AplicacionCartera(models.Model):
+    """
+    Aplicación de un pago a un documento del mismo tercero y cuenta, por
+    'monto'. La crean la conciliación automática o el usuario; borrarla
+    (cartera.deshacer) devuelve el monto al pendiente de ambas partidas.
+    """
+    documento = models.ForeignKey(PartidaCartera, on_delete=models.CASCADE, related_name='aplicaciones_recibidas')
+    pago = models.ForeignKey(PartidaCartera, on_delete=models.CASCADE, related_name='aplicaciones')
+    monto = models.DecimalField(max_digits=12, decimal_places=2)
+    automatica = models.BooleanField(default=False)
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Aplicación de Cartera"
+        verbose_name_plural = "Aplicaciones de Cartera"
+
+    def __str__(self):
+        return f"{self.pago_id} -> {self.documento_id}: {self.monto}"
+
+
 # --- Nuevos Modelos Basados en tus Imágenes ---
 
 ## 💰 Modelo para Salario MOD Anual (Imagen 3)
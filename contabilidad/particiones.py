@@ -0,0 +1,270 @@
+"""
+Particionamiento nativo (PostgreSQL) de la tabla de movimientos.
+
+Cuando está habilitado, 'contabilidad_movimiento' se convierte en una tabla
+particionada por LISTA sobre 'periodo_id': cada período contable tiene su
+propia partición y una partición DEFAULT recibe los movimientos de los
+períodos que todavía no tienen la suya. Así, las consultas filtradas por
+período solo leen una partición, y las de períodos cerrados se pueden
+mover a otro tablespace (almacenamiento más económico). Desprender una
+partición es solo un paso de limpieza: se permite únicamente cuando ya está
+vacía, así que nunca saca movimientos del libro.
+
+En SQLite (desarrollo) o con el particionamiento deshabilitado, todas las
+funciones son no-op y devuelven False.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection as conexion_por_defecto, transaction
+
+TABLA = 'contabilidad_movimiento'
+TABLA_DEFAULT = f'{TABLA}_default'
+TABLA_LEGADO = f'{TABLA}_legado'
+SECUENCIA = f'{TABLA}_part_id_seq'
+
+
+def particionado_habilitado():
+    """
+    Indica si la configuración pide usar la tabla particionada.
+    """
+    return getattr(settings, 'CONTABILIDAD_PARTICIONAR_MOVIMIENTOS', False)
+
+
+def nombre_particion(periodo_id):
+    return f'{TABLA}_p{int(periodo_id)}'
+
+
+def _qn(connection, nombre):
+    return connection.ops.quote_name(nombre)
+
+
+def _existe_tabla(cursor, nombre):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [nombre])
+    return cursor.fetchone()[0]
+
+
+def _es_particion(cursor, nombre):
+    # Existe y sigue adjunta a TABLA (una partición desprendida queda como tabla suelta)
+    cursor.execute(
+        "SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE c.oid = to_regclass(%s) AND i.inhparent = to_regclass(%s)",
+        [nombre, TABLA]
+    )
+    return cursor.fetchone() is not None
+
+
+def esta_particionada(connection=None):
+    """
+    Indica si la tabla de movimientos YA es una tabla particionada.
+    """
+    connection = connection or conexion_por_defecto
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLA]
+        )
+        return cursor.fetchone() is not None
+
+
+def listar_particiones(connection=None):
+    """
+    Devuelve una lista de tuplas (nombre, límites, filas_estimadas).
+    """
+    connection = connection or conexion_por_defecto
+    if not esta_particionada(connection):
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), GREATEST(c.reltuples, 0)::bigint "
+            "FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s ORDER BY c.relname",
+            [TABLA]
+        )
+        return cursor.fetchall()
+
+
+def _recrear_restricciones(cursor, connection, restricciones):
+    """
+    Vuelve a crear sobre TABLA los índices y llaves foráneas (con el mismo
+    nombre) que tenía la tabla anterior, omitiendo la llave primaria.
+    """
+    qn = lambda nombre: _qn(connection, nombre)
+    for nombre, info in restricciones.items():
+        if info['primary_key']:
+            continue
+        columnas = ', '.join(qn(c) for c in info['columns'])
+        if info['foreign_key']:
+            tabla_ref, columna_ref = info['foreign_key']
+            cursor.execute(
+                f"ALTER TABLE {qn(TABLA)} ADD CONSTRAINT {qn(nombre)} "
+                f"FOREIGN KEY ({columnas}) REFERENCES {qn(tabla_ref)} ({qn(columna_ref)}) "
+                f"DEFERRABLE INITIALLY DEFERRED"
+            )
+        elif info['unique']:
+            # Una restricción UNIQUE sin 'periodo_id' no es válida en una tabla particionada
+            raise RuntimeError(
+                f"La restricción única '{nombre}' de {TABLA} impide el particionamiento."
+            )
+        elif info['index']:
+            cursor.execute(f"CREATE INDEX {qn(nombre)} ON {qn(TABLA)} ({columnas})")
+
+
+def convertir_a_particionada(periodo_ids, connection=None):
+    """
+    Convierte la tabla de movimientos en una tabla particionada por período.
+    Crea una partición por cada id de 'periodo_ids' más la partición DEFAULT,
+    copia los datos y recrea los índices y llaves foráneas con sus nombres.
+
+    La llave primaria pasa a ser (id, periodo_id), como exige PostgreSQL.
+    """
+    connection = connection or conexion_por_defecto
+    if connection.vendor != 'postgresql' or esta_particionada(connection):
+        return False
+
+    qn = lambda nombre: _qn(connection, nombre)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        restricciones = connection.introspection.get_constraints(cursor, TABLA)
+
+        cursor.execute(f"ALTER TABLE {qn(TABLA)} RENAME TO {qn(TABLA_LEGADO)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(TABLA)} (LIKE {qn(TABLA_LEGADO)} INCLUDING DEFAULTS) "
+            f"PARTITION BY LIST (periodo_id)"
+        )
+
+        # Las columnas IDENTITY no se admiten en tablas particionadas (PG < 17):
+        # se usa una secuencia propia que continúa desde el último id.
+        cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {qn(SECUENCIA)}")
+        cursor.execute(
+            f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {qn(TABLA_LEGADO)}), 0) + 1, false)",
+            [SECUENCIA]
+        )
+        cursor.execute(f"ALTER TABLE {qn(TABLA)} ALTER COLUMN id SET DEFAULT nextval('{SECUENCIA}')")
+        cursor.execute(f"ALTER SEQUENCE {qn(SECUENCIA)} OWNED BY {qn(TABLA)}.id")
+
+        cursor.execute(f"CREATE TABLE {qn(TABLA_DEFAULT)} PARTITION OF {qn(TABLA)} DEFAULT")
+        for periodo_id in periodo_ids:
+            cursor.execute(
+                f"CREATE TABLE {qn(nombre_particion(periodo_id))} PARTITION OF {qn(TABLA)} "
+                f"FOR VALUES IN ({int(periodo_id)})"
+            )
+
+        cursor.execute(f"INSERT INTO {qn(TABLA)} SELECT * FROM {qn(TABLA_LEGADO)}")
+        cursor.execute(f"DROP TABLE {qn(TABLA_LEGADO)}")
+
+        cursor.execute(f"ALTER TABLE {qn(TABLA)} ADD CONSTRAINT {qn(TABLA + '_pkey')} PRIMARY KEY (id, periodo_id)")
+        _recrear_restricciones(cursor, connection, restricciones)
+    return True
+
+
+def revertir_particionado(connection=None):
+    """
+    Operación inversa de convertir_a_particionada: deja una tabla normal con
+    llave primaria (id) y los mismos índices y llaves foráneas.
+    """
+    connection = connection or conexion_por_defecto
+    if not esta_particionada(connection):
+        return False
+
+    qn = lambda nombre: _qn(connection, nombre)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        restricciones = connection.introspection.get_constraints(cursor, TABLA)
+
+        cursor.execute(f"ALTER TABLE {qn(TABLA)} RENAME TO {qn(TABLA_LEGADO)}")
+        cursor.execute(f"CREATE TABLE {qn(TABLA)} (LIKE {qn(TABLA_LEGADO)} INCLUDING DEFAULTS)")
+        # Reasignar la secuencia antes de borrar la tabla anterior (si no, se borraría con ella)
+        cursor.execute(f"ALTER SEQUENCE {qn(SECUENCIA)} OWNED BY {qn(TABLA)}.id")
+
+        cursor.execute(f"INSERT INTO {qn(TABLA)} SELECT * FROM {qn(TABLA_LEGADO)}")
+        # Borrar la tabla particionada borra también todas sus particiones
+        cursor.execute(f"DROP TABLE {qn(TABLA_LEGADO)}")
+
+        cursor.execute(f"ALTER TABLE {qn(TABLA)} ADD CONSTRAINT {qn(TABLA + '_pkey')} PRIMARY KEY (id)")
+        _recrear_restricciones(cursor, connection, restricciones)
+    return True
+
+
+def asegurar_particion(periodo, connection=None):
+    """
+    Crea la partición de un período si la tabla está particionada y aún no
+    existe. Los movimientos del período que ya estuvieran en la partición
+    DEFAULT se trasladan a la nueva partición antes de adjuntarla.
+    """
+    connection = connection or conexion_por_defecto
+    if not esta_particionada(connection):
+        return False
+
+    qn = lambda nombre: _qn(connection, nombre)
+    nombre = nombre_particion(periodo.pk)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if _existe_tabla(cursor, nombre):
+            return False
+        cursor.execute(f"CREATE TABLE {qn(nombre)} (LIKE {qn(TABLA)} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH movidos AS (DELETE FROM {qn(TABLA_DEFAULT)} WHERE periodo_id = %s RETURNING *) "
+            f"INSERT INTO {qn(nombre)} SELECT * FROM movidos",
+            [periodo.pk]
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(TABLA)} ATTACH PARTITION {qn(nombre)} FOR VALUES IN ({int(periodo.pk)})"
+        )
+    return True
+
+
+def desprender_particion(periodo, connection=None):
+    """
+    Desprende la partición vacía de un período cerrado: la tabla queda
+    suelta, fuera de la tabla de movimientos, para borrarla o guardarla
+    aparte. Es solo limpieza del catálogo de particiones; los movimientos
+    de un período no se sacan del libro por esta vía.
+
+    Lanza ValidationError si el período está abierto o si su partición
+    todavía tiene movimientos.
+    """
+    from .models import Movimiento, PeriodoContable
+
+    connection = connection or conexion_por_defecto
+    if not esta_particionada(connection):
+        return False
+
+    qn = lambda nombre: _qn(connection, nombre)
+    nombre = nombre_particion(periodo.pk)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if not _es_particion(cursor, nombre):
+            return False
+        if periodo.estado != PeriodoContable.EstadoPeriodo.CERRADO:
+            raise ValidationError(
+                f"El período '{periodo.nombre}' está abierto. Solo se desprenden particiones de períodos cerrados."
+            )
+        if Movimiento.objects.filter(periodo=periodo).exists():
+            raise ValidationError(
+                f"La partición de '{periodo.nombre}' todavía tiene movimientos. Solo se desprenden particiones vacías."
+            )
+        cursor.execute(f"ALTER TABLE {qn(TABLA)} DETACH PARTITION {qn(nombre)}")
+    return True
+
+
+def mover_particion(periodo, tablespace, connection=None):
+    """
+    Mueve la partición de un período (tabla e índices) a otro tablespace,
+    por ejemplo uno en almacenamiento más económico.
+    """
+    connection = connection or conexion_por_defecto
+    if not esta_particionada(connection):
+        return False
+
+    qn = lambda nombre: _qn(connection, nombre)
+    nombre = nombre_particion(periodo.pk)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if not _existe_tabla(cursor, nombre):
+            return False
+        cursor.execute(f"ALTER TABLE {qn(nombre)} SET TABLESPACE {qn(tablespace)}")
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [nombre])
+        for (indice,) in cursor.fetchall():
+            cursor.execute(f"ALTER INDEX {qn(indice)} SET TABLESPACE {qn(tablespace)}")
+    return True
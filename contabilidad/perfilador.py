@@ -0,0 +1,204 @@
+"""
+Perfilado bajo demanda de solicitudes y comandos de administración.
+
+Un superusuario perfila una solicitud agregando ?perfilar=1 (o la cabecera
+X-Perfilar: 1). Con el valor 'muestreo' se toman muestras de la pila en lugar
+de usar cProfile. Un comando se perfila con --profile (o --profile=muestreo):
+    python manage.py archivar_periodos --hasta 2024-12-31 --profile
+
+Cada ejecución deja un archivo en CONTABILIDAD_PERFILES_DIR:
+  - .prof    estadísticas de cProfile (pstats, snakeviz, etc.)
+  - .folded  pilas colapsadas "f1;f2;f3 N" (flamegraph.pl, speedscope)
+La página de administración 'perfiles' los lista, resume y descarga.
+
+cProfile mide todas las llamadas y agrega bastante costo; el muestreo cada
+INTERVALO_MUESTREO segundos agrega poco y sirve para medir en condiciones
+parecidas a producción.
+"""
+import cProfile
+import io
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+MODOS = ('cprofile', 'muestreo')
+EXTENSIONES = {'cprofile': '.prof', 'muestreo': '.folded'}
+INTERVALO_MUESTREO = 0.005
+LINEAS_RESUMEN = 40
+
+_NOMBRE_VALIDO = re.compile(r'^[\w.-]+\.(prof|folded)$')
+
+
+def directorio_base():
+    return Path(getattr(settings, 'CONTABILIDAD_PERFILES_DIR', Path(settings.BASE_DIR) / 'perfiles'))
+
+
+def modo_solicitado(valor):
+    """
+    Traduce el valor del parámetro o la cabecera al modo de perfilado
+    ('1', 'true' o '' usan cProfile).
+    """
+    valor = (valor or '').strip().lower()
+    return valor if valor in MODOS else 'cprofile'
+
+
+class Muestreador(threading.Thread):
+    """
+    Hilo que toma la pila del hilo perfilado cada 'intervalo' segundos y
+    cuenta cada pila colapsada (raíz primero).
+    """
+
+    def __init__(self, hilo_id, intervalo=INTERVALO_MUESTREO):
+        super().__init__(daemon=True)
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            marco = sys._current_frames().get(self.hilo_id)
+            pila = []
+            while marco is not None:
+                codigo = marco.f_code
+                pila.append(f"{codigo.co_name} ({Path(codigo.co_filename).name}:{codigo.co_firstlineno})")
+                marco = marco.f_back
+            if pila:
+                self.pilas[';'.join(reversed(pila))] += 1
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+
+
+def _nombre_archivo(etiqueta, modo):
+    limpia = re.sub(r'[^\w.-]+', '_', etiqueta).strip('_')[:80] or 'perfil'
+    return f"{timezone.now():%Y%m%d-%H%M%S}-{limpia}-{uuid.uuid4().hex[:6]}{EXTENSIONES[modo]}"
+
+
+@contextmanager
+def perfilar(etiqueta, modo='cprofile'):
+    """
+    Perfila el bloque y guarda el resultado. Entrega un diccionario en el
+    que, al salir, quedan 'archivo' (ruta) y 'segundos'.
+    """
+    if modo not in MODOS:
+        raise ValueError(f"Modo de perfilado no válido: {modo}.")
+    resultado = {}
+    directorio = directorio_base()
+    directorio.mkdir(parents=True, exist_ok=True)
+    ruta = directorio / _nombre_archivo(etiqueta, modo)
+
+    inicio = time.perf_counter()
+    if modo == 'cprofile':
+        perfil = cProfile.Profile()
+        perfil.enable()
+        try:
+            yield resultado
+        finally:
+            perfil.disable()
+            perfil.dump_stats(ruta)
+    else:
+        muestreador = Muestreador(threading.get_ident())
+        muestreador.start()
+        try:
+            yield resultado
+        finally:
+            muestreador.detener()
+            with open(ruta, 'w', encoding='utf-8') as f:
+                f.writelines(f"{pila} {veces}\n" for pila, veces in muestreador.pilas.most_common())
+    resultado.update(archivo=ruta, segundos=time.perf_counter() - inicio)
+
+
+# --- Consulta de perfiles guardados ---
+
+def listar():
+    """
+    Perfiles guardados, del más reciente al más antiguo.
+    """
+    directorio = directorio_base()
+    if not directorio.is_dir():
+        return []
+    perfiles = []
+    for ruta in directorio.iterdir():
+        if _NOMBRE_VALIDO.match(ruta.name):
+            estado = ruta.stat()
+            perfiles.append({
+                'nombre': ruta.name,
+                'modo': 'cprofile' if ruta.suffix == '.prof' else 'muestreo',
+                'bytes': estado.st_size,
+                'fecha': datetime.fromtimestamp(estado.st_mtime, tz=timezone.get_current_timezone()),
+            })
+    return sorted(perfiles, key=lambda p: p['fecha'], reverse=True)
+
+
+def ruta(nombre):
+    """
+    Ruta del perfil 'nombre' dentro del directorio de perfiles. Lanza
+    FileNotFoundError si el nombre no es válido o no existe.
+    """
+    if not _NOMBRE_VALIDO.match(nombre) or not (directorio_base() / nombre).is_file():
+        raise FileNotFoundError(nombre)
+    return directorio_base() / nombre
+
+
+def resumen(nombre, orden='cumulative', lineas=LINEAS_RESUMEN):
+    """
+    Texto con lo más costoso del perfil: la tabla de pstats ordenada por
+    'orden' (cProfile) o las funciones con más muestras, propias y
+    acumuladas (muestreo).
+    """
+    archivo = ruta(nombre)
+    if archivo.suffix == '.prof':
+        salida = io.StringIO()
+        pstats.Stats(str(archivo), stream=salida).strip_dirs().sort_stats(orden).print_stats(lineas)
+        return salida.getvalue()
+
+    propias, acumuladas, total = Counter(), Counter(), 0
+    with open(archivo, encoding='utf-8') as f:
+        for linea in f:
+            pila, _, veces = linea.rstrip('\n').rpartition(' ')
+            marcos = pila.split(';')
+            veces = int(veces)
+            total += veces
+            propias[marcos[-1]] += veces
+            for marco in set(marcos):
+                acumuladas[marco] += veces
+    texto = [f"{total} muestras cada {INTERVALO_MUESTREO * 1000:g} ms", '', 'Acumuladas:']
+    texto += [f"{veces:8d} {veces / total:6.1%}  {marco}" for marco, veces in acumuladas.most_common(lineas)]
+    texto += ['', 'Propias:']
+    texto += [f"{veces:8d} {veces / total:6.1%}  {marco}" for marco, veces in propias.most_common(lineas)]
+    return '\n'.join(texto)
+
+
+# --- Middleware ---
+
+class PerfiladorMiddleware:
+    """
+    Perfila la solicitud si la pide un superusuario con ?perfilar= o la
+    cabecera X-Perfilar. El nombre del perfil vuelve en la cabecera X-Perfil.
+    Va después de AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pedido = request.GET.get('perfilar', request.headers.get('X-Perfilar'))
+        if pedido is None or not request.user.is_superuser:
+            return self.get_response(request)
+
+        with perfilar(f"{request.method}-{request.path}", modo_solicitado(pedido)) as resultado:
+            respuesta = self.get_response(request)
+        respuesta['X-Perfil'] = resultado['archivo'].name
+        return respuesta
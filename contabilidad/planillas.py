@@ -0,0 +1,320 @@
+"""
+Planillas: importación de las líneas de pago, cálculo de deducciones y
+contabilización.
+
+importar() reemplaza las líneas de una planilla con filas (código, nombre,
+salario), por ejemplo leídas de un CSV, creando en bloque los empleados que
+no existen.
+
+calcular() aplica todas las tablas de deducción activas a todos los
+empleados a la vez: los salarios se cargan como centavos int64 y, por cada
+tabla, np.searchsorted ubica el tramo de cada salario; el monto es la cuota
+fija más el porcentaje sobre el exceso, en aritmética entera.
+
+contabilizar() valida la planilla completa y, en una sola transacción,
+guarda las deducciones de cada línea y registra dos asientos:
+  - provisión: el gasto al debe; cada deducción y el líquido por pagar al haber,
+  - pago: el líquido por pagar al debe y la cuenta de pago al haber.
+Las líneas se agregan por cuenta; con por_empleado, sueldos por pagar lleva
+una línea por empleado en ambos asientos, con el empleado como tercero
+(los terceros de tipo empleado que faltan se crean en bloque) y la planilla
+como referencia, así la cartera concilia cada pago con su provisión.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+from .ledger import a_centavos, a_decimal
+from .models import (
+    AsientoDiario, CambioLibro, Cuenta, Empleado, LineaPlanilla, Movimiento,
+    PeriodoContable, Planilla, TablaDeduccion, Tercero,
+)
+
+# Porcentajes en diezmilésimas (7.25 % -> 72500): monto = exceso * p / 1_000_000
+ESCALA_PORCENTAJE = 10_000
+DIVISOR_MONTO = 100 * ESCALA_PORCENTAJE
+
+
+# --- Importación ---
+
+@transaction.atomic
+def importar(planilla, filas):
+    """
+    Reemplaza las líneas de la planilla (en borrador) por 'filas', una
+    secuencia de (código, nombre, salario). Los empleados se buscan por
+    código y los nuevos se crean con el nombre indicado. Devuelve la
+    cantidad de empleados creados.
+    """
+    if planilla.estado == Planilla.Estado.CONTABILIZADA:
+        raise ValidationError(f"La planilla '{planilla.nombre}' ya está contabilizada.")
+
+    salarios, nombres, errores = {}, {}, []
+    for numero, (codigo, nombre, salario) in enumerate(filas, start=1):
+        codigo = (codigo or '').strip()
+        if not codigo:
+            errores.append(f"fila {numero}: sin código de empleado")
+            continue
+        if codigo in salarios:
+            errores.append(f"fila {numero}: el empleado {codigo} está repetido")
+            continue
+        try:
+            salarios[codigo] = Decimal(str(salario).strip()).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            errores.append(f"fila {numero}: salario no válido ({salario})")
+            continue
+        nombres[codigo] = (nombre or '').strip() or codigo
+    if errores:
+        raise ValidationError([f"No se importó la planilla: {e}." for e in errores[:20]])
+
+    empleados = dict(Empleado.objects.filter(codigo__in=list(salarios)).values_list('codigo', 'pk'))
+    nuevos = Empleado.objects.bulk_create([
+        Empleado(codigo=codigo, nombre=nombres[codigo]) for codigo in salarios if codigo not in empleados
+    ])
+    empleados.update((e.codigo, e.pk) for e in nuevos)
+
+    planilla.lineas.all().delete()
+    LineaPlanilla.objects.bulk_create([
+        LineaPlanilla(planilla=planilla, empleado_id=empleados[codigo], salario=salario)
+        for codigo, salario in salarios.items()
+    ], batch_size=2000)
+    return len(nuevos)
+
+
+# --- Cálculo vectorizado ---
+
+def deduccion(tabla, salario):
+    """
+    Monto (centavos) de la deducción 'tabla' para cada salario del arreglo
+    'salario' (centavos).
+    """
+    tramos = sorted(tabla.tramos.all(), key=lambda t: t.desde)
+    if not tramos:
+        return np.zeros(len(salario), dtype=np.int64)
+    desde = np.asarray([a_centavos(t.desde) for t in tramos], dtype=np.int64)
+    porcentaje = np.asarray([int((t.porcentaje * ESCALA_PORCENTAJE).to_integral_value()) for t in tramos], dtype=np.int64)
+    cuota_fija = np.asarray([a_centavos(t.cuota_fija) for t in tramos], dtype=np.int64)
+
+    base = salario if tabla.base_maxima is None else np.minimum(salario, a_centavos(tabla.base_maxima))
+    tramo = np.searchsorted(desde, base, side='right') - 1
+    en_tabla = tramo >= 0  # un salario menor que el primer tramo no paga
+    tramo = np.maximum(tramo, 0)
+    # Redondeo al centavo, mitad hacia arriba (los montos no son negativos)
+    monto = cuota_fija[tramo] + ((base - desde[tramo]) * porcentaje[tramo] + DIVISOR_MONTO // 2) // DIVISOR_MONTO
+    return np.where(en_tabla, monto, 0)
+
+
+@dataclass
+class CalculoPlanilla:
+    planilla: Planilla
+    linea_id: np.ndarray
+    empleado_id: np.ndarray
+    salario: np.ndarray                                # centavos
+    deducciones: dict = field(default_factory=dict)    # TablaDeduccion -> centavos por línea
+
+    @property
+    def total_deducciones(self):
+        total = np.zeros(len(self.salario), dtype=np.int64)
+        for montos in self.deducciones.values():
+            total += montos
+        return total
+
+    @property
+    def liquido(self):
+        return self.salario - self.total_deducciones
+
+
+def calcular(planilla):
+    """
+    Deducciones de todas las líneas de la planilla con las tablas activas.
+    """
+    filas = list(planilla.lineas.annotate(
+        salario_centavos=Cast(Round(F('salario') * 100), BigIntegerField()),
+    ).values_list('pk', 'empleado_id', 'salario_centavos').order_by('pk'))
+    linea_id, empleado_id, salario = (
+        (np.asarray(columna, dtype=np.int64) for columna in zip(*filas)) if filas
+        else (np.zeros(0, dtype=np.int64) for _ in range(3))
+    )
+    calculo = CalculoPlanilla(planilla, linea_id, empleado_id, salario)
+    for tabla in TablaDeduccion.objects.filter(activa=True).prefetch_related('tramos'):
+        calculo.deducciones[tabla] = deduccion(tabla, salario)
+    return calculo
+
+
+def guardar(calculo):
+    """
+    Escribe en cada línea sus deducciones, el total y el líquido.
+
+    Las líneas no tienen dependientes: se reescriben con sus mismos ids
+    (DELETE + bulk_create), que es mucho más rápido que un bulk_update con
+    un CASE por fila.
+    """
+    total, liquido = calculo.total_deducciones.tolist(), calculo.liquido.tolist()
+    montos = {tabla.nombre: m.tolist() for tabla, m in calculo.deducciones.items()}
+    nuevas = [
+        LineaPlanilla(
+            pk=pk,
+            planilla_id=calculo.planilla.pk,
+            empleado_id=empleado_id,
+            salario=a_decimal(salario),
+            deducciones={nombre: str(a_decimal(m[i])) for nombre, m in montos.items()},
+            total_deducciones=a_decimal(total[i]),
+            liquido=a_decimal(liquido[i]),
+        )
+        for i, (pk, empleado_id, salario) in enumerate(zip(
+            calculo.linea_id.tolist(), calculo.empleado_id.tolist(), calculo.salario.tolist()
+        ))
+    ]
+    with transaction.atomic():
+        LineaPlanilla.objects.filter(pk__in=calculo.linea_id.tolist()).delete()
+        LineaPlanilla.objects.bulk_create(nuevas, batch_size=2000)
+
+
+# --- Contabilización ---
+
+@dataclass
+class ResultadoPlanilla:
+    planilla: Planilla
+    empleados: int
+    total_salarios: Decimal
+    total_liquido: Decimal
+    deducciones: dict  # nombre de la tabla -> monto
+
+
+def _validar(planilla, calculo):
+    errores = []
+    if planilla.estado == Planilla.Estado.CONTABILIZADA:
+        errores.append(f"La planilla '{planilla.nombre}' ya está contabilizada.")
+    if planilla.periodo.estado == PeriodoContable.EstadoPeriodo.CERRADO:
+        errores.append(f"El período '{planilla.periodo.nombre}' está cerrado. No se pueden registrar transacciones.")
+    if not planilla.periodo.fecha_inicio <= planilla.fecha <= planilla.periodo.fecha_fin:
+        errores.append(f"La fecha {planilla.fecha} está fuera del rango del período '{planilla.periodo.nombre}'.")
+    if not len(calculo.salario):
+        errores.append(f"La planilla '{planilla.nombre}' no tiene líneas.")
+
+    codigos = None
+    for problema, filas in (
+        ("salario menor o igual a cero", calculo.salario <= 0),
+        ("deducciones mayores que el salario", calculo.liquido < 0),
+    ):
+        if filas.any():
+            if codigos is None:
+                codigos = dict(Empleado.objects.filter(pk__in=calculo.empleado_id.tolist()).values_list('pk', 'codigo'))
+            afectados = [codigos[e] for e in calculo.empleado_id[filas][:10].tolist()]
+            errores.append(f"{int(filas.sum())} empleado(s) con {problema} (ej. {', '.join(afectados)}).")
+
+    cuentas = {planilla.cuenta_gasto_id, planilla.cuenta_por_pagar_id, planilla.cuenta_pago_id}
+    cuentas |= {tabla.cuenta_id for tabla in calculo.deducciones}
+    validas = set(Cuenta.objects.filter(pk__in=cuentas, es_imputable=True, esta_activa=True).values_list('pk', flat=True))
+    if cuentas - validas:
+        nombres = Cuenta.objects.filter(pk__in=cuentas - validas).values_list('codigo', flat=True)
+        errores.append(f"Las cuentas {', '.join(sorted(nombres))} no son imputables o están inactivas.")
+    if errores:
+        raise ValidationError(errores)
+
+
+def _terceros(empleado_ids):
+    """
+    Tercero (tipo empleado, mismo código) de cada empleado: {empleado_id:
+    tercero_id}. Crea en bloque los que faltan; un código que ya es de un
+    cliente o proveedor es un error.
+    """
+    empleados, nombres = {}, {}
+    for pk, codigo, nombre in Empleado.objects.filter(pk__in=empleado_ids).values_list('pk', 'codigo', 'nombre'):
+        empleados[codigo], nombres[codigo] = pk, nombre
+    existentes = {t.codigo: t for t in Tercero.objects.filter(codigo__in=list(empleados))}
+    ajenos = sorted(c for c, t in existentes.items() if t.tipo != Tercero.Tipo.EMPLEADO)
+    if ajenos:
+        raise ValidationError(
+            f"Los códigos {', '.join(ajenos[:10])} ya pertenecen a terceros que no son empleados."
+        )
+    nuevos = Tercero.objects.bulk_create([
+        Tercero(tipo=Tercero.Tipo.EMPLEADO, codigo=codigo, nombre=nombres[codigo])
+        for codigo in empleados if codigo not in existentes
+    ], batch_size=2000)
+    existentes.update((t.codigo, t) for t in nuevos)
+    return {pk: existentes[codigo].pk for codigo, pk in empleados.items()}
+
+
+def _movimientos(asiento, lineas, referencia=''):
+    # 'referencia' va solo en las líneas con tercero
+    return [
+        Movimiento(
+            asiento=asiento, cuenta_id=cuenta_id, tercero_id=tercero_id, referencia=referencia if tercero_id else '',
+            debe=a_decimal(debe), haber=a_decimal(haber),
+        )
+        for cuenta_id, debe, haber, tercero_id in lineas if debe or haber
+    ]
+
+
+@transaction.atomic
+def contabilizar(planilla, por_empleado=False, usuario=None, simular=False):
+    """
+    Calcula las deducciones, las guarda en las líneas y registra los
+    asientos de provisión y de pago de la planilla. Lanza ValidationError
+    (sin escribir nada) si la planilla ya está contabilizada, si el período
+    está cerrado o si alguna línea o cuenta no es válida. Con 'simular' todo
+    se escribe y al final se revierte.
+    """
+    # Mismo orden que el registro y el cierre: candado del libro y luego el estado real
+    CambioLibro.bloquear_escrituras()
+    planilla = Planilla.objects.select_related('periodo').get(pk=planilla.pk)
+    calculo = calcular(planilla)
+    _validar(planilla, calculo)
+    guardar(calculo)
+
+    total_salarios = int(calculo.salario.sum())
+    liquido = calculo.liquido
+    total_liquido = int(liquido.sum())
+    por_cuenta = {}
+    for tabla, montos in calculo.deducciones.items():
+        por_cuenta[tabla.cuenta_id] = por_cuenta.get(tabla.cuenta_id, 0) + int(montos.sum())
+
+    if por_empleado:
+        terceros = _terceros(calculo.empleado_id.tolist())
+        por_pagar = [
+            (planilla.cuenta_por_pagar_id, monto, terceros[empleado_id])
+            for empleado_id, monto in zip(calculo.empleado_id.tolist(), liquido.tolist())
+        ]
+    else:
+        por_pagar = [(planilla.cuenta_por_pagar_id, total_liquido, None)]
+
+    provision = AsientoDiario(
+        periodo=planilla.periodo, fecha=planilla.fecha, creado_por=usuario,
+        descripcion=f"Provisión de {planilla.nombre} ({len(liquido)} empleados)",
+    )
+    provision.save()
+    pago = AsientoDiario(
+        periodo=planilla.periodo, fecha=planilla.fecha, creado_por=usuario,
+        descripcion=f"Pago de {planilla.nombre} ({len(liquido)} empleados)",
+    )
+    pago.save()
+
+    referencia = f"PLANILLA-{planilla.pk}"
+    movimientos = _movimientos(provision, [
+        (planilla.cuenta_gasto_id, total_salarios, 0, None),
+        *((cuenta_id, 0, monto, None) for cuenta_id, monto in por_cuenta.items()),
+        *((cuenta_id, 0, monto, tercero_id) for cuenta_id, monto, tercero_id in por_pagar),
+    ], referencia)
+    movimientos += _movimientos(pago, [
+        *((cuenta_id, monto, 0, tercero_id) for cuenta_id, monto, tercero_id in por_pagar),
+        (planilla.cuenta_pago_id, 0, total_liquido, None),
+    ], referencia)
+    Movimiento.objects.bulk_create(movimientos, batch_size=5000)
+
+    planilla.estado = Planilla.Estado.CONTABILIZADA
+    planilla.asiento_provision, planilla.asiento_pago = provision, pago
+    planilla.save(update_fields=['estado', 'asiento_provision', 'asiento_pago'])
+    if simular:
+        transaction.set_rollback(True)
+    return ResultadoPlanilla(
+        planilla=planilla,
+        empleados=len(liquido),
+        total_salarios=a_decimal(total_salarios),
+        total_liquido=a_decimal(total_liquido),
+        deducciones={tabla.nombre: a_decimal(m.sum()) for tabla, m in calculo.deducciones.items()},
+    )
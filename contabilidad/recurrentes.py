@@ -0,0 +1,169 @@
+"""
+Generación en lote de los asientos de las plantillas recurrentes.
+
+Una plantilla recurrente (PlantillaAsiento con recurrente=True) vence el
+'dia' de cada mes que corresponde a su frecuencia, contando desde
+vigente_desde y hasta vigente_hasta. generar() crea en una sola transacción
+los asientos de todas las ocurrencias que vencen en los períodos indicados
+y que son posteriores a generada_hasta de cada plantilla:
+  - las cuentas de todas las plantillas se validan en una sola consulta,
+  - los montos de cada plantilla se calculan una vez (no dependen de la fecha),
+  - los números de partida se asignan en bloque con el candado del libro,
+  - asientos y movimientos se insertan con bulk_create.
+Así, los devengos mensuales de cientos de contratos son una sola ejecución
+de generar_recurrentes en lugar de cientos de registros manuales.
+"""
+from calendar import monthrange
+from dataclasses import dataclass, field
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max
+
+from .models import AsientoDiario, CambioLibro, Cuenta, Movimiento, PeriodoContable, PlantillaAsiento
+
+
+@dataclass
+class ResultadoGeneracion:
+    asientos: list = field(default_factory=list)
+    movimientos: int = 0
+    por_plantilla: dict = field(default_factory=dict)  # nombre -> asientos generados
+    omitidas: dict = field(default_factory=dict)       # nombre -> motivo
+
+
+def _sumar_meses(fecha, meses):
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    return indice // 12, indice % 12 + 1
+
+
+def vencimientos(plantilla, desde, hasta):
+    """
+    Fechas en [desde, hasta] en que vence la plantilla, sin las que ya se
+    generaron (hasta generada_hasta inclusive).
+    """
+    if not plantilla.vigente_desde:
+        return []
+    desde = max(desde, plantilla.vigente_desde)
+    if plantilla.vigente_hasta:
+        hasta = min(hasta, plantilla.vigente_hasta)
+    if plantilla.generada_hasta and plantilla.generada_hasta >= desde:
+        desde = date.fromordinal(plantilla.generada_hasta.toordinal() + 1)
+
+    paso = PlantillaAsiento.MESES_FRECUENCIA[plantilla.frecuencia]
+    fechas = []
+    n = 0
+    while True:
+        anio, mes = _sumar_meses(plantilla.vigente_desde, n * paso)
+        fecha = date(anio, mes, min(plantilla.dia, monthrange(anio, mes)[1]))
+        if fecha > hasta:
+            return fechas
+        if fecha >= desde:
+            fechas.append(fecha)
+        n += 1
+
+
+def _lineas_validas(plantilla, cuentas_validas):
+    """
+    Las líneas calculadas de la plantilla, o el motivo por el que no se
+    puede generar.
+    """
+    lineas = plantilla.calcular_lineas()
+    if len(lineas) < 2:
+        return None, "tiene menos de dos líneas"
+    if any(cuenta_id not in cuentas_validas for cuenta_id, _, _ in lineas):
+        return None, "una de sus cuentas no es imputable o está inactiva"
+    total_debe = sum(debe for _, debe, _ in lineas)
+    total_haber = sum(haber for _, _, haber in lineas)
+    if total_debe != total_haber:
+        return None, f"está descuadrada (Debe: {total_debe}, Haber: {total_haber})"
+    if total_debe == 0:
+        return None, "sus montos suman 0.00"
+    return lineas, None
+
+
+@transaction.atomic
+def generar(periodos=None, plantillas=None, usuario=None, simular=False):
+    """
+    Genera los asientos de las plantillas recurrentes activas ('plantillas'
+    las limita) que vencen en 'periodos' (por defecto, todos los abiertos)
+    y avanza generada_hasta de cada plantilla.
+
+    Las plantillas con cuentas no válidas o montos descuadrados se omiten
+    (ver ResultadoGeneracion.omitidas). Lanza ValidationError si uno de los
+    períodos está cerrado. Con 'simular' todo se escribe y al final se
+    revierte: el resultado muestra los números y montos que se usarían.
+    """
+    # Mismo orden que el registro y el cierre: candado del libro y luego el estado real
+    CambioLibro.bloquear_escrituras()
+    if periodos is None:
+        periodos = PeriodoContable.objects.filter(estado=PeriodoContable.EstadoPeriodo.ABIERTO)
+    else:
+        periodos = PeriodoContable.objects.filter(pk__in=[p.pk for p in periodos])
+    periodos = list(periodos.order_by('fecha_inicio'))
+    for periodo in periodos:
+        if periodo.estado == PeriodoContable.EstadoPeriodo.CERRADO:
+            raise ValidationError(f"El período '{periodo.nombre}' está cerrado. No se pueden registrar transacciones.")
+
+    seleccion = PlantillaAsiento.objects.filter(activa=True, recurrente=True)
+    if plantillas is not None:
+        seleccion = seleccion.filter(pk__in=[p.pk for p in plantillas])
+    seleccion = list(seleccion.prefetch_related('lineas'))
+
+    # Todas las cuentas de todas las plantillas, en una sola consulta
+    cuentas_validas = set(Cuenta.objects.filter(
+        pk__in={linea.cuenta_id for p in seleccion for linea in p.lineas.all()},
+        es_imputable=True, esta_activa=True,
+    ).values_list('pk', flat=True))
+
+    resultado = ResultadoGeneracion()
+    calculadas = []
+    for plantilla in seleccion:
+        lineas, motivo = _lineas_validas(plantilla, cuentas_validas)
+        if motivo:
+            resultado.omitidas[plantilla.nombre] = motivo
+        else:
+            calculadas.append((plantilla, lineas))
+
+    generada_hasta = {}
+    for periodo in periodos:
+        pendientes = sorted(
+            (fecha, plantilla.nombre, plantilla, lineas)
+            for plantilla, lineas in calculadas
+            for fecha in vencimientos(plantilla, periodo.fecha_inicio, periodo.fecha_fin)
+        )
+        if not pendientes:
+            continue
+        # bulk_create no numera: los números se asignan aquí, con el candado tomado
+        siguiente = (AsientoDiario.objects.filter(periodo=periodo).aggregate(m=Max('numero_partida'))['m'] or 0) + 1
+        asientos = AsientoDiario.objects.bulk_create([
+            AsientoDiario(
+                periodo=periodo,
+                numero_partida=siguiente + k,
+                fecha=fecha,
+                descripcion=plantilla.descripcion or plantilla.nombre,
+                creado_por=usuario,
+                es_ajuste=plantilla.es_ajuste,
+            )
+            for k, (fecha, _, plantilla, _) in enumerate(pendientes)
+        ])
+        movimientos = [
+            Movimiento(asiento=asiento, cuenta_id=cuenta_id, debe=debe, haber=haber)
+            for asiento, (_, _, _, lineas) in zip(asientos, pendientes)
+            for cuenta_id, debe, haber in lineas
+        ]
+        Movimiento.objects.bulk_create(movimientos, batch_size=5000)
+
+        for asiento, (fecha, nombre, plantilla, _) in zip(asientos, pendientes):
+            resultado.por_plantilla[nombre] = resultado.por_plantilla.get(nombre, 0) + 1
+            generada_hasta[plantilla.pk] = max(fecha, generada_hasta.get(plantilla.pk, fecha))
+        resultado.asientos += asientos
+        resultado.movimientos += len(movimientos)
+
+    actualizadas = [plantilla for plantilla, _ in calculadas if plantilla.pk in generada_hasta]
+    for plantilla in actualizadas:
+        plantilla.generada_hasta = generada_hasta[plantilla.pk]
+    PlantillaAsiento.objects.bulk_update(actualizadas, ['generada_hasta'])
+    if simular:
+        transaction.set_rollback(True)
+    return resultado
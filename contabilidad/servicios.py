@@ -0,0 +1,296 @@
+"""
+Operaciones sobre asientos que tocan varias filas a la vez.
+
+editar_asiento aplica una edición como diferencia: compara las líneas
+nuevas con las guardadas y escribe solo las altas, los cambios y las bajas,
+cada una con su entrada en la bitácora. Los saldos de este sistema se
+calculan desde los movimientos y la bitácora: con solo las líneas que
+cambiaron escritas, quien sigue la bitácora ajusta sus saldos por la
+diferencia exacta de cada línea, y editar una línea de una planilla de 200
+cuesta lo que esa línea.
+
+revertir_asientos crea en un período abierto el asiento espejo de cada
+asiento indicado, con números asignados en bloque y bulk_create, en una sola
+transacción: revertir miles de asientos son unas pocas consultas por lote.
+Las líneas de IVA se revierten con sus datos fiscales (base y exento con
+signo contrario), así que el documento sale de los libros de IVA.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, QuerySet
+from django.utils import timezone
+
+from .models import AsientoDiario, CambioLibro, Cuenta, DatoFiscal, Movimiento, PeriodoContable
+
+CENTAVO = Decimal('0.01')
+CAMPOS_ENCABEZADO = ('fecha', 'descripcion', 'es_ajuste')
+LOTE_REVERSION = 1000
+
+
+@dataclass
+class ResultadoReversion:
+    periodo: PeriodoContable
+    reversiones: list = field(default_factory=list)
+    movimientos: int = 0
+    omitidos: dict = field(default_factory=dict)  # motivo -> cantidad de asientos
+
+
+@dataclass
+class ResultadoEdicion:
+    insertados: list = field(default_factory=list)
+    actualizados: list = field(default_factory=list)
+    eliminados: list = field(default_factory=list)
+    sin_cambios: int = 0
+    encabezado: bool = False
+
+    @property
+    def hubo_cambios(self):
+        return bool(self.insertados or self.actualizados or self.eliminados or self.encabezado)
+
+
+def _monto(valor):
+    return Decimal(valor or 0).quantize(CENTAVO)
+
+
+def lineas_de_formset(formset):
+    """
+    Convierte un MovimientoFormSet ya validado en la lista de líneas que
+    recibe editar_asiento (omite las filas vacías y las marcadas para borrar).
+    """
+    lineas = []
+    for form in formset.forms:
+        datos = getattr(form, 'cleaned_data', None) or {}
+        if not datos.get('cuenta') or datos.get('DELETE'):
+            continue
+        instancia = datos.get('id')
+        lineas.append({
+            'id': instancia.pk if instancia else None,
+            'cuenta_id': datos['cuenta'].pk,
+            'tercero_id': datos['tercero'].pk if datos.get('tercero') else None,
+            'referencia': datos.get('referencia') or '',
+            'debe': datos.get('debe'),
+            'haber': datos.get('haber'),
+        })
+    return lineas
+
+
+@transaction.atomic
+def editar_asiento(asiento, lineas, encabezado=None, exigir_cuadre=True):
+    """
+    Deja el asiento con exactamente las 'lineas' indicadas, escribiendo solo
+    la diferencia con lo guardado.
+
+    'lineas' es una lista de dicts con 'cuenta_id', 'debe', 'haber' e 'id'
+    (None para una línea nueva) y, opcionalmente, 'tercero_id' y
+    'referencia' (sin la llave, una línea guardada conserva el valor); las
+    líneas guardadas que no aparecen se eliminan. 'encabezado' puede
+    cambiar fecha, descripcion y es_ajuste (el período no: para mover un
+    asiento de período hay que revertirlo).
+
+    Lanza ValidationError si el asiento es automático, si su período está
+    cerrado, si una línea no es válida o si (con exigir_cuadre) el asiento
+    queda descuadrado o vacío. No se escribe nada en ese caso.
+    """
+    # Mismo orden que el registro y el cierre: candado del libro y luego el estado real
+    CambioLibro.bloquear_escrituras()
+    asiento = AsientoDiario.objects.select_related('periodo').get(pk=asiento.pk)
+    if asiento.es_asiento_automatico:
+        raise ValidationError("Los asientos automáticos (Cierre/Apertura) no pueden ser modificados.")
+    if asiento.periodo.estado == PeriodoContable.EstadoPeriodo.CERRADO:
+        raise ValidationError(f"El período '{asiento.periodo.nombre}' está cerrado. No se pueden modificar sus asientos.")
+    if asiento.reversiones.exists():
+        raise ValidationError(f"El asiento N° {asiento.numero_partida} ya fue revertido. No se puede modificar.")
+
+    encabezado = {c: v for c, v in (encabezado or {}).items() if getattr(asiento, c, None) != v}
+    invalidos = set(encabezado) - set(CAMPOS_ENCABEZADO)
+    if invalidos:
+        raise ValidationError(f"No se puede cambiar {', '.join(sorted(invalidos))} al editar un asiento.")
+
+    guardadas = {m.pk: m for m in asiento.movimientos.all()}
+    resultado = ResultadoEdicion()
+    nuevas, cambios = [], []
+    ids_vistos = set()
+    total_debe = total_haber = Decimal('0.00')
+
+    for linea in lineas:
+        debe, haber = _monto(linea.get('debe')), _monto(linea.get('haber'))
+        if debe < 0 or haber < 0:
+            raise ValidationError("Los montos no pueden ser negativos.")
+        if debe > 0 and haber > 0:
+            raise ValidationError("Un movimiento no puede tener Débito y Haber al mismo tiempo.")
+        total_debe += debe
+        total_haber += haber
+
+        pk = linea.get('id')
+        if pk is None:
+            nuevas.append(Movimiento(
+                asiento=asiento, cuenta_id=linea['cuenta_id'], tercero_id=linea.get('tercero_id'),
+                referencia=linea.get('referencia') or '', debe=debe, haber=haber,
+            ))
+            continue
+        if pk not in guardadas or pk in ids_vistos:
+            raise ValidationError(f"El movimiento {pk} no pertenece al asiento N° {asiento.numero_partida}.")
+        ids_vistos.add(pk)
+        actual = guardadas[pk]
+        valores = (
+            linea['cuenta_id'], linea.get('tercero_id', actual.tercero_id),
+            linea.get('referencia', actual.referencia) or '', debe, haber,
+        )
+        if (actual.cuenta_id, actual.tercero_id, actual.referencia, actual.debe, actual.haber) == valores:
+            resultado.sin_cambios += 1
+        else:
+            cambios.append((actual, *valores))
+
+    if exigir_cuadre:
+        if not lineas:
+            raise ValidationError("El asiento está vacío. Debe tener al menos un movimiento.")
+        if total_debe != total_haber:
+            raise ValidationError(f"El asiento está descuadrado. (Debe: ${total_debe}, Haber: ${total_haber})")
+
+    # Solo las cuentas que entran en líneas nuevas o cambiadas deben ser imputables y activas
+    cuentas_nuevas = {m.cuenta_id for m in nuevas} | {c for actual, c, *_ in cambios if c != actual.cuenta_id}
+    if cuentas_nuevas:
+        validas = set(Cuenta.objects.filter(
+            pk__in=cuentas_nuevas, es_imputable=True, esta_activa=True
+        ).values_list('pk', flat=True))
+        if cuentas_nuevas - validas:
+            raise ValidationError("Una de las cuentas no es imputable o está inactiva y no puede recibir movimientos.")
+
+    # 1. Bajas primero, para no sincronizar líneas que se van a eliminar
+    #    (su QuerySet escribe la bitácora)
+    resultado.eliminados = [m for pk, m in guardadas.items() if pk not in ids_vistos]
+    if resultado.eliminados:
+        Movimiento.objects.filter(pk__in=[m.pk for m in resultado.eliminados]).delete()
+
+    # 2. Encabezado: save() sincroniza y registra la fecha de las líneas que quedan
+    if encabezado:
+        for campo, valor in encabezado.items():
+            setattr(asiento, campo, valor)
+        asiento.save()
+        resultado.encabezado = True
+        for pk in ids_vistos:
+            guardadas[pk].asiento = asiento
+            guardadas[pk].sincronizar_con_asiento()
+
+    # 3. Cambios: un UPDATE por lote y la bitácora con los valores anteriores
+    if cambios:
+        anteriores = {}
+        for actual, cuenta_id, tercero_id, referencia, debe, haber in cambios:
+            anteriores[actual.pk] = {c: getattr(actual, c) for c in Movimiento.CAMPOS_BITACORA}
+            actual.cuenta_id, actual.tercero_id, actual.referencia = cuenta_id, tercero_id, referencia
+            actual.debe, actual.haber = debe, haber
+            resultado.actualizados.append(actual)
+        Movimiento.objects.bulk_update(resultado.actualizados, ['cuenta', 'tercero', 'referencia', 'debe', 'haber'])
+        CambioLibro.registrar_objetos(CambioLibro.Operacion.ACTUALIZACION, resultado.actualizados, anteriores=anteriores)
+        PeriodoContable.registrar_cambio([asiento.periodo_id])
+
+    # 4. Altas (bulk_create escribe la bitácora)
+    if nuevas:
+        resultado.insertados = Movimiento.objects.bulk_create(nuevas)
+
+    return resultado
+
+
+@transaction.atomic
+def revertir_asientos(asientos, periodo=None, fecha=None, usuario=None):
+    """
+    Crea por cada asiento de 'asientos' (QuerySet, o lista de asientos o
+    ids) uno nuevo con el debe y el haber intercambiados, enlazado al
+    original con reversa_de.
+
+    Las reversiones van a 'periodo' (por defecto, el período abierto) con
+    'fecha' (por defecto, hoy dentro del rango del período) y números de
+    partida correlativos a continuación del último del período. Se omiten
+    los asientos automáticos y los que ya fueron revertidos.
+
+    Lanza ValidationError si no hay período abierto, si el indicado está
+    cerrado o si la fecha está fuera de su rango.
+    """
+    # Mismo orden que el registro y el cierre: candado del libro y luego el estado real
+    CambioLibro.bloquear_escrituras()
+    if periodo is None:
+        periodo = PeriodoContable.objects.filter(estado=PeriodoContable.EstadoPeriodo.ABIERTO).first()
+        if periodo is None:
+            raise ValidationError("No hay un período abierto donde registrar las reversiones.")
+    else:
+        periodo = PeriodoContable.objects.get(pk=periodo.pk)
+        if periodo.estado == PeriodoContable.EstadoPeriodo.CERRADO:
+            raise ValidationError(f"El período '{periodo.nombre}' está cerrado. No se pueden registrar transacciones.")
+    if fecha is None:
+        fecha = min(max(timezone.localdate(), periodo.fecha_inicio), periodo.fecha_fin)
+    elif not (periodo.fecha_inicio <= fecha <= periodo.fecha_fin):
+        raise ValidationError(
+            f"La fecha {fecha} está fuera del rango del período "
+            f"({periodo.fecha_inicio} al {periodo.fecha_fin})."
+        )
+
+    if isinstance(asientos, QuerySet):
+        seleccion = AsientoDiario.objects.filter(pk__in=asientos.values('pk'))
+    else:
+        seleccion = AsientoDiario.objects.filter(pk__in=[getattr(a, 'pk', a) for a in asientos])
+    seleccion = seleccion.annotate(revertido=Exists(AsientoDiario.objects.filter(reversa_de=OuterRef('pk'))))
+
+    resultado = ResultadoReversion(periodo=periodo)
+    originales = []
+    for original in seleccion.select_related('periodo').order_by('periodo__fecha_inicio', 'numero_partida').only(
+        'pk', 'numero_partida', 'descripcion', 'es_ajuste', 'es_asiento_automatico', 'periodo__nombre'
+    ):
+        motivo = None
+        if original.es_asiento_automatico:
+            motivo = 'automático (Cierre/Apertura)'
+        elif original.revertido:
+            motivo = 'ya revertido'
+        if motivo:
+            resultado.omitidos[motivo] = resultado.omitidos.get(motivo, 0) + 1
+        else:
+            originales.append(original)
+
+    siguiente = (AsientoDiario.objects.filter(periodo=periodo).aggregate(m=Max('numero_partida'))['m'] or 0) + 1
+    for inicio in range(0, len(originales), LOTE_REVERSION):
+        lote = originales[inicio:inicio + LOTE_REVERSION]
+        # bulk_create no numera: los números se asignan aquí, con el candado tomado
+        reversiones = AsientoDiario.objects.bulk_create([
+            AsientoDiario(
+                periodo=periodo,
+                numero_partida=siguiente + inicio + k,
+                fecha=fecha,
+                descripcion=f"Reversión de la partida N° {o.numero_partida} ({o.periodo.nombre}): {o.descripcion}",
+                creado_por=usuario,
+                es_ajuste=o.es_ajuste,
+                reversa_de=o,
+            )
+            for k, o in enumerate(lote)
+        ])
+        por_original = {r.reversa_de_id: r for r in reversiones}
+        originales_ids, movimientos = [], []
+        for mov_id, asiento_id, cuenta_id, tercero_id, referencia, debe, haber in Movimiento.objects.filter(
+            asiento_id__in=por_original
+        ).order_by('asiento_id', 'pk').values_list(
+            'pk', 'asiento_id', 'cuenta_id', 'tercero_id', 'referencia', 'debe', 'haber'
+        ).iterator(chunk_size=5000):
+            originales_ids.append(mov_id)
+            movimientos.append(Movimiento(
+                asiento=por_original[asiento_id], cuenta_id=cuenta_id, tercero_id=tercero_id,
+                referencia=referencia, debe=haber, haber=debe,
+            ))
+        Movimiento.objects.bulk_create(movimientos, batch_size=5000)
+
+        # Datos fiscales espejo: el IVA (el monto de la línea) ya resta solo
+        espejo = dict(zip(originales_ids, (mov.pk for mov in movimientos)))
+        DatoFiscal.objects.bulk_create([
+            DatoFiscal(
+                movimiento_id=espejo[dato.movimiento_id], periodo_id=periodo.pk, libro=dato.libro,
+                tipo_documento=dato.tipo_documento, numero_documento=dato.numero_documento,
+                fecha_documento=dato.fecha_documento, tercero_nit=dato.tercero_nit,
+                tercero_nombre=dato.tercero_nombre, base_gravada=-dato.base_gravada,
+                monto_exento=-dato.monto_exento,
+            )
+            for dato in DatoFiscal.objects.filter(movimiento_id__in=originales_ids).iterator(chunk_size=5000)
+        ], batch_size=2000)
+        resultado.reversiones += reversiones
+        resultado.movimientos += len(movimientos)
+
+    return resultado
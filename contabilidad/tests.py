@@ -1,3 +1,1137 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import (
+    archivo_historico, auxiliares, bitacora, cartera, depreciacion, exportacion_bi, libros_iva, metricas, planillas,
+    recurrentes, servicios, views,
+)
+from .models import (
+    ActivoFijo, AplicacionCartera, ArchivoPeriodo, AsientoDiario, CambioLibro, ClaseActivo, Cuenta, DatoFiscal,
+    LineaPlantilla, Movimiento, PartidaCartera, PeriodoContable, Planilla, PlantillaAsiento, SaldoTercero,
+    TablaDeduccion, Tercero, TramoDeduccion,
+)
+
+
+def _periodo_abierto():
+    return PeriodoContable.objects.filter(estado=PeriodoContable.EstadoPeriodo.ABIERTO).first()
+
+
+def _imputable(codigo):
+    return Cuenta.objects.filter(codigo__startswith=codigo, es_imputable=True).order_by('codigo').first()
+
+
+def _asiento(periodo, lineas, descripcion='Prueba', fecha=None):
+    asiento = AsientoDiario(periodo=periodo, fecha=fecha or periodo.fecha_inicio, descripcion=descripcion)
+    asiento.save()
+    movimientos = Movimiento.objects.bulk_create([Movimiento(asiento=asiento, **linea) for linea in lineas])
+    return asiento, movimientos
+
+
+def _cerrar_y_abrir(periodo, dias=30):
+    """
+    Cierra 'periodo' y abre el siguiente con su asiento de apertura, como
+    gestionar_periodos.
+    """
+    periodo.estado = PeriodoContable.EstadoPeriodo.CERRADO
+    periodo.save()
+    inicio = periodo.fecha_fin + timedelta(days=1)
+    nuevo = PeriodoContable.objects.create(
+        nombre=f'Prueba {inicio}', fecha_inicio=inicio, fecha_fin=inicio + timedelta(days=dias),
+        estado=PeriodoContable.EstadoPeriodo.ABIERTO,
+    )
+    views._crear_asiento_apertura(nuevo, periodo, get_user_model().objects.filter(is_superuser=True).first())
+    return nuevo
+
+
+def _lineas_de(asiento):
+    return {cuenta_id: (debe, haber) for cuenta_id, debe, haber in asiento.movimientos.values_list('cuenta_id', 'debe', 'haber')}
+
+
+# --- Columnas denormalizadas de Movimiento ---
+
+class DenormalizacionTests(TestCase):
+
+    def setUp(self):
+        self.periodo = _periodo_abierto()
+        self.caja, self.ventas = _imputable('11'), _imputable('41')
+
+    def _lineas(self, monto='10.00'):
+        return [
+            dict(cuenta=self.caja, debe=Decimal(monto), haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=Decimal(monto)),
+        ]
+
+    def test_bulk_create_lee_los_asientos_con_una_sola_consulta(self):
+        asientos = [_asiento(self.periodo, [])[0] for _ in range(3)]
+        AsientoDiario.objects.filter(pk=asientos[1].pk).update(es_asiento_automatico=True)
+        # Solo con asiento_id (sin la instancia en caché), como en una carga masiva
+        movimientos = [
+            Movimiento(asiento_id=asiento.pk, **linea) for asiento in asientos for linea in self._lineas()
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            Movimiento.objects.bulk_create(movimientos)
+        lecturas = [
+            q['sql'] for q in consultas.captured_queries
+            if q['sql'].startswith('SELECT') and 'contabilidad_asientodiario' in q['sql']
+        ]
+        self.assertEqual(len(lecturas), 1)
+        self.assertEqual(
+            set(Movimiento.objects.values_list('asiento_id', 'fecha', 'periodo_id', 'es_asiento_automatico')),
+            {(a.pk, a.fecha, self.periodo.pk, a.pk == asientos[1].pk) for a in asientos},
+        )
+
+    def test_guardar_el_asiento_sincroniza_sus_movimientos(self):
+        asiento, _ = _asiento(self.periodo, self._lineas())
+        otro, _ = _asiento(self.periodo, self._lineas('5.00'))
+        asiento.fecha = self.periodo.fecha_inicio + timedelta(days=1)
+        asiento.save()
+        self.assertEqual(set(asiento.movimientos.values_list('fecha', flat=True)), {asiento.fecha})
+        # Los movimientos de los demás asientos no cambian
+        self.assertEqual(set(otro.movimientos.values_list('fecha', flat=True)), {self.periodo.fecha_inicio})
+
+
+# --- Saldos a una fecha: apertura y archivo histórico ---
+
+class SaldosAperturaArchivoTests(TestCase):
+
+    def setUp(self):
+        self.periodo = _periodo_abierto()
+        self.caja, self.capital, self.proveedores = _imputable('11'), _imputable('31'), _imputable('21')
+        _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('1000.00'), haber=0),
+            dict(cuenta=self.capital, debe=0, haber=Decimal('1000.00')),
+        ])
+        _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('200.00'), haber=0),
+            dict(cuenta=self.proveedores, debe=0, haber=Decimal('200.00')),
+        ], fecha=self.periodo.fecha_inicio + timedelta(days=5))
+
+    def test_la_primera_apertura_copia_los_saldos_del_periodo(self):
+        # Igual que sumar toda la historia, como antes de leer desde la última apertura
+        historia = {
+            fila['cuenta_id']: (fila['debe'], fila['haber'])
+            for fila in Movimiento.objects.values('cuenta_id').annotate(
+                debe=Sum('debe'), haber=Sum('haber'),
+            ).order_by()
+        }
+        segundo = _cerrar_y_abrir(self.periodo)
+        apertura = self.periodo.asiento_apertura_siguiente
+        self.assertEqual(apertura.periodo, segundo)
+        self.assertEqual(_lineas_de(apertura), {
+            cuenta_id: (max(debe - haber, 0), max(haber - debe, 0)) for cuenta_id, (debe, haber) in historia.items()
+        })
+        self.assertEqual(_lineas_de(apertura), {
+            self.caja.pk: (Decimal('1200.00'), 0),
+            self.capital.pk: (0, Decimal('1000.00')),
+            self.proveedores.pk: (0, Decimal('200.00')),
+        })
+
+    def test_la_tercera_apertura_no_duplica_los_saldos(self):
+        segundo = _cerrar_y_abrir(self.periodo)
+        _asiento(segundo, [
+            dict(cuenta=self.caja, debe=Decimal('50.00'), haber=0),
+            dict(cuenta=self.capital, debe=0, haber=Decimal('50.00')),
+        ])
+        _cerrar_y_abrir(segundo)
+        self.assertEqual(_lineas_de(segundo.asiento_apertura_siguiente), {
+            self.caja.pk: (Decimal('1250.00'), 0),
+            self.capital.pk: (0, Decimal('1050.00')),
+            self.proveedores.pk: (0, Decimal('200.00')),
+        })
+
+    def test_archivar_arrastra_el_saldo_y_lee_las_fechas_archivadas_del_archivo(self):
+        segundo = _cerrar_y_abrir(self.periodo)
+        _asiento(segundo, [
+            dict(cuenta=self.caja, debe=Decimal('50.00'), haber=0),
+            dict(cuenta=self.capital, debe=0, haber=Decimal('50.00')),
+        ])
+        antes = [views._get_saldo_a_fecha(self.caja, fecha) for fecha in (
+            self.periodo.fecha_inicio, self.periodo.fecha_fin, segundo.fecha_fin,
+        )]
+        self.assertEqual(antes, [Decimal('1000.00'), Decimal('1200.00'), Decimal('1250.00')])
+
+        with tempfile.TemporaryDirectory() as directorio, override_settings(CONTABILIDAD_ARCHIVO_DIR=directorio):
+            call_command('archivar_periodos', periodo=[self.periodo.pk], stdout=StringIO())
+            archivo = ArchivoPeriodo.objects.get(periodo=self.periodo)
+            self.assertEqual(archivo.num_movimientos, 4)
+            self.assertEqual(_lineas_de(archivo.asiento_arrastre), {
+                self.caja.pk: (Decimal('1200.00'), 0),
+                self.capital.pk: (0, Decimal('1000.00')),
+                self.proveedores.pk: (0, Decimal('200.00')),
+            })
+            self.assertFalse(Movimiento.objects.filter(periodo=self.periodo).exclude(asiento=archivo.asiento_arrastre).exists())
+            despues = [views._get_saldo_a_fecha(self.caja, fecha) for fecha in (
+                self.periodo.fecha_inicio, self.periodo.fecha_fin, segundo.fecha_fin,
+            )]
+        self.assertEqual(despues, antes)
+
+    def test_no_se_archiva_dejando_huecos(self):
+        segundo = _cerrar_y_abrir(self.periodo)
+        tercero = _cerrar_y_abrir(segundo)
+        tercero.estado = PeriodoContable.EstadoPeriodo.CERRADO
+        tercero.save()
+        with tempfile.TemporaryDirectory() as directorio, override_settings(CONTABILIDAD_ARCHIVO_DIR=directorio):
+            with self.assertRaisesMessage(CommandError, 'períodos anteriores sin archivar'):
+                call_command('archivar_periodos', periodo=[segundo.pk], stdout=StringIO())
+        self.assertFalse(ArchivoPeriodo.objects.exists())
+
+
+# --- Libro mayor con saldo corrido ---
+
+class LibroMayorSaldosTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.get(username='contador.softnova'))
+        self.periodo = _periodo_abierto()
+        self.caja, self.ventas = _imputable('11'), _imputable('41')
+        for dia, monto in enumerate(('100.00', '40.00', '25.00')):
+            _asiento(self.periodo, [
+                dict(cuenta=self.caja, debe=Decimal(monto), haber=0),
+                dict(cuenta=self.ventas, debe=0, haber=Decimal(monto)),
+            ], fecha=self.periodo.fecha_inicio + timedelta(days=2 - dia))
+        self.url = reverse('contabilidad:libro_mayor_saldos', args=[self.periodo.pk, self.caja.pk])
+
+    def test_saldo_corrido_en_orden_del_diario(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([fila['saldo'] for fila in respuesta.context['filas']], [
+            Decimal('25.00'), Decimal('65.00'), Decimal('165.00'),
+        ])
+        self.assertEqual(respuesta.context['total_debe'], Decimal('165.00'))
+        self.assertIsNone(respuesta.context['cursor_siguiente'])
+
+    def test_saldo_segun_naturaleza_acreedora(self):
+        url = reverse('contabilidad:libro_mayor_saldos', args=[self.periodo.pk, self.ventas.pk])
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.context['saldo'], Decimal('165.00'))
+
+    @patch.object(views, 'MOVIMIENTOS_POR_PAGINA', 2)
+    def test_el_cursor_continua_el_saldo_y_los_totales(self):
+        primera = self.client.get(self.url)
+        self.assertEqual(len(primera.context['filas']), 2)
+        cursor = primera.context['cursor_siguiente']
+        self.assertIsNotNone(cursor)
+
+        segunda = self.client.get(self.url, {'cursor': cursor})
+        self.assertEqual(segunda.context['saldo_anterior'], Decimal('65.00'))
+        self.assertEqual([fila['saldo'] for fila in segunda.context['filas']], [Decimal('165.00')])
+        self.assertEqual(segunda.context['total_debe'], Decimal('165.00'))
+        self.assertIsNone(segunda.context['cursor_siguiente'])
+
+    def test_un_cursor_alterado_vuelve_a_la_primera_pagina(self):
+        respuesta = self.client.get(self.url, {'cursor': 'no-es-un-cursor'})
+        self.assertRedirects(respuesta, self.url)
+
+
+# --- Flujo de efectivo por categoría ---
+
+class FlujoEfectivoTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.get(username='contador.softnova'))
+        self.periodo = _periodo_abierto()
+        self.caja, self.equipo = _imputable('11'), _imputable('15')
+        self.capital, self.ventas = _imputable('31'), _imputable('41')
+        for cuenta_debe, cuenta_haber, monto in (
+            (self.caja, self.ventas, '100.00'),
+            (self.equipo, self.caja, '30.00'),
+            (self.caja, self.capital, '50.00'),
+        ):
+            _asiento(self.periodo, [
+                dict(cuenta=cuenta_debe, debe=Decimal(monto), haber=0),
+                dict(cuenta=cuenta_haber, debe=0, haber=Decimal(monto)),
+            ])
+
+    def _flujo(self, periodo):
+        return self.client.get(reverse('contabilidad:flujo_efectivo', args=[periodo.pk])).context
+
+    def test_clasifica_por_la_categoria_heredada(self):
+        contexto = self._flujo(self.periodo)
+        self.assertEqual(contexto['total_operacion'], Decimal('100.00'))
+        self.assertEqual(contexto['total_inversion'], Decimal('-30.00'))
+        self.assertEqual(contexto['total_financiacion'], Decimal('50.00'))
+        self.assertTrue(contexto['esta_cuadrado'])
+        self.assertEqual(contexto['indirecto']['utilidad_neta'], Decimal('100.00'))
+        self.assertEqual(contexto['indirecto']['total_flujo_neto'], Decimal('120.00'))
+        self.assertTrue(contexto['indirecto_cuadrado'])
+
+    def test_reclasificar_la_cuenta_mueve_su_flujo(self):
+        self.equipo.categoria_flujo = Cuenta.CategoriaFlujo.FINANCIACION
+        self.equipo.save()
+        contexto = self._flujo(self.periodo)
+        self.assertEqual(contexto['total_inversion'], Decimal('0.00'))
+        self.assertEqual(contexto['total_financiacion'], Decimal('20.00'))
+
+    def test_la_apertura_no_es_un_flujo_del_periodo(self):
+        segundo = _cerrar_y_abrir(self.periodo)
+        _asiento(segundo, [
+            dict(cuenta=self.caja, debe=Decimal('10.00'), haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=Decimal('10.00')),
+        ])
+        contexto = self._flujo(segundo)
+        self.assertEqual(contexto['saldo_inicial_efectivo'], Decimal('120.00'))
+        self.assertEqual(contexto['total_flujo_neto'], Decimal('10.00'))
+        self.assertTrue(contexto['esta_cuadrado'])
+
+
+# --- Estado de cambios en el patrimonio ---
+
+class EstadoPatrimonioTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.get(username='contador.softnova'))
+        self.periodo = _periodo_abierto()
+        self.caja, self.capital, self.ventas = _imputable('11'), _imputable('31'), _imputable('41')
+        _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('1000.00'), haber=0),
+            dict(cuenta=self.capital, debe=0, haber=Decimal('1000.00')),
+        ])
+        _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('100.00'), haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=Decimal('100.00')),
+        ])
+
+    def _estado(self, periodo):
+        return self.client.get(reverse('contabilidad:estado_patrimonio', args=[periodo.pk])).context
+
+    def _fila(self, contexto, codigo):
+        return next(fila for fila in contexto['filas'] if fila['cuenta'].codigo == codigo)
+
+    def test_periodo_abierto_suma_la_utilidad_en_la_cuenta_34(self):
+        contexto = self._estado(self.periodo)
+        self.assertEqual(contexto['utilidad_ejercicio'], Decimal('100.00'))
+        self.assertEqual(self._fila(contexto, '31')['movimientos'], Decimal('1000.00'))
+        self.assertEqual(self._fila(contexto, '34')['saldo_final'], Decimal('100.00'))
+        self.assertEqual(contexto['totales']['saldo_inicial'], Decimal('0.00'))
+        self.assertEqual(contexto['totales']['saldo_final'], Decimal('1100.00'))
+
+    def test_el_saldo_inicial_es_el_final_del_periodo_anterior(self):
+        anterior = self._estado(self.periodo)
+        # El asiento de cierre lleva la utilidad a la cuenta 34 y la apertura la traspasa a la 33
+        self.client.force_login(get_user_model().objects.get(username='gerente.admin'))
+        self.client.post(reverse('contabilidad:cerrar_periodo', args=[self.periodo.pk]))
+        segundo = _cerrar_y_abrir(self.periodo)
+        contexto = self._estado(segundo)
+        self.assertEqual(contexto['totales']['saldo_inicial'], anterior['totales']['saldo_final'])
+        # La utilidad cerrada en la 34 pasa a resultados acumulados (33) con la apertura
+        self.assertEqual(self._fila(contexto, '34')['saldo_inicial'], Decimal('100.00'))
+        self.assertEqual(self._fila(contexto, '33')['saldo_final'], Decimal('100.00'))
+        self.assertEqual(contexto['totales']['movimientos'], Decimal('0.00'))
+
+
+# --- Balanza por rango de fechas ---
+
+class BalanzaRangoTests(TestCase):
+
+    def setUp(self):
+        self.periodo = _periodo_abierto()
+        self.caja, self.capital = _imputable('11'), _imputable('31')
+        self.ventas, self.sueldos = _imputable('41'), _imputable('521')
+        inicio = self.periodo.fecha_inicio
+        _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('1000.00'), haber=0),
+            dict(cuenta=self.capital, debe=0, haber=Decimal('1000.00')),
+        ])
+        _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('200.00'), haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=Decimal('200.00')),
+        ], fecha=inicio + timedelta(days=5))
+        ajuste, _ = _asiento(self.periodo, [
+            dict(cuenta=self.sueldos, debe=Decimal('30.00'), haber=0),
+            dict(cuenta=self.caja, debe=0, haber=Decimal('30.00')),
+        ], fecha=inicio + timedelta(days=10))
+        AsientoDiario.objects.filter(pk=ajuste.pk).update(es_ajuste=True)
+
+    def assertCuadra(self, datos):
+        for cuenta_id, valores in datos.items():
+            self.assertEqual(valores['inicial'] + valores['debe'] - valores['haber'], valores['final'], cuenta_id)
+
+    def test_rango_dentro_del_periodo(self):
+        inicio = self.periodo.fecha_inicio
+        datos = views._balanza_rango(inicio + timedelta(days=3), inicio + timedelta(days=12))
+        self.assertEqual(datos[self.caja.pk], {
+            'inicial': Decimal('1000.00'), 'debe': Decimal('200.00'), 'haber': Decimal('30.00'),
+            'final': Decimal('1170.00'), 'ajustes_debe': Decimal('0.00'), 'ajustes_haber': Decimal('30.00'),
+            'cierre': Decimal('0.00'),
+        })
+        self.assertEqual(datos[self.sueldos.pk]['ajustes_debe'], Decimal('30.00'))
+        self.assertCuadra(datos)
+
+    def test_rango_entre_periodos_cuenta_solo_el_efecto_neto_de_la_apertura(self):
+        segundo = _cerrar_y_abrir(self.periodo)
+        _asiento(segundo, [
+            dict(cuenta=self.caja, debe=Decimal('50.00'), haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=Decimal('50.00')),
+        ], fecha=segundo.fecha_inicio + timedelta(days=1))
+        datos = views._balanza_rango(self.periodo.fecha_inicio + timedelta(days=3), segundo.fecha_fin)
+        self.assertEqual(datos[self.caja.pk]['final'], Decimal('1220.00'))
+        self.assertEqual(datos[self.caja.pk]['debe'], Decimal('250.00'))
+        self.assertCuadra(datos)
+
+    def test_el_archivo_da_las_mismas_cifras_que_la_base(self):
+        segundo = _cerrar_y_abrir(self.periodo)
+        _asiento(segundo, [
+            dict(cuenta=self.caja, debe=Decimal('50.00'), haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=Decimal('50.00')),
+        ], fecha=segundo.fecha_inicio + timedelta(days=1))
+        rango = (self.periodo.fecha_inicio + timedelta(days=3), segundo.fecha_fin)
+        en_base = views._balanza_rango(*rango)
+        with tempfile.TemporaryDirectory() as directorio, override_settings(CONTABILIDAD_ARCHIVO_DIR=directorio):
+            call_command('archivar_periodos', periodo=[self.periodo.pk], stdout=StringIO())
+            archivado = views._balanza_rango(*rango)
+        quitar_ceros = lambda datos: {pk: valores for pk, valores in datos.items() if any(valores.values())}
+        self.assertEqual(quitar_ceros(archivado), quitar_ceros(en_base))
+
+
+# --- Versión del libro y respuestas 304 ---
+
+class VersionLibroTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.get(username='contador.softnova'))
+        self.periodo = _periodo_abierto()
+        self.caja, self.capital, self.ventas = _imputable('11'), _imputable('31'), _imputable('41')
+        _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('100.00'), haber=0),
+            dict(cuenta=self.capital, debe=0, haber=Decimal('100.00')),
+        ])
+        self.url = reverse('contabilidad:balanza_comprobacion', args=[self.periodo.pk])
+
+    def _version(self, periodo):
+        return PeriodoContable.objects.values_list('version_libro', flat=True).get(pk=periodo.pk)
+
+    def test_mismo_etag_responde_304(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('no-cache', respuesta['Cache-Control'])
+        otra = self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(otra.status_code, 304)
+
+    def test_un_asiento_nuevo_cambia_el_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        version = self._version(self.periodo)
+        asiento, _ = _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('5.00'), haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=Decimal('5.00')),
+        ])
+        self.assertGreater(self._version(self.periodo), version)
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+        version = self._version(self.periodo)
+        asiento.movimientos.all().delete()
+        self.assertGreater(self._version(self.periodo), version)
+
+    def test_periodo_cerrado_se_puede_reutilizar(self):
+        _cerrar_y_abrir(self.periodo)
+        respuesta = self.client.get(self.url)
+        self.assertIn('max-age', respuesta['Cache-Control'])
+
+    def test_cambiar_una_cuenta_solo_versiona_los_periodos_que_la_muestran(self):
+        segundo = _cerrar_y_abrir(self.periodo)
+        _asiento(segundo, [
+            dict(cuenta=self.caja, debe=Decimal('5.00'), haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=Decimal('5.00')),
+        ])
+        tercero = _cerrar_y_abrir(segundo)
+        antes = {periodo.pk: self._version(periodo) for periodo in (self.periodo, segundo, tercero)}
+
+        self.ventas.nombre = 'Ventas renombradas'
+        self.ventas.save()
+        despues = {periodo.pk: self._version(periodo) for periodo in (self.periodo, segundo, tercero)}
+        # El primer período no tiene ventas; el segundo sí y el tercero está abierto
+        self.assertEqual(despues[self.periodo.pk], antes[self.periodo.pk])
+        self.assertGreater(despues[segundo.pk], antes[segundo.pk])
+        self.assertGreater(despues[tercero.pk], antes[tercero.pk])
+
+        # Una cuenta de grupo versiona los períodos de sus subcuentas
+        grupo = Cuenta.objects.get(pk=self.ventas.padre_id)
+        grupo.nombre = 'Ingresos renombrados'
+        grupo.save()
+        self.assertGreater(self._version(segundo), despues[segundo.pk])
+        self.assertEqual(self._version(self.periodo), antes[self.periodo.pk])
+
+
+# --- Bitácora de cambios ---
+
+class ApiCambiosTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.get(username='contador.softnova'))
+        self.periodo = _periodo_abierto()
+        self.caja, self.ventas = _imputable('11'), _imputable('41')
+        self.inicio = bitacora.ultima_secuencia()
+        self.asiento, self.movimientos = _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('10.00'), haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=Decimal('10.00')),
+        ])
+
+    def _pedir(self, **parametros):
+        respuesta = self.client.get(reverse('contabilidad:api_cambios'), parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_recorre_los_cambios_por_paginas_sin_perder_ninguno(self):
+        vistos, cursor = [], self.inicio
+        while True:
+            pagina = self._pedir(desde=cursor, limite=1)
+            if not pagina['cambios']:
+                break
+            self.assertEqual(len(pagina['cambios']), 1)
+            vistos.extend(pagina['cambios'])
+            cursor = pagina['siguiente']
+        self.assertEqual(cursor, pagina['ultima_secuencia'])
+        self.assertEqual(
+            [(c['modelo'], c['operacion'], c['objeto_id']) for c in vistos],
+            [('ASIENTO', 'I', self.asiento.pk)] + [('MOVIMIENTO', 'I', mov.pk) for mov in self.movimientos],
+        )
+        secuencias = [c['secuencia'] for c in vistos]
+        self.assertEqual(secuencias, sorted(secuencias))
+
+    def test_sin_cambios_el_cursor_no_se_mueve(self):
+        ultima = bitacora.ultima_secuencia()
+        pagina = self._pedir(desde=ultima)
+        self.assertEqual(pagina['cambios'], [])
+        self.assertEqual(pagina['siguiente'], ultima)
+
+    def test_filtra_por_modelo_y_registra_las_bajas(self):
+        cursor = bitacora.ultima_secuencia()
+        self.asiento.movimientos.all().delete()
+        pagina = self._pedir(desde=cursor, modelo='MOVIMIENTO')
+        self.assertEqual(
+            sorted((c['operacion'], c['objeto_id'], c['periodo_id']) for c in pagina['cambios']),
+            sorted(('D', mov.pk, self.periodo.pk) for mov in self.movimientos),
+        )
+
+    def test_parametros_invalidos(self):
+        url = reverse('contabilidad:api_cambios')
+        self.assertEqual(self.client.get(url, {'desde': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'modelo': 'OTRO'}).status_code, 400)
+
+
+# --- Extracción incremental para BI ---
+
+class ExportacionBiTests(TestCase):
+
+    def setUp(self):
+        self.periodo = _periodo_abierto()
+        self.caja, self.ventas = _imputable('11'), _imputable('41')
+        _, self.movimientos = _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('10.00'), haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=Decimal('10.00')),
+        ])
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        ajustes = override_settings(CONTABILIDAD_BI_DIR=self.directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _filas(self, manifiesto):
+        filas = []
+        for info in manifiesto['archivos']:
+            ruta = Path(manifiesto['directorio']) / info['nombre']
+            self.assertEqual(archivo_historico.sha256(ruta), info['sha256'])
+            with gzip.open(ruta, 'rt', encoding='utf-8') as f:
+                filas.extend(json.loads(linea) for linea in f)
+        return filas
+
+    def test_la_segunda_corrida_solo_trae_el_ultimo_estado_de_lo_cambiado(self):
+        completa = exportacion_bi.exportar(CambioLibro.Modelo.MOVIMIENTO)
+        self.assertEqual(completa['tipo'], 'completa')
+        self.assertEqual(completa['filas'], Movimiento.objects.count())
+
+        editado, borrado = self.movimientos
+        for monto in ('11.00', '12.00'):
+            editado.debe = Decimal(monto)
+            editado.save()
+        Movimiento.objects.filter(pk=borrado.pk).delete()
+
+        incremental = exportacion_bi.exportar(CambioLibro.Modelo.MOVIMIENTO)
+        self.assertEqual(incremental['desde'], completa['hasta'])
+        filas = {fila['id']: fila for fila in self._filas(incremental)}
+        self.assertEqual(set(filas), {editado.pk, borrado.pk})
+        self.assertEqual((filas[editado.pk]['operacion'], Decimal(filas[editado.pk]['debe'])), ('U', Decimal('12.00')))
+        self.assertEqual(filas[borrado.pk]['operacion'], 'D')
+
+        self.assertIsNone(exportacion_bi.exportar(CambioLibro.Modelo.MOVIMIENTO))
+
+
+# --- Libro sintético ---
+
+class GenerarLibroTests(TestCase):
+
+    def test_numera_a_continuacion_y_cuadra_cada_asiento(self):
+        periodo = _periodo_abierto()
+        _asiento(periodo, [
+            dict(cuenta=_imputable('11'), debe=Decimal('10.00'), haber=0),
+            dict(cuenta=_imputable('41'), debe=0, haber=Decimal('10.00')),
+        ])
+        call_command('generate_ledger', periodos=2, asientos=7, lote=3, cierre=True, stdout=StringIO())
+
+        self.assertEqual(
+            list(AsientoDiario.objects.filter(periodo=periodo).values_list('numero_partida', flat=True)),
+            list(range(1, 10)),  # el asiento manual, 7 generados y el cierre
+        )
+        # SQLite no devuelve las sumas redondeadas: se comparan en centavos
+        totales = Movimiento.objects.values('asiento_id').annotate(debe=Sum('debe'), haber=Sum('haber')).order_by()
+        self.assertEqual(
+            [fila['asiento_id'] for fila in totales if fila['debe'].quantize(Decimal('0.01')) != fila['haber'].quantize(Decimal('0.01'))],
+            [],
+        )
+
+
+# --- Métricas ---
+
+class MetricasTests(TestCase):
+
+    def test_un_error_al_volcar_se_registra_y_no_se_propaga(self):
+        registro = metricas.Registro()
+        registro.incrementar('sic_asientos_registrados_total')
+        with tempfile.NamedTemporaryFile() as archivo, override_settings(CONTABILIDAD_METRICAS_DIR=archivo.name):
+            # El "directorio" es un archivo: no se puede crear
+            with self.assertLogs('contabilidad.metricas', 'WARNING'):
+                registro.volcar(forzar=True)
+
+    def test_vuelca_el_estado_del_proceso(self):
+        registro = metricas.Registro()
+        registro.observar('sic_solicitud_segundos', 0.02, vista='prueba')
+        with tempfile.TemporaryDirectory() as directorio, override_settings(CONTABILIDAD_METRICAS_DIR=directorio):
+            registro.volcar(forzar=True)
+            volcados = list(Path(directorio).glob('*.json'))
+            self.assertEqual(len(volcados), 1)
+            estado = json.loads(volcados[0].read_text(encoding='utf-8'))
+        self.assertEqual(estado['histogramas'][0][:2], ['sic_solicitud_segundos', {'vista': 'prueba'}])
+
+
+# --- Edición por diferencia ---
+
+class EdicionTests(TestCase):
+
+    def setUp(self):
+        self.periodo = _periodo_abierto()
+        self.caja, self.ventas, self.iva = _imputable('11'), _imputable('41'), _imputable('221')
+        self.asiento, self.lineas = _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('113.00'), haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=Decimal('100.00')),
+            dict(cuenta=self.iva, debe=0, haber=Decimal('13.00')),
+        ])
+
+    def _linea(self, mov, **cambios):
+        return {'id': mov.pk, 'cuenta_id': mov.cuenta_id, 'debe': mov.debe, 'haber': mov.haber, **cambios}
+
+    def _bitacora_desde(self, secuencia):
+        return CambioLibro.objects.filter(modelo=CambioLibro.Modelo.MOVIMIENTO, secuencia__gt=secuencia).order_by('secuencia')
+
+    def test_editar_escribe_solo_la_diferencia(self):
+        caja, ventas, iva = self.lineas
+        resultado = servicios.editar_asiento(self.asiento, [
+            self._linea(caja, debe=Decimal('226.00')),
+            self._linea(ventas, haber=Decimal('200.00')),
+            self._linea(iva, haber=Decimal('26.00')),
+        ])
+        self.assertEqual(resultado.sin_cambios, 0)
+        self.assertEqual(len(resultado.actualizados), 3)
+
+        inicio = bitacora.ultima_secuencia()
+        resultado = servicios.editar_asiento(self.asiento, [
+            self._linea(caja, debe=Decimal('226.00'), haber=0),
+            self._linea(ventas, debe=0, haber=Decimal('226.00')),
+        ])
+        self.assertEqual(resultado.sin_cambios, 1)
+        self.assertEqual([m.pk for m in resultado.actualizados], [ventas.pk])
+        self.assertEqual([m.pk for m in resultado.eliminados], [iva.pk])
+        cambios = list(self._bitacora_desde(inicio))
+        self.assertEqual(
+            [(c.operacion, c.objeto_id) for c in cambios],
+            [(CambioLibro.Operacion.ELIMINACION, iva.pk), (CambioLibro.Operacion.ACTUALIZACION, ventas.pk)],
+        )
+        self.assertEqual(Decimal(cambios[1].datos['anterior']['haber']), Decimal('200.00'))
+        self.assertEqual(Decimal(cambios[1].datos['haber']), Decimal('226.00'))
+
+    def test_sin_cambios_no_escribe_nada(self):
+        inicio = bitacora.ultima_secuencia()
+        resultado = servicios.editar_asiento(self.asiento, [self._linea(m) for m in self.lineas])
+        self.assertFalse(resultado.hubo_cambios)
+        self.assertFalse(self._bitacora_desde(inicio).exists())
+
+    def test_descuadrado_o_periodo_cerrado_no_escribe_nada(self):
+        caja, ventas, iva = self.lineas
+        with self.assertRaises(ValidationError):
+            servicios.editar_asiento(self.asiento, [self._linea(caja, debe=Decimal('1.00')), self._linea(ventas), self._linea(iva)])
+        self.assertEqual(Movimiento.objects.get(pk=caja.pk).debe, Decimal('113.00'))
+
+        _cerrar_y_abrir(self.periodo)
+        with self.assertRaisesMessage(ValidationError, 'está cerrado'):
+            servicios.editar_asiento(self.asiento, [self._linea(m) for m in self.lineas])
+
+
+# --- Reversión de asientos ---
+
+class ReversionTests(TestCase):
+
+    def setUp(self):
+        self.periodo = _periodo_abierto()
+        self.asiento, self.lineas = _asiento(self.periodo, [
+            dict(cuenta=_imputable('11'), debe=Decimal('113.00'), haber=0),
+            dict(cuenta=_imputable('41'), debe=0, haber=Decimal('100.00')),
+            dict(cuenta=_imputable('221'), debe=0, haber=Decimal('13.00')),
+        ])
+
+    def test_reversion_espeja_las_lineas_una_sola_vez(self):
+        resultado = servicios.revertir_asientos([self.asiento], periodo=self.periodo, fecha=self.periodo.fecha_inicio)
+        self.assertEqual(resultado.movimientos, 3)
+        reversion = resultado.reversiones[0]
+        self.assertEqual(reversion.reversa_de_id, self.asiento.pk)
+        self.assertEqual(reversion.numero_partida, self.asiento.numero_partida + 1)
+        self.assertEqual(
+            sorted(reversion.movimientos.values_list('cuenta_id', 'debe', 'haber')),
+            sorted((m.cuenta_id, m.haber, m.debe) for m in self.lineas),
+        )
+
+        otra = servicios.revertir_asientos([self.asiento], periodo=self.periodo, fecha=self.periodo.fecha_inicio)
+        self.assertEqual((otra.reversiones, otra.omitidos), ([], {'ya revertido': 1}))
+
+    def test_fecha_fuera_del_periodo(self):
+        with self.assertRaisesMessage(ValidationError, 'fuera del rango'):
+            servicios.revertir_asientos([self.asiento], periodo=self.periodo, fecha=self.periodo.fecha_fin + timedelta(days=1))
+        self.assertFalse(AsientoDiario.objects.filter(reversa_de=self.asiento).exists())
+
+
+# --- Plantillas recurrentes ---
+
+class RecurrentesTests(TestCase):
+
+    def setUp(self):
+        self.periodo = _periodo_abierto()
+        self.plantilla = PlantillaAsiento.objects.create(
+            nombre='Prueba alquiler', recurrente=True, frecuencia=PlantillaAsiento.Frecuencia.MENSUAL,
+            dia=1, vigente_desde=self.periodo.fecha_inicio, monto_base=Decimal('0.00'),
+        )
+        LineaPlantilla.objects.create(
+            plantilla=self.plantilla, cuenta=_imputable('523'), lado=LineaPlantilla.Lado.DEBE,
+            formula=LineaPlantilla.Formula.FIJO, valor=Decimal('500.00'), orden=1,
+        )
+        LineaPlantilla.objects.create(
+            plantilla=self.plantilla, cuenta=_imputable('11'), lado=LineaPlantilla.Lado.HABER,
+            formula=LineaPlantilla.Formula.CUADRE, orden=2,
+        )
+        self.esperadas = recurrentes.vencimientos(self.plantilla, self.periodo.fecha_inicio, self.periodo.fecha_fin)
+
+    def _generar(self, **opciones):
+        call_command('generar_recurrentes', plantilla=[self.plantilla.nombre], stdout=StringIO(), **opciones)
+        return AsientoDiario.objects.filter(descripcion=self.plantilla.nombre)
+
+    def test_volver_a_ejecutar_no_duplica_asientos(self):
+        generados = self._generar()
+        self.assertEqual(sorted(generados.values_list('fecha', flat=True)), self.esperadas)
+        self.assertTrue(self.esperadas)
+        self.plantilla.refresh_from_db()
+        self.assertEqual(self.plantilla.generada_hasta, self.esperadas[-1])
+
+        self.assertEqual(self._generar().count(), len(self.esperadas))
+        self.assertEqual(
+            Movimiento.objects.filter(asiento__in=generados).aggregate(total=Sum('debe'))['total'],
+            Decimal('500.00') * len(self.esperadas),
+        )
+
+    def test_el_siguiente_periodo_sigue_desde_lo_generado(self):
+        self._generar()
+        segundo = _cerrar_y_abrir(self.periodo, dias=60)
+        generados = self._generar()
+        fechas_segundo = sorted(generados.filter(periodo=segundo).values_list('fecha', flat=True))
+        self.assertTrue(fechas_segundo)
+        self.assertEqual(fechas_segundo, recurrentes.vencimientos(self.plantilla, segundo.fecha_inicio, segundo.fecha_fin))
+        self.assertEqual(generados.filter(periodo=self.periodo).count(), len(self.esperadas))
+
+    def test_simular_no_escribe_ni_avanza(self):
+        self.assertFalse(self._generar(simular=True).exists())
+        self.plantilla.refresh_from_db()
+        self.assertIsNone(self.plantilla.generada_hasta)
+
+
+# --- Depreciación ---
+
+class DepreciacionTests(TestCase):
+    CASOS = [  # (costo, residual, vida) en centavos y meses
+        (1_000_000, 0, 60), (1_000_000, 100_000, 60), (123_457, 0, 37),
+        (1_000, 0, 5), (999, 0, 1), (1_000, 100, 2), (5_000_000, 2_500_000, 120),
+    ]
+
+    def _cuotas(self, metodo, costo, residual, vida):
+        meses = np.arange(vida + 3)
+        completo = lambda valor: np.full(len(meses), valor, dtype=np.int64)
+        return np.diff(depreciacion.acumulada(
+            completo(metodo), completo(costo - residual), completo(costo), completo(vida), meses,
+        ))
+
+    def test_las_cuotas_suman_el_monto_depreciable(self):
+        for metodo in (depreciacion.LINEA_RECTA, depreciacion.SALDO_DECRECIENTE, depreciacion.SUMA_DIGITOS):
+            for costo, residual, vida in self.CASOS:
+                with self.subTest(metodo=metodo, costo=costo, residual=residual, vida=vida):
+                    cuotas = self._cuotas(metodo, costo, residual, vida)
+                    self.assertEqual(int(cuotas.sum()), costo - residual)
+                    self.assertTrue((cuotas >= 0).all())
+                    # Después de la vida útil no se deprecia nada
+                    self.assertFalse(cuotas[vida:].any())
+
+    def test_saldo_decreciente_pasa_a_linea_recta_sin_salto_final(self):
+        for costo, residual, vida in self.CASOS:
+            with self.subTest(costo=costo, residual=residual, vida=vida):
+                cuotas = self._cuotas(depreciacion.SALDO_DECRECIENTE, costo, residual, vida)[:vida]
+                # Las cuotas no crecen (salvo el centavo del reparto lineal)
+                self.assertTrue((np.diff(cuotas) <= 1).all())
+
+    def test_recuperar_meses_no_registrados(self):
+        args = [np.asarray([v]) for v in (depreciacion.SALDO_DECRECIENTE, 900_000, 1_000_000, 60)]
+        acumulada = depreciacion.acumulada
+        una_vez = acumulada(*args, np.asarray([7])) - acumulada(*args, np.asarray([2]))
+        por_mes = sum(acumulada(*args, np.asarray([k + 1])) - acumulada(*args, np.asarray([k])) for k in range(2, 7))
+        self.assertEqual(una_vez.tolist(), por_mes.tolist())
+
+
+class RegistrarDepreciacionTests(TestCase):
+
+    def setUp(self):
+        self.periodo = _periodo_abierto()
+        self.clase = ClaseActivo.objects.get(nombre='Mobiliario y Equipo de Oficina')
+        ActivoFijo.objects.create(
+            codigo='Prueba-1', descripcion='Escritorio', clase=self.clase,
+            fecha_adquisicion=self.periodo.fecha_inicio - timedelta(days=40), costo=Decimal('6000.00'),
+        )
+
+    def test_registrar_dos_veces_no_duplica(self):
+        resultado = depreciacion.registrar(self.periodo)
+        self.assertGreater(resultado.total, 0)
+        self.assertEqual(len(resultado.asientos), 1)
+        self.assertEqual(
+            _lineas_de(resultado.asientos[0]),
+            {self.clase.cuenta_gasto_id: (resultado.total, 0), self.clase.cuenta_depreciacion_id: (0, resultado.total)},
+        )
+        otra = depreciacion.registrar(self.periodo)
+        self.assertEqual((otra.asientos, otra.total), ([], 0))
+
+    def test_cuenta_inactiva_de_la_clase_no_escribe_nada(self):
+        Cuenta.objects.filter(pk=self.clase.cuenta_gasto_id).update(esta_activa=False)
+        with self.assertRaisesMessage(ValidationError, 'no son imputables o están inactivas'):
+            depreciacion.registrar(self.periodo)
+        self.assertFalse(AsientoDiario.objects.filter(descripcion__startswith='Depreciación').exists())
+        self.assertFalse(ActivoFijo.objects.filter(depreciado_hasta__isnull=False).exists())
+
+
+# --- Planillas ---
+
+class DeduccionTests(TestCase):
+
+    def setUp(self):
+        self.cuenta = _imputable('23')
+
+    def _tabla(self, nombre, tramos, base_maxima=None):
+        tabla = TablaDeduccion.objects.create(nombre=nombre, cuenta=self.cuenta, base_maxima=base_maxima)
+        TramoDeduccion.objects.bulk_create([
+            TramoDeduccion(tabla=tabla, desde=Decimal(desde), porcentaje=Decimal(porcentaje), cuota_fija=Decimal(cuota))
+            for desde, porcentaje, cuota in tramos
+        ])
+        return tabla
+
+    def _deducir(self, tabla, *salarios):
+        centavos = np.asarray([int(Decimal(s) * 100) for s in salarios], dtype=np.int64)
+        return planillas.deduccion(tabla, centavos).tolist()
+
+    def test_limites_de_tramo(self):
+        renta = self._tabla('Prueba Renta', [('0', '0', '0'), ('472.00', '10', '17.67'), ('895.25', '20', '60.00')])
+        self.assertEqual(
+            self._deducir(renta, '0', '471.99', '472.00', '472.01', '472.05', '895.24', '895.25', '1000.00'),
+            # 472.01: una décima de centavo se redondea a cero; 472.05: medio centavo sube
+            [0, 0, 1767, 1767, 1768, 5999, 6000, 8095],
+        )
+
+    def test_salario_menor_que_el_primer_tramo_no_paga(self):
+        tabla = self._tabla('Prueba desde 100', [('100.00', '5', '1.00')])
+        self.assertEqual(self._deducir(tabla, '50.00', '100.00', '200.00'), [0, 100, 600])
+
+    def test_tope_de_base(self):
+        afp = self._tabla('Prueba AFP', [('0', '7.25', '0')], base_maxima=Decimal('1000.00'))
+        self.assertEqual(self._deducir(afp, '800.00', '1000.00', '5000.00'), [5800, 7250, 7250])
+
+    def test_tabla_sin_tramos(self):
+        tabla = self._tabla('Prueba vacía', [])
+        self.assertEqual(self._deducir(tabla, '500.00'), [0])
+
+
+class ContabilizarPlanillaTests(TestCase):
+
+    def setUp(self):
+        self.periodo = _periodo_abierto()
+        self.planilla = Planilla.objects.create(
+            nombre='Prueba quincena', periodo=self.periodo, fecha=self.periodo.fecha_inicio,
+            cuenta_gasto=_imputable('521'), cuenta_por_pagar=_imputable('21'), cuenta_pago=_imputable('11'),
+        )
+        planillas.importar(self.planilla, [('E-1', 'Ana', '800.00'), ('E-2', 'Luis', '1200.00')])
+
+    def test_provision_y_pago_cuadran_y_no_se_contabiliza_dos_veces(self):
+        resultado = planillas.contabilizar(self.planilla)
+        self.assertEqual(resultado.total_salarios, Decimal('2000.00'))
+        self.assertEqual(
+            resultado.total_liquido + sum(resultado.deducciones.values(), Decimal('0.00')), resultado.total_salarios,
+        )
+        planilla = resultado.planilla
+        for asiento in (planilla.asiento_provision, planilla.asiento_pago):
+            self.assertTrue(AsientoDiario.objects.get(pk=asiento.pk).esta_cuadrado)
+        self.assertEqual(
+            _lineas_de(planilla.asiento_pago)[planilla.cuenta_pago_id], (Decimal('0.00'), resultado.total_liquido),
+        )
+        with self.assertRaisesMessage(ValidationError, 'ya está contabilizada'):
+            planillas.contabilizar(self.planilla)
+
+
+# --- Libros de IVA ---
+
+class LibrosIvaTests(TestCase):
+
+    def setUp(self):
+        self.periodo = _periodo_abierto()
+        self.caja = _imputable('11')
+        _, venta = _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('113.00'), haber=0),
+            dict(cuenta=_imputable('41'), debe=0, haber=Decimal('100.00')),
+            dict(cuenta=_imputable('221'), debe=0, haber=Decimal('13.00')),
+        ])
+        self.venta, self.linea_venta = venta[0].asiento, venta[2]
+        _, compra = _asiento(self.periodo, [
+            dict(cuenta=_imputable('523'), debe=Decimal('40.00'), haber=0),
+            dict(cuenta=_imputable('141'), debe=Decimal('5.20'), haber=0),
+            dict(cuenta=self.caja, debe=0, haber=Decimal('45.20')),
+        ])
+        self._dato(self.linea_venta, DatoFiscal.Libro.VENTAS, 'FAC', 'F-1', '100.00')
+        self._dato(compra[1], DatoFiscal.Libro.COMPRAS, 'CCF', 'C-1', '40.00')
+
+    def _dato(self, movimiento, libro, tipo, numero, base):
+        return DatoFiscal.objects.create(
+            movimiento=movimiento, libro=libro, tipo_documento=tipo, numero_documento=numero,
+            fecha_documento=self.periodo.fecha_inicio, tercero_nit='0614-1', tercero_nombre='Prueba S.A.',
+            base_gravada=Decimal(base),
+        )
+
+    def _resultado(self, filas):
+        return {fila['concepto']: fila['iva'] for fila in filas if 'documentos' not in fila}
+
+    def test_libro_de_ventas_y_resumen(self):
+        filas = list(libros_iva.filas_libro(self.periodo, DatoFiscal.Libro.VENTAS))
+        self.assertEqual(len(filas), 1)
+        self.assertEqual(
+            {columna: filas[0][columna] for columna in ('numero_documento', 'base_gravada', 'iva', 'total', 'partida')},
+            {'numero_documento': 'F-1', 'base_gravada': Decimal('100.00'), 'iva': Decimal('13.00'),
+             'total': Decimal('113.00'), 'partida': self.venta.numero_partida},
+        )
+        self.assertEqual(self._resultado(libros_iva.resumen(self.periodo)), {
+            'Débito fiscal del período': Decimal('13.00'),
+            'Crédito fiscal del período': Decimal('5.20'),
+            'Impuesto a pagar': Decimal('7.80'),
+        })
+
+    def test_lineas_de_iva_sin_datos_fiscales(self):
+        _asiento(self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal('11.30'), haber=0),
+            dict(cuenta=_imputable('221'), debe=0, haber=Decimal('11.30')),
+        ])
+        self.assertEqual(libros_iva.sin_datos_fiscales(self.periodo), {
+            DatoFiscal.Libro.COMPRAS: 0, DatoFiscal.Libro.VENTAS: 1,
+        })
+
+    def test_la_reversion_saca_el_documento_del_libro(self):
+        resultado = servicios.revertir_asientos([self.venta], periodo=self.periodo, fecha=self.periodo.fecha_inicio)
+        espejo = DatoFiscal.objects.get(movimiento__asiento=resultado.reversiones[0])
+        self.assertEqual((espejo.numero_documento, espejo.base_gravada), ('F-1', Decimal('-100.00')))
+        fila, = libros_iva.filas_libro(self.periodo, DatoFiscal.Libro.VENTAS)
+        self.assertEqual((fila['base_gravada'], fila['iva']), (Decimal('0.00'), Decimal('0.00')))
+        self.assertEqual(self._resultado(libros_iva.resumen(self.periodo))['Débito fiscal del período'], Decimal('0.00'))
+
+    def test_los_libros_de_un_periodo_archivado_no_cambian(self):
+        _cerrar_y_abrir(self.periodo)
+        def libros():
+            # Instancia nueva: archivo_de guarda en caché el archivo del período
+            periodo = PeriodoContable.objects.get(pk=self.periodo.pk)
+            return (
+                [list(libros_iva.filas_libro(periodo, libro)) for libro in DatoFiscal.Libro.values],
+                list(libros_iva.resumen(periodo)),
+                libros_iva.sin_datos_fiscales(periodo),
+            )
+        antes = libros()
+        with tempfile.TemporaryDirectory() as directorio, override_settings(CONTABILIDAD_ARCHIVO_DIR=directorio):
+            call_command('archivar_periodos', periodo=[self.periodo.pk], stdout=StringIO())
+            self.assertFalse(DatoFiscal.objects.filter(periodo=self.periodo).exists())
+            despues = libros()
+        self.assertEqual(despues, antes)
+
+
+# --- Auxiliares por tercero ---
+
+class SaldoTerceroTests(TestCase):
+
+    def setUp(self):
+        self.periodo = _periodo_abierto()
+        self.clientes = _imputable('121')
+        self.ventas = _imputable('41')
+        self.ana, self.beto = (
+            Tercero.objects.create(tipo=Tercero.Tipo.CLIENTE, codigo=codigo, nombre=nombre)
+            for codigo, nombre in (('C-1', 'Ana'), ('C-2', 'Beto'))
+        )
+        auxiliares.reconstruir()
+
+    def _acumulado(self):
+        auxiliares.actualizar()
+        return {
+            (s.tercero_id, s.periodo_id): (s.debe, s.haber, s.movimientos)
+            for s in SaldoTercero.objects.filter(cuenta=self.clientes)
+        }
+
+    def _venta(self, monto, tercero):
+        return _asiento(self.periodo, [
+            dict(cuenta=self.clientes, tercero=tercero, debe=monto, haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=monto),
+        ])
+
+    def test_altas_modificaciones_y_bajas(self):
+        asiento, (cliente, venta) = self._venta(Decimal('100.00'), self.ana)
+        self._venta(Decimal('40.00'), self.ana)
+        self.assertEqual(self._acumulado(), {(self.ana.pk, self.periodo.pk): (Decimal('140.00'), 0, 2)})
+
+        servicios.editar_asiento(asiento, [
+            dict(id=cliente.pk, cuenta_id=self.clientes.pk, tercero_id=self.beto.pk, debe=Decimal('60.00'), haber=0),
+            dict(id=venta.pk, cuenta_id=self.ventas.pk, debe=0, haber=Decimal('60.00')),
+        ])
+        self.assertEqual(self._acumulado(), {
+            (self.ana.pk, self.periodo.pk): (Decimal('40.00'), 0, 1),
+            (self.beto.pk, self.periodo.pk): (Decimal('60.00'), 0, 1),
+        })
+
+        asiento.delete()
+        self.assertEqual(self._acumulado(), {(self.ana.pk, self.periodo.pk): (Decimal('40.00'), 0, 1)})
+        incremental = self._acumulado()
+        auxiliares.reconstruir()
+        self.assertEqual(self._acumulado(), incremental)
+
+    def test_el_archivo_conserva_los_saldos_por_tercero(self):
+        self._venta(Decimal('100.00'), self.ana)
+        self._venta(Decimal('25.50'), self.beto)
+        _cerrar_y_abrir(self.periodo)
+        saldos = lambda: {fila['tercero_id']: fila['saldo'] for fila in auxiliares.saldos(self.clientes)}
+        antes = saldos()
+        self.assertEqual(antes, {self.ana.pk: Decimal('100.00'), self.beto.pk: Decimal('25.50')})
+        with tempfile.TemporaryDirectory() as directorio, override_settings(CONTABILIDAD_ARCHIVO_DIR=directorio):
+            call_command('archivar_periodos', periodo=[self.periodo.pk], stdout=StringIO())
+        self.assertEqual(saldos(), antes)
+        incremental = self._acumulado()
+        auxiliares.reconstruir()
+        self.assertEqual(self._acumulado(), incremental)
+
+
+# --- Cartera: conciliación ---
+
+class ConciliacionTests(TestCase):
+
+    def setUp(self):
+        self.periodo = _periodo_abierto()
+        self.clientes, self.caja, self.ventas = Cuenta.objects.get(codigo='121'), _imputable('11'), _imputable('41')
+        self.tercero = Tercero.objects.create(tipo=Tercero.Tipo.CLIENTE, codigo='C-1', nombre='Cliente Uno')
+
+    def _factura(self, referencia, monto, periodo=None):
+        _, (linea, _) = _asiento(periodo or self.periodo, [
+            dict(cuenta=self.clientes, tercero=self.tercero, referencia=referencia, debe=Decimal(monto), haber=0),
+            dict(cuenta=self.ventas, debe=0, haber=Decimal(monto)),
+        ])
+        return linea.pk
+
+    def _cobro(self, referencia, monto, periodo=None):
+        _, (_, linea) = _asiento(periodo or self.periodo, [
+            dict(cuenta=self.caja, debe=Decimal(monto), haber=0),
+            dict(cuenta=self.clientes, tercero=self.tercero, referencia=referencia, debe=0, haber=Decimal(monto)),
+        ])
+        return linea.pk
+
+    def _aplicaciones(self):
+        return set(AplicacionCartera.objects.values_list('documento_id', 'pago_id', 'monto'))
+
+    def test_primero_por_referencia_y_despues_por_monto(self):
+        f1, f2 = self._factura('F-1', '50.00'), self._factura('F-2', '50.00')
+        # Por monto podría ir a F-1 (vence primero), pero su referencia es F-2
+        cobro_f2 = self._cobro('F-2', '50.00')
+        cobro_sin_referencia = self._cobro('', '50.00')
+        resultado = cartera.conciliar('cobrar')
+        self.assertEqual((resultado.por_referencia, resultado.por_monto), (1, 1))
+        self.assertEqual(self._aplicaciones(), {
+            (f2, cobro_f2, Decimal('50.00')), (f1, cobro_sin_referencia, Decimal('50.00')),
+        })
+        self.assertFalse(PartidaCartera.objects.filter(pendiente__gt=0).exists())
+
+    def test_por_referencia_aplica_parcial_del_mas_antiguo_al_mas_reciente(self):
+        primera, segunda = self._factura('P-9', '30.00'), self._factura('P-9', '30.00')
+        cobro = self._cobro('P-9', '45.00')
+        resultado = cartera.conciliar('cobrar')
+        self.assertEqual((resultado.por_referencia, resultado.por_monto), (2, 0))
+        self.assertEqual(self._aplicaciones(), {
+            (primera, cobro, Decimal('30.00')), (segunda, cobro, Decimal('15.00')),
+        })
+        self.assertEqual(PartidaCartera.objects.get(pk=segunda).pendiente, Decimal('15.00'))
+
+    def test_monto_distinto_sin_referencia_queda_pendiente(self):
+        factura = self._factura('', '80.00')
+        cobro = self._cobro('', '79.99')
+        resultado = cartera.conciliar('cobrar')
+        self.assertEqual(resultado.total, 0)
+        self.assertEqual(
+            dict(PartidaCartera.objects.values_list('pk', 'pendiente')),
+            {factura: Decimal('80.00'), cobro: Decimal('79.99')},
+        )
+
+    def test_archivar_arrastra_las_partidas_abiertas(self):
+        f1, f2 = self._factura('F-1', '100.00'), self._factura('F-2', '40.00')
+        self._cobro('F-1', '60.00')
+        cartera.conciliar('cobrar')
+        vencimiento = self.periodo.fecha_inicio + timedelta(days=90)
+        PartidaCartera.objects.filter(pk=f1).update(vencimiento=vencimiento)
+        nuevo = _cerrar_y_abrir(self.periodo)
+        # Un cobro del período que no se archiva, aplicado a una factura del que sí
+        cobro = self._cobro('F-2', '40.00', periodo=nuevo)
+        cartera.conciliar('cobrar')
+        antiguedad = cartera.antiguedad('cobrar')
+
+        with tempfile.TemporaryDirectory() as directorio, override_settings(CONTABILIDAD_ARCHIVO_DIR=directorio):
+            call_command('archivar_periodos', periodo=[self.periodo.pk], stdout=StringIO())
+            archivo = ArchivoPeriodo.objects.get(periodo=self.periodo)
+            self.assertEqual(set(archivo_historico.referencias(archivo).values()), {'F-1', 'F-2'})
+
+        self.assertFalse(PartidaCartera.objects.filter(pk__in=[f1, f2]).exists())
+        arrastradas = {
+            p.referencia: p for p in PartidaCartera.objects.filter(movimiento__asiento=archivo.asiento_arrastre)
+        }
+        self.assertEqual(
+            {ref: (p.tipo, p.monto, p.pendiente) for ref, p in arrastradas.items()},
+            {'F-1': (PartidaCartera.Tipo.DOCUMENTO, Decimal('40.00'), Decimal('40.00')),
+             'F-2': (PartidaCartera.Tipo.DOCUMENTO, Decimal('40.00'), Decimal('0.00'))},
+        )
+        self.assertEqual(arrastradas['F-1'].vencimiento, vencimiento)
+        self.assertEqual(self._aplicaciones(), {(arrastradas['F-2'].pk, cobro, Decimal('40.00'))})
+        # Las partidas abiertas se llevan todo el neto del tercero: no queda otra línea con tercero
+        self.assertEqual(archivo.asiento_arrastre.movimientos.filter(tercero__isnull=False).count(), 2)
+        self.assertEqual(cartera.antiguedad('cobrar'), antiguedad)
+        incremental = set(PartidaCartera.objects.values_list('pk', 'monto', 'pendiente', 'vencimiento'))
+        cartera.reconstruir()
+        self.assertEqual(set(PartidaCartera.objects.values_list('pk', 'monto', 'pendiente', 'vencimiento')), incremental)
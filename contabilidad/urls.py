@@ -13,11 +13,21 @@ urlpatterns = [
     
     # Registro
     path('asiento/nuevo/', views.registrar_asiento, name='registrar_asiento'),
+    path('asiento/<int:asiento_id>/editar/', views.editar_asiento, name='editar_asiento'),
     
     # Mayor y Balance de Comprobación
     path('reportes/', views.mayor_seleccion, name='mayor_seleccion'),
     path('reportes/mayor/<int:periodo_id>/<int:cuenta_id>/', views.libro_mayor_detalle, name='libro_mayor_detalle'),
+    path('reportes/mayor/<int:periodo_id>/<int:cuenta_id>/saldos/', views.libro_mayor_saldos, name='libro_mayor_saldos'),
     path('reportes/balanza/<int:periodo_id>/', views.balanza_comprobacion, name='balanza_comprobacion'),
+    path('reportes/balanza/rango/', views.balanza_rango, name='balanza_rango'),
+    path('reportes/hoja-de-trabajo/', views.hoja_de_trabajo, name='hoja_de_trabajo'),
+    path('reportes/iva/<int:periodo_id>/resumen/', views.resumen_iva, name='resumen_iva'),
+    path('reportes/iva/<int:periodo_id>/<slug:libro>/', views.libro_iva, name='libro_iva'),
+    path('reportes/terceros/<int:periodo_id>/<int:cuenta_id>/', views.auxiliar_terceros, name='auxiliar_terceros'),
+    path('reportes/terceros/<int:periodo_id>/<int:cuenta_id>/<int:tercero_id>/', views.estado_cuenta_tercero, name='estado_cuenta_tercero'),
+    path('reportes/cartera/<slug:tipo>/', views.antiguedad_cartera, name='antiguedad_cartera'),
+    path('reportes/cartera/<slug:tipo>/<int:tercero_id>/', views.partidas_cartera, name='partidas_cartera'),
 
    # --- Estado de Resultados ---
     path('estado-resultados/', views.hub_estado_resultados, name='hub_estado_resultados'), 
@@ -57,5 +67,15 @@ urlpatterns = [
     
     #Costo
     path('costeo/', viewsCosteo.costeo, name='costeo'),
+
+    # --- Bitácora de cambios (consumidores incrementales) ---
+    path('api/cambios/', views.api_cambios, name='api_cambios'),
+    path('api/bi/cambios/', views.api_bi_cambios, name='api_bi_cambios'),
+
+    # --- Diagnóstico de rendimiento ---
+    path('configuracion/instrumentacion/sql/', views.instrumentacion_sql, name='instrumentacion_sql'),
+    path('configuracion/perfiles/', views.perfiles, name='perfiles'),
+    path('configuracion/perfiles/<str:nombre>/', views.perfil_detalle, name='perfil_detalle'),
+    path('metricas/', views.metricas_prometheus, name='metricas'),
 ]
 
@@ -15,7 +15,19 @@ def main():
             "available on your PYTHONPATH environment variable? Did you "
             "forget to activate a virtual environment?"
         ) from exc
-    execute_from_command_line(sys.argv)
+
+    # --profile[=muestreo] perfila cualquier comando (ver contabilidad/perfilador.py)
+    perfil = next((a for a in sys.argv[2:] if a == '--profile' or a.startswith('--profile=')), None)
+    if perfil is None:
+        execute_from_command_line(sys.argv)
+        return
+    sys.argv.remove(perfil)
+    import django
+    django.setup()
+    from contabilidad import perfilador
+    with perfilador.perfilar(sys.argv[1], perfilador.modo_solicitado(perfil.partition('=')[2])) as resultado:
+        execute_from_command_line(sys.argv)
+    print(f"Perfil guardado en {resultado['archivo']} ({resultado['segundos']:.1f} s).", file=sys.stderr)
 
 
 if __name__ == '__main__':